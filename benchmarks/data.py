@@ -0,0 +1,115 @@
+"""
+Synthetic Zoho modules for the benchmarks.
+
+Every value is derived from the row number, so a module of any size can be served page by page without keeping
+it in memory, and the same rows are produced for the REST and the bulk api.
+"""
+
+import datetime
+import math
+
+BASE_TIME = datetime.datetime(2020, 1, 1, tzinfo=datetime.timezone.utc)
+# Cycled through to build the fields of a module of any width
+FIELD_TYPES = ['text', 'integer', 'double', 'currency', 'boolean', 'datetime', 'picklist', 'email', 'percent',
+               'ownerlookup', 'date', 'bigint', 'textarea', 'phone']
+PICKLIST_VALUES = ['Open', 'Closed', 'Pending', 'Won', 'Lost']
+# Multiplier permuting the row numbers, so Modified_Time is not in row order like in real bulk results
+TIME_PERMUTATION = 7919
+
+
+def format_time(value):
+    return value.strftime('%Y-%m-%dT%H:%M:%S+00:00')
+
+
+class SyntheticModule():
+    """A module of `rows` records with `width` generated fields besides id, Modified_Time and Created_Time."""
+
+    def __init__(self, name, rows, width):
+        self.name = name
+        self.rows = rows
+        self.width = width
+        self.fields = [{'api_name': 'Modified_Time', 'data_type': 'datetime'},
+                       {'api_name': 'Created_Time', 'data_type': 'datetime'}]
+        for index in range(width):
+            data_type = FIELD_TYPES[index % len(FIELD_TYPES)]
+            self.fields.append({'api_name': 'Field_{}_{}'.format(index, data_type), 'data_type': data_type})
+        self.modified_time = format_time(BASE_TIME)
+        # Row number * multiplier modulo rows is a permutation as long as both are coprime
+        self._multiplier = TIME_PERMUTATION if math.gcd(TIME_PERMUTATION, max(rows, 1)) == 1 else 1
+        self._inverse = pow(self._multiplier, -1, rows) if rows > 1 else 0
+
+    def describe(self):
+        return {'api_name': self.name, 'module_name': self.name, 'api_supported': True,
+                'modified_time': self.modified_time}
+
+    def get_modified_time(self, row):
+        """Row `row` was modified `rank` seconds after BASE_TIME, every rank below `rows` is used once."""
+        return BASE_TIME + datetime.timedelta(seconds=(row * self._multiplier) % max(self.rows, 1))
+
+    def get_row_by_rank(self, rank):
+        """Returns the row with the `rank`-th oldest Modified_Time."""
+        return (rank * self._inverse) % self.rows if self.rows > 1 else 0
+
+    @staticmethod
+    def get_rank_after(value):
+        """Returns the rank of the first row modified after the datetime `value`."""
+        seconds = (value - BASE_TIME).total_seconds()
+        return max(0, math.floor(seconds) + 1)
+
+    @staticmethod
+    def _value(data_type, row, column, rest):
+        # pylint: disable=too-many-return-statements
+        seed = row * 31 + column
+        if data_type == 'integer':
+            return seed % 100000
+        if data_type in ('double', 'currency', 'percent'):
+            return round((seed % 1000000) / 100.0, 2)
+        if data_type == 'boolean':
+            return seed % 2 == 0
+        if data_type == 'datetime':
+            return format_time(BASE_TIME + datetime.timedelta(minutes=seed % 500000))
+        if data_type == 'date':
+            return (BASE_TIME + datetime.timedelta(days=seed % 3000)).strftime('%Y-%m-%d')
+        if data_type == 'picklist':
+            return PICKLIST_VALUES[seed % len(PICKLIST_VALUES)]
+        if data_type == 'email':
+            return 'user{}@example.com'.format(seed)
+        if data_type == 'bigint':
+            return str(4000000000000000000 + seed)
+        if data_type == 'ownerlookup':
+            owner_id = str(3000000000000000000 + seed % 50)
+            return {'id': owner_id, 'name': 'Owner {}'.format(seed % 50)} if rest else owner_id
+        if data_type == 'phone':
+            return '+1555{:07d}'.format(seed % 10000000)
+        return 'Value {} of row {}'.format(column, row)
+
+    def get_record(self, row, fields=None, rest=True):
+        """Returns row `row` as a REST record, or as the raw values of a bulk result when `rest` is False."""
+        modified_time = self.get_modified_time(row)
+        record = {'id': str(1000000000000000000 + row)}
+        if fields is not None:
+            fields = set(fields)
+        for column, field in enumerate(self.fields):
+            name = field['api_name']
+            if fields is not None and name not in fields:
+                continue
+            if name == 'Modified_Time':
+                record[name] = format_time(modified_time)
+            elif name == 'Created_Time':
+                record[name] = format_time(modified_time - datetime.timedelta(days=1))
+            else:
+                record[name] = self._value(field['data_type'], row, column, rest)
+        return record
+
+    def get_csv_row(self, row, header):
+        record = self.get_record(row, fields=header, rest=False)
+        values = []
+        for name in header:
+            value = record.get(name)
+            if value is None:
+                values.append('')
+            elif isinstance(value, bool):
+                values.append('true' if value else 'false')
+            else:
+                values.append(str(value))
+        return values
@@ -0,0 +1,369 @@
+"""
+Runs the tap against the local Zoho stand-in and writes the measurements as JSON.
+
+    python -m benchmarks.run --rows 10000,1000000 --width 20 --output bench.json
+    python -m benchmarks.run --rows 10000 --compare bench.json
+
+Every scenario runs in a fresh process, so its peak RSS is its own.
+"""
+
+import argparse
+import datetime
+import io
+import json
+import logging
+import math
+import multiprocessing
+import os
+import platform
+import resource
+import sys
+import tempfile
+import time
+import uuid
+
+import requests
+
+from benchmarks.data import SyntheticModule
+from benchmarks.server import BULK_PAGE_SIZE, ZohoStandIn
+
+START_DATE = '2019-01-01T00:00:00Z'
+SCENARIOS = ['discover', 'discover_cached', 'bulk_get_data', 'rest_get_data', 'sync_bulk', 'sync_rest', 'sync_auto',
+             'transform_compiled', 'transform_singer', 'write_buffered', 'write_singer']
+# api_type used by each scenario
+SCENARIO_API_TYPES = {
+    'discover': 'BULK',
+    'discover_cached': 'BULK',
+    'bulk_get_data': 'BULK',
+    'rest_get_data': 'REST',
+    'sync_bulk': 'BULK',
+    'sync_rest': 'REST',
+    'sync_auto': 'AUTO',
+    'transform_compiled': 'REST',
+    'transform_singer': 'REST',
+    'write_buffered': 'REST',
+    'write_singer': 'REST'
+}
+# Scenarios timing one step over records fetched with the REST api before the timer starts
+RECORD_SCENARIOS = ['transform_compiled', 'transform_singer', 'write_buffered', 'write_singer']
+BENCH_MODULE = 'Bench_0'
+
+
+def get_peak_rss_mb():
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+class Timed():
+    """Wraps an iterable, counting its items and timing the first one."""
+
+    def __init__(self, iterable, started):
+        self.iterable = iterable
+        self.started = started
+        self.items = 0
+        self.time_to_first_item = None
+
+    def __iter__(self):
+        for item in self.iterable:
+            if self.time_to_first_item is None:
+                self.time_to_first_item = time.perf_counter() - self.started
+            self.items += 1
+            yield item
+
+
+def _login(server_url, api_type, work_dir, extra_config):
+    # pylint: disable=import-outside-toplevel
+    import tap_zoho
+    from tap_zoho.zoho import Zoho
+
+    config = {
+        'client_id': 'bench',
+        'client_secret': 'bench',
+        'redirect_uri': 'http://localhost',
+        'refresh_token': 'bench-{}'.format(uuid.uuid4().hex),
+        'accounts_url': server_url,
+        'api_domain': server_url,
+        'start_date': START_DATE,
+        'select_fields_by_default': True,
+        'api_type': api_type,
+        'discover_cache_dir': os.path.join(work_dir, 'discover-cache'),
+        'currentUserEmail': 'bench@example.com'
+    }
+    config.update(extra_config)
+
+    # The token persistence handler reads the config from the command line, like the tap does
+    config_path = os.path.join(work_dir, 'config.json')
+    with open(config_path, 'w') as config_file:
+        json.dump(config, config_file)
+    sys.argv = ['tap-zoho', '--config', config_path]
+
+    tap_zoho.CONFIG.update(config)
+    tap_zoho.initialize()
+    zh = Zoho(config=tap_zoho.CONFIG, default_start_date=START_DATE, is_sandbox=False, api_type=api_type)
+    zh.login()
+    return zh
+
+
+def _discover(zh):
+    # pylint: disable=import-outside-toplevel
+    import tap_zoho
+
+    stdout = sys.stdout
+    sys.stdout = io.StringIO()
+    try:
+        tap_zoho.do_discover(zh)
+        return json.loads(sys.stdout.getvalue())
+    finally:
+        sys.stdout = stdout
+
+
+def _get_catalog_entry(catalog, stream):
+    # pylint: disable=import-outside-toplevel
+    from singer import metadata
+
+    entry = next(entry for entry in catalog['streams'] if entry['tap_stream_id'] == stream)
+    mdata = metadata.to_map(entry['metadata'])
+    mdata = metadata.write(mdata, (), 'selected', True)
+    entry['metadata'] = metadata.to_list(mdata)
+    return entry
+
+
+def _transform_singer(records, schema):
+    # pylint: disable=import-outside-toplevel
+    import singer
+    from tap_zoho.sync import transform_bulk_data_hook
+
+    # A Transformer per record, as sync_records did before the transformer was compiled per stream
+    for record in records:
+        with singer.Transformer(pre_hook=transform_bulk_data_hook) as transformer:
+            yield transformer.transform(record, schema)
+
+
+def _transform_compiled(records, schema):
+    # pylint: disable=import-outside-toplevel
+    from tap_zoho.sync import compile_bulk_data_hook, transform_bulk_data_hook
+    from tap_zoho.transform import RecordTransformer
+
+    transformer = RecordTransformer(schema, pre_hook=transform_bulk_data_hook, hook_compiler=compile_bulk_data_hook)
+    for record in records:
+        yield transformer.transform(record)
+
+
+def _write_buffered(records, stream):
+    # pylint: disable=import-outside-toplevel
+    import singer.utils
+    from tap_zoho import writer
+
+    time_extracted = singer.utils.now()
+    for record in records:
+        writer.write_record(stream, record, version=1, time_extracted=time_extracted)
+        yield record
+    writer.flush()
+
+
+def _write_singer(records, stream):
+    # pylint: disable=import-outside-toplevel
+    import singer
+
+    # singer.write_message writes and flushes every message to sys.stdout
+    time_extracted = singer.utils.now()
+    stdout = sys.stdout
+    with open(os.devnull, 'w') as devnull:
+        sys.stdout = devnull
+        try:
+            for record in records:
+                singer.write_message(singer.RecordMessage(stream=stream, record=record, version=1,
+                                                          time_extracted=time_extracted))
+                yield record
+        finally:
+            sys.stdout = stdout
+
+
+def run_records_scenario(scenario, records, catalog_entry):
+    """Yields the results of the step timed by `scenario` for every one of `records`."""
+    if scenario == 'transform_compiled':
+        return _transform_compiled(records, catalog_entry['schema'])
+    if scenario == 'transform_singer':
+        return _transform_singer(records, catalog_entry['schema'])
+    if scenario == 'write_buffered':
+        return _write_buffered(records, catalog_entry['stream'])
+    return _write_singer(records, catalog_entry['stream'])
+
+
+def run_scenario(scenario, server_url, extra_config):
+    """Runs `scenario` in this process and returns its measurements."""
+    # pylint: disable=import-outside-toplevel,too-many-locals
+    import singer
+    from tap_zoho import instrumentation, writer
+    from tap_zoho.sync import sync_records
+    from tap_zoho.zoho.bulk import Bulk
+    from tap_zoho.zoho.rest import Rest
+
+    api_type = SCENARIO_API_TYPES[scenario]
+
+    with tempfile.TemporaryDirectory(prefix='tap-zoho-bench-') as work_dir:
+        zh = _login(server_url, api_type, work_dir, extra_config)
+        # singer.get_logger() resets the root logger level on every call, disable() is not reset
+        logging.disable(logging.INFO)
+        catalog_entry = None
+        if scenario == 'discover_cached':
+            _discover(zh)
+        elif not scenario.startswith('discover'):
+            catalog_entry = _get_catalog_entry(_discover(zh), BENCH_MODULE)
+
+        state = {}
+        records = None
+        if scenario in RECORD_SCENARIOS:
+            records = list(Rest(zh).get_data(BENCH_MODULE, state, catalog_entry))
+        rss_before = get_peak_rss_mb()
+        requests.post(server_url + '/_bench/reset')
+        started = time.perf_counter()
+
+        with open(os.devnull, 'wb') as devnull:
+            writer.WRITER.out = devnull
+            if scenario.startswith('discover'):
+                timed = Timed(_discover(zh)['streams'], started)
+                for _ in timed:
+                    pass
+            elif scenario in RECORD_SCENARIOS:
+                timed = Timed(run_records_scenario(scenario, records, catalog_entry), started)
+                for _ in timed:
+                    pass
+            elif scenario in ('bulk_get_data', 'rest_get_data'):
+                api = Bulk(zh) if api_type == 'BULK' else Rest(zh)
+                timed = Timed(api.get_data(BENCH_MODULE, state, catalog_entry), started)
+                for _ in timed:
+                    pass
+            else:
+                get_data = zh.get_data
+                timed = Timed([], started)
+
+                def timed_get_data(*args, **kwargs):
+                    timed.iterable = get_data(*args, **kwargs)
+                    return timed
+
+                zh.get_data = timed_get_data
+                if api_type == 'AUTO':
+                    zh.select_stream_api_type(catalog_entry, state)
+                with singer.metrics.record_counter(BENCH_MODULE) as counter:
+                    sync_records(zh, catalog_entry, state, counter)
+            writer.flush()
+
+        seconds = time.perf_counter() - started
+        api_calls = requests.get(server_url + '/_bench/calls').json()
+
+    return {
+        'scenario': scenario,
+        'api_type': api_type,
+        'items': timed.items,
+        'seconds': round(seconds, 4),
+        'items_per_sec': round(timed.items / seconds, 1) if seconds else None,
+        'time_to_first_item': round(timed.time_to_first_item, 4) if timed.time_to_first_item is not None else None,
+        'peak_rss_mb': round(get_peak_rss_mb(), 1),
+        'rss_before_mb': round(rss_before, 1),
+        'api_calls': api_calls,
+        'stages': instrumentation.INSTRUMENTATION.get_summary()['streams'].get(BENCH_MODULE, {}).get('stages')
+    }
+
+
+def _run_in_child(scenario, server_url, extra_config, results):
+    try:
+        results.put(run_scenario(scenario, server_url, extra_config))
+    except Exception as ex:  # pylint: disable=broad-except
+        logging.exception('Scenario %s failed', scenario)
+        results.put({'scenario': scenario, 'error': repr(ex)})
+
+
+def run_isolated(scenario, server_url, extra_config):
+    context = multiprocessing.get_context('spawn')
+    results = context.Queue()
+    process = context.Process(target=_run_in_child, args=(scenario, server_url, extra_config, results))
+    process.start()
+    result = results.get()
+    process.join()
+    return result
+
+
+def prebuild_bulk_results(stand_in, module):
+    """Builds the result CSVs of the default bulk query up front, so generating them is not measured."""
+    # pylint: disable=import-outside-toplevel
+    import dateutil.parser
+    from tap_zoho.zoho.bulk import get_body
+
+    modified_time = dateutil.parser.parse(START_DATE).isoformat()
+    for page in range(1, max(1, math.ceil(module.rows / BULK_PAGE_SIZE)) + 1):
+        query = get_body(module.name, page, modified_time)['query']
+        stand_in.get_bulk_result(module, query.get('criteria'), page, query.get('fields'))
+
+
+def compare(results, baseline_path):
+    with open(baseline_path) as baseline_file:
+        baseline = json.load(baseline_file)
+    previous = {(r['scenario'], r.get('rows'), r.get('width')): r for r in baseline['results'] if 'error' not in r}
+
+    print('{:<18} {:>10} {:>6} {:>14} {:>14} {:>8}'.format(
+        'scenario', 'rows', 'width', 'items/sec', 'baseline', 'ratio'))
+    for result in results:
+        if 'error' in result:
+            continue
+        before = previous.get((result['scenario'], result.get('rows'), result.get('width')))
+        before_rate = before['items_per_sec'] if before else None
+        ratio = result['items_per_sec'] / before_rate if before_rate else None
+        print('{:<18} {:>10} {:>6} {:>14.1f} {:>14} {:>8}'.format(
+            result['scenario'], result['rows'], result['width'], result['items_per_sec'],
+            '{:.1f}'.format(before_rate) if before_rate else '-', '{:.2f}x'.format(ratio) if ratio else '-'))
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', default='10000', help='Comma separated row counts of the benchmarked module')
+    parser.add_argument('--width', default='20', help='Comma separated numbers of generated fields')
+    parser.add_argument('--modules', type=int, default=20, help='Number of modules served for discovery')
+    parser.add_argument('--scenarios', default=','.join(SCENARIOS), help='Comma separated scenarios to run')
+    parser.add_argument('--throttle-every', type=int, default=0, help='Answer every Nth call with 429')
+    parser.add_argument('--config', default='{}', help='JSON object of extra tap config')
+    parser.add_argument('--output', default='bench_results.json', help='Path of the JSON results')
+    parser.add_argument('--compare', help='Path of earlier JSON results to compare items/sec with')
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    scenarios = args.scenarios.split(',')
+    extra_config = json.loads(args.config)
+    results = []
+
+    for rows in [int(value) for value in args.rows.split(',')]:
+        for width in [int(value) for value in args.width.split(',')]:
+            modules = [SyntheticModule('Bench_{}'.format(index), rows if index == 0 else 100, width)
+                       for index in range(args.modules)]
+            stand_in = ZohoStandIn(modules, throttle_every=args.throttle_every).start()
+            try:
+                if any(scenario in ('bulk_get_data', 'sync_bulk') for scenario in scenarios):
+                    prebuild_bulk_results(stand_in, modules[0])
+
+                for scenario in scenarios:
+                    result = run_isolated(scenario, stand_in.url, extra_config)
+                    result.update({'rows': rows, 'width': width, 'modules': args.modules})
+                    results.append(result)
+                    print(json.dumps(result), file=sys.stderr)
+            finally:
+                stand_in.stop()
+
+    with open(args.output, 'w') as output_file:
+        json.dump({
+            'created_at': datetime.datetime.now(datetime.timezone.utc).isoformat(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'config': extra_config,
+            'results': results
+        }, output_file, indent=2)
+
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,356 @@
+"""
+Local stand-in for the Zoho endpoints used by the tap.
+
+Serves the OAuth token endpoint, the CRM v2 modules, fields, org, records and record count endpoints and the bulk read
+create, status and result endpoints for a set of SyntheticModules. Every call is counted per endpoint, and the
+server can answer a share of the calls with 429 to exercise the retries of the tap, or allow only a number of calls
+per rate limit window like Zoho does. POST /_bench/reset and GET /_bench/calls reset and return the call counts.
+"""
+
+import collections
+import csv
+import json
+import os
+import re
+import shutil
+import tempfile
+import threading
+import time
+import urllib.request
+import zipfile
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import dateutil.parser
+
+from benchmarks.data import BASE_TIME, format_time
+
+REST_PAGE_SIZE = 200
+BULK_PAGE_SIZE = 200000
+RATELIMIT_LIMIT = 1000000
+
+BULK_JOB_PATH = re.compile(r'^/crm/bulk/v2/read/(?P<job_id>\d+)(?P<result>/result)?$')
+RECORDS_PATH = re.compile(r'^/crm/v2/(?P<module>[A-Za-z0-9_]+)$')
+COUNT_PATH = re.compile(r'^/crm/v2/(?P<module>[A-Za-z0-9_]+)/actions/count$')
+
+
+def _compare(value, comparator, expected):
+    # pylint: disable=too-many-return-statements
+    if comparator == 'greater_than':
+        return value > expected
+    if comparator == 'greater_equal':
+        return value >= expected
+    if comparator == 'less_than':
+        return value < expected
+    if comparator == 'less_equal':
+        return value <= expected
+    if comparator == 'equal':
+        return value == expected
+    if comparator == 'between':
+        return expected[0] <= value <= expected[1]
+    raise ValueError('Unsupported comparator {}'.format(comparator))
+
+
+def compile_criteria(criteria):
+    """Returns a function telling whether a Modified_Time matches the bulk read `criteria`, only Modified_Time
+    criteria and 'and' groups of them are supported."""
+    if not criteria:
+        return lambda modified_time: True
+
+    if 'group' in criteria:
+        if criteria.get('group_operator', 'and').lower() != 'and':
+            raise ValueError('Unsupported group operator {}'.format(criteria['group_operator']))
+        matchers = [compile_criteria(criterion) for criterion in criteria['group']]
+        return lambda modified_time: all(matcher(modified_time) for matcher in matchers)
+
+    value = criteria['value']
+    if isinstance(value, list):
+        expected = [dateutil.parser.parse(item) for item in value]
+    else:
+        expected = dateutil.parser.parse(value)
+    comparator = criteria['comparator']
+    return lambda modified_time: _compare(modified_time, comparator, expected)
+
+
+class ZohoStandIn():
+    """Serves `modules`, a list of SyntheticModules, on `host`:`port`.
+
+    Every `throttle_every`-th call is answered with 429 and a Retry-After of 0 when it is set. When `window_calls` is
+    set, only that many api calls are answered in every window of `window_seconds`, the others with 429 until the
+    window resets.
+    """
+
+    # pylint: disable=too-many-arguments
+    # pylint: disable=too-many-arguments
+    def __init__(self, modules, host='127.0.0.1', port=0, throttle_every=0, window_calls=0, window_seconds=1.0,
+                 hold_jobs=False):
+        self.modules = {module.name: module for module in modules}
+        self.hold_jobs = hold_jobs
+        self.throttle_every = throttle_every
+        self.window_calls = window_calls
+        self.window_seconds = window_seconds
+        self.calls = collections.Counter()
+        self._lock = threading.Lock()
+        self._window_start = time.time()
+        self._window_used = 0
+        self._jobs = {}
+        self._results = {}
+        self._next_job_id = 1
+        self._result_dir = tempfile.mkdtemp(prefix='tap-zoho-bench-')
+        self._server = ThreadingHTTPServer((host, port), self._make_handler())
+        self._server.daemon_threads = True
+        self.url = 'http://{}:{}'.format(host, self._server.server_address[1])
+
+    def start(self):
+        threading.Thread(target=self._server.serve_forever, name='zoho-stand-in', daemon=True).start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+        shutil.rmtree(self._result_dir, ignore_errors=True)
+
+    def reset_calls(self):
+        with self._lock:
+            self.calls.clear()
+
+    def _count(self, endpoint):
+        with self._lock:
+            self.calls[endpoint] += 1
+            return sum(self.calls.values())
+
+    def _use_window_call(self):
+        """Returns whether the current rate limit window has a call left, and uses it."""
+        with self._lock:
+            if time.time() >= self._window_start + self.window_seconds:
+                self._window_start = time.time()
+                self._window_used = 0
+            if not self.window_calls:
+                return True
+            if self._window_used >= self.window_calls:
+                return False
+            self._window_used += 1
+            return True
+
+    def get_ratelimit_headers(self):
+        """Returns the window and day rate limit headers Zoho sends with every api response."""
+        with self._lock:
+            day_remaining = RATELIMIT_LIMIT - sum(self.calls.values())
+            window_limit = self.window_calls or RATELIMIT_LIMIT
+            window_remaining = window_limit - self._window_used if self.window_calls else day_remaining
+            reset = int((self._window_start + self.window_seconds) * 1000)
+        return {'X-RATELIMIT-LIMIT': str(window_limit), 'X-RATELIMIT-REMAINING': str(window_remaining),
+                'X-RATELIMIT-RESET': str(reset), 'X-RATELIMIT-DAY-LIMIT': str(RATELIMIT_LIMIT),
+                'X-RATELIMIT-DAY-REMAINING': str(day_remaining)}
+
+    def _matching_rows(self, module, criteria):
+        matches = compile_criteria(criteria)
+        for row in range(module.rows):
+            if matches(module.get_modified_time(row)):
+                yield row
+
+    def get_bulk_result(self, module, criteria, page, fields):
+        """Returns the path of the CSV of a bulk read page, its row count and whether more pages follow.
+
+        The CSV is built on first use and reused by every job reading the same page.
+        """
+        header = ['id'] + [field['api_name'] for field in module.fields
+                           if fields is None or field['api_name'] in fields]
+        key = (module.name, json.dumps(criteria, sort_keys=True), page, tuple(header))
+        with self._lock:
+            if key in self._results:
+                return self._results[key]
+
+            first_row = (page - 1) * BULK_PAGE_SIZE
+            csv_path = os.path.join(self._result_dir, '{}.csv'.format(len(self._results)))
+            count = 0
+            more_records = False
+            with open(csv_path, 'w', encoding='utf-8', newline='') as csv_file:
+                csv_writer = csv.writer(csv_file)
+                csv_writer.writerow(header)
+                for index, row in enumerate(self._matching_rows(module, criteria)):
+                    if index < first_row:
+                        continue
+                    if count == BULK_PAGE_SIZE:
+                        more_records = True
+                        break
+                    csv_writer.writerow(module.get_csv_row(row, header))
+                    count += 1
+
+            self._results[key] = (csv_path, count, more_records)
+            return self._results[key]
+
+    def create_job(self, body):
+        """Creates a job that is completed at once, or kept in progress until `finish_job` when `hold_jobs` is set.
+        Its result is zipped like Zoho does, as <job id>.csv."""
+        query = body['query']
+        module = self.modules[query['module']]
+        with self._lock:
+            job_id = str(self._next_job_id)
+            self._next_job_id += 1
+        csv_path, count, more_records = self.get_bulk_result(
+            module, query.get('criteria'), query.get('page', 1), query.get('fields'))
+
+        zip_path = os.path.join(self._result_dir, 'job-{}.zip'.format(job_id))
+        with zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_DEFLATED, compresslevel=1) as zip_file:
+            zip_file.write(csv_path, arcname='{}.csv'.format(job_id))
+
+        self._jobs[job_id] = {'zip_path': zip_path, 'count': count, 'more_records': more_records,
+                              'page': query.get('page', 1), 'query': query, 'expired': False,
+                              'state': 'IN PROGRESS' if self.hold_jobs else 'COMPLETED',
+                              'callback_url': body.get('callback', {}).get('url')}
+        return job_id
+
+    def finish_job(self, job_id, state='COMPLETED'):
+        """Ends job `job_id` in `state` and calls its callback url, if any, like Zoho does."""
+        job = self._jobs[job_id]
+        job['state'] = state
+        if job['callback_url']:
+            payload = json.dumps({'job_id': job_id, 'operation': 'read', 'state': state}).encode('utf-8')
+            request = urllib.request.Request(job['callback_url'], data=payload, method='POST',
+                                             headers={'Content-Type': 'application/json'})
+            with urllib.request.urlopen(request, timeout=10):
+                pass
+
+    def expire_job(self, job_id):
+        """Answers the result of job `job_id` with 404 from now on, like Zoho does once a result expired."""
+        self._jobs[job_id]['expired'] = True
+
+    def _make_handler(self):
+        stand_in = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, format, *args):  # pylint: disable=redefined-builtin
+                pass
+
+            def _send_json(self, body, status=200):
+                data = json.dumps(body).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                for name, value in stand_in.get_ratelimit_headers().items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _send_empty(self, status):
+                self.send_response(status)
+                self.send_header('Content-Length', '0')
+                if status == 429:
+                    for name, value in stand_in.get_ratelimit_headers().items():
+                        self.send_header(name, value)
+                    if stand_in.throttle_every:
+                        self.send_header('Retry-After', '0')
+                self.end_headers()
+
+            def _send_file(self, path):
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/zip')
+                self.send_header('Content-Length', str(os.path.getsize(path)))
+                self.end_headers()
+                with open(path, 'rb') as result_file:
+                    shutil.copyfileobj(result_file, self.wfile)
+
+            def _throttled(self, endpoint):
+                if not stand_in._use_window_call():  # pylint: disable=protected-access
+                    stand_in._count('window_throttled')  # pylint: disable=protected-access
+                    self._send_empty(429)
+                    return True
+                total = stand_in._count(endpoint)  # pylint: disable=protected-access
+                if stand_in.throttle_every and total % stand_in.throttle_every == 0:
+                    stand_in._count('throttled')  # pylint: disable=protected-access
+                    self._send_empty(429)
+                    return True
+                return False
+
+            def _read_body(self):
+                length = int(self.headers.get('Content-Length') or 0)
+                return self.rfile.read(length).decode('utf-8') if length else ''
+
+            def do_POST(self):
+                path = urlparse(self.path).path
+                body = self._read_body()
+                if path == '/oauth/v2/token':
+                    stand_in._count('oauth_token')  # pylint: disable=protected-access
+                    self._send_json({'access_token': 'bench-access-token', 'expires_in': 3600,
+                                     'api_domain': stand_in.url, 'token_type': 'Bearer'})
+                elif path == '/crm/bulk/v2/read':
+                    if self._throttled('bulk_create'):
+                        return
+                    job_id = stand_in.create_job(json.loads(body))
+                    self._send_json({'data': [{'status': 'success', 'code': 'ADDED', 'message': 'Added successfully.',
+                                               'details': {'id': job_id, 'operation': 'read', 'state': 'ADDED',
+                                                           'created_time': format_time(BASE_TIME)}}]})
+                elif path == '/_bench/reset':
+                    stand_in.reset_calls()
+                    self._send_json({})
+                else:
+                    self._send_empty(404)
+
+            def do_GET(self):
+                url = urlparse(self.path)
+                query = {key: values[0] for key, values in parse_qs(url.query).items()}
+                job_match = BULK_JOB_PATH.match(url.path)
+                records_match = RECORDS_PATH.match(url.path)
+                count_match = COUNT_PATH.match(url.path)
+
+                if url.path == '/_bench/calls':
+                    self._send_json(dict(stand_in.calls))
+                elif job_match:
+                    job = stand_in._jobs.get(job_match.group('job_id'))  # pylint: disable=protected-access
+                    if job is None:
+                        self._send_empty(404)
+                    elif job_match.group('result'):
+                        if self._throttled('bulk_result'):
+                            return
+                        if job['expired']:
+                            self._send_empty(404)
+                        else:
+                            self._send_file(job['zip_path'])
+                    elif not self._throttled('bulk_status'):
+                        self._send_json({'data': [{'id': job_match.group('job_id'), 'state': job['state'],
+                                                   'result': {'page': job['page'], 'count': job['count'],
+                                                              'per_page': BULK_PAGE_SIZE,
+                                                              'more_records': job['more_records']}}]})
+                elif url.path == '/crm/v2/settings/modules':
+                    if not self._throttled('modules'):
+                        self._send_json({'modules': [module.describe() for module in stand_in.modules.values()]})
+                elif url.path == '/crm/v2/settings/fields':
+                    if not self._throttled('fields'):
+                        self._send_json({'fields': stand_in.modules[query['module']].fields})
+                elif url.path == '/crm/v2/org':
+                    if not self._throttled('org'):
+                        self._send_json({'org': [{'id': 'bench-org'}]})
+                elif count_match and count_match.group('module') in stand_in.modules:
+                    if not self._throttled('count'):
+                        self._send_json({'count': stand_in.modules[count_match.group('module')].rows})
+                elif records_match and records_match.group('module') in stand_in.modules:
+                    if not self._throttled('records'):
+                        self._send_records(stand_in.modules[records_match.group('module')], query)
+                else:
+                    self._send_empty(404)
+
+            def _send_records(self, module, query):
+                """Serves a page of records in Modified_Time order, or in reverse, modified after If-Modified-Since."""
+                page = int(query.get('page', 1))
+                per_page = min(int(query.get('per_page', REST_PAGE_SIZE)), REST_PAGE_SIZE)
+                fields = set(query['fields'].split(',')) if query.get('fields') else None
+                since = self.headers.get('If-Modified-Since')
+                since = dateutil.parser.parse(since) if since else None
+
+                first_rank = module.get_rank_after(since) if since else 0
+                first = first_rank + (page - 1) * per_page
+                last = min(first + per_page, module.rows)
+                ranks = range(first, last)
+                if query.get('sort_order') == 'desc':
+                    ranks = [module.rows - 1 - (rank - first_rank) for rank in ranks]
+                data = [module.get_record(module.get_row_by_rank(rank), fields=fields) for rank in ranks]
+                if not data:
+                    self._send_empty(204)
+                    return
+                self._send_json({'data': data, 'info': {'page': page, 'per_page': per_page, 'count': len(data),
+                                                        'more_records': last < module.rows}})
+
+        return Handler
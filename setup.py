@@ -15,6 +15,10 @@ setup(
     'python-dateutil==2.8.1',
     'requests==2.21.0'
   ],
+  extras_require={
+    # Faster encoding of RECORD messages
+    'orjson': ['orjson']
+  },
   entry_points="""
     [console_scripts]
     tap-zoho=tap_zoho:main
@@ -10,11 +10,16 @@ import json
 import os
 import tempfile
 import shutil
+from concurrent.futures import ThreadPoolExecutor
 import tap_zoho.zoho as zoho
 from singer import metadata, metrics
 
+from tap_zoho import instrumentation, writer
 from tap_zoho.sync import get_stream_version, sync_records
 from tap_zoho.zoho import Zoho
+from tap_zoho.zoho.discover_cache import (DiscoveryCache, DEFAULT_DISCOVER_CACHE_TTL,
+                                          DEFAULT_DISCOVER_CACHE_MAX_MODULES)
+from tap_zoho.zoho.scheduler import BulkJobScheduler
 from tap_zoho.zoho.exceptions import TapZohoQuotaExceededException, TapZohoException, TapZohoDataNotFoundException
 
 LOGGER = singer.get_logger()
@@ -36,51 +41,129 @@ CONFIG = {
     'persistence_handler_class': 'ZohoAuthPersistence',
     'persistence_handler_path': 'tap_zoho.zohoAuthPersistence',
     "api_type": "BULK",
+    # Falls back to the SDK's apiBaseUrl, then to https://www.zohoapis.com
+    "api_domain": None,
+    "http_pool_size": 10,
+    "http_connect_timeout": 10,
+    "http_read_timeout": 300,
+    "http_max_concurrency": 10,
+    "http_max_retries": 8,
+    "api_quota_reserve": 0,
+    "token_refresh_margin": 300,
+    "bulk_sort_run_size": 50000,
+    "bulk_max_concurrent_jobs": 5,
+    "bulk_callback_url": None,
+    # Set to "" or a public address to accept callbacks from other hosts, the listener does not authenticate them
+    "bulk_callback_host": "127.0.0.1",
+    "bulk_callback_port": 0,
+    "rest_prefetch_pages": 2,
+    "product_cache_size": 10000,
+    "product_cache_path": None,
+    "state_checkpoint_records": 1000,
+    "output_buffer_size": 1048576,
+    "output_flush_interval": 1.0,
+    "output_mode": "RECORD",
+    "batch_dir": None,
+    "batch_max_records": 100000,
+    "batch_compression_level": 1,
+    "bulk_parse_workers": 0,
+    "bulk_parse_chunk_size": 16777216,
+    "bulk_shard_rows": 0,
+    "bulk_shard_max_windows": 10,
+    "auto_bulk_min_rows": 2000,
+    "instrumentation_tracemalloc": False,
+    "instrumentation_summary_path": None,
+    "state_checkpoint_seconds": 30,
+    "discover_max_workers": 8,
+    # The discovery cache is used when a directory is set
+    "discover_cache_dir": None,
+    "discover_cache_ttl": 86400,
+    "discover_cache_max_modules": 500,
+    "discover_cache_refresh": False,
     "current_dir": os.getcwd()
 }
 
 
-def field_to_property_schema(field, mdata):  # pylint:disable=too-many-branches
+def rest_property_schema(field):
     property_schema = {}
 
     field_name = field['api_name']
     zh_type = field['data_type']
 
-    if CONFIG.get('api_type') == 'REST':
-        if zh_type in zoho.LOOKUP_TYPES:
-            # Lookup fields usually have __id and __name fields, defaulting
-            # values for these as 'string'
-            property_schema['type'] = ["null", "object"]
-            property_schema['properties'] = {
-                "name": {"type": ["null", "string"]},
-                "id": {"type": ["null", "string"]}
-            }
-        elif zh_type == 'integer':
-            property_schema['anyOf'] = [{"type": "null"}, {"type": "integer"}]
-        elif zh_type in zoho.DATE_TYPES:
-            date_type = {"type": "string", "format": "date-time"}
-            string_type = {"type": ["string", "null"]}
-            property_schema["anyOf"] = [string_type, date_type]
-        elif zh_type in zoho.STRING_TYPES and field_name == 'Product_Details':
-            property_schema['type'] = "string"
-        elif zh_type in zoho.STRING_TYPES:
-            property_schema['type'] = "string"
-        elif zh_type in zoho.NUMBER_TYPES:
-            property_schema['type'] = "number"
-        elif zh_type == "boolean" or zh_type == 'bool':
-            property_schema['type'] = "boolean"
-        else:
-            # Add whichever is the field name
-            raise TapZohoException("Found unsupported type: {} for field {}".format(zh_type, field_name))
+    if zh_type in zoho.LOOKUP_TYPES:
+        # Lookup fields usually have __id and __name fields, defaulting
+        # values for these as 'string'
+        property_schema['type'] = ["null", "object"]
+        property_schema['properties'] = {
+            "name": {"type": ["null", "string"]},
+            "id": {"type": ["null", "string"]}
+        }
+    elif zh_type == 'integer':
+        property_schema['anyOf'] = [{"type": "null"}, {"type": "integer"}]
+    elif zh_type in zoho.DATE_TYPES:
+        date_type = {"type": "string", "format": "date-time"}
+        string_type = {"type": ["string", "null"]}
+        property_schema["anyOf"] = [string_type, date_type]
+    elif zh_type in zoho.STRING_TYPES and field_name == 'Product_Details':
+        property_schema['type'] = "string"
+    elif zh_type in zoho.STRING_TYPES:
+        property_schema['type'] = "string"
+    elif zh_type in zoho.NUMBER_TYPES:
+        property_schema['type'] = "number"
+    elif zh_type == "boolean" or zh_type == 'bool':
+        property_schema['type'] = "boolean"
+    else:
+        # Add whichever is the field name
+        raise TapZohoException("Found unsupported type: {} for field {}".format(zh_type, field_name))
+
+    return property_schema
+
+
+def bulk_property_schema(field):
+    # BULK PROCESS
+    property_schema = {}
+    zh_type = field['data_type']
+
+    if zh_type in zoho.DATE_TYPES:
+        date_type = {"type": "string", "format": "date-time"}
+        string_type = {"type": ["string", "null"]}
+        property_schema["anyOf"] = [string_type, date_type]
+    elif zh_type == 'integer':
+        property_schema['type'] = ["null", "integer"]
+    elif zh_type in zoho.NUMBER_TYPES - zoho.BULK_STRING_NUMBER_TYPES:
+        property_schema['type'] = ["null", "number"]
+    elif zh_type == "boolean" or zh_type == 'bool':
+        property_schema['type'] = ["null", "boolean"]
+    else:
+        property_schema['type'] = "string"
+
+    return property_schema
+
+
+def union_property_schema(*property_schemas):
+    """Returns a schema accepting the values of every one of `property_schemas`, the alternatives of anyOf schemas
+    are merged and duplicates dropped."""
+    alternatives = []
+    for property_schema in property_schemas:
+        for alternative in property_schema.get('anyOf', [property_schema]):
+            if alternative not in alternatives:
+                alternatives.append(alternative)
+
+    if len(alternatives) == 1:
+        return alternatives[0]
+    return {'anyOf': alternatives}
+
 
+def field_to_property_schema(field, mdata):
+    property_schema = {}
+
+    if CONFIG.get('api_type') == 'REST':
+        property_schema = rest_property_schema(field)
     elif CONFIG.get('api_type') == 'BULK':
-        # BULK PROCESS
-        if zh_type in zoho.DATE_TYPES:
-            date_type = {"type": "string", "format": "date-time"}
-            string_type = {"type": ["string", "null"]}
-            property_schema["anyOf"] = [string_type, date_type]
-        else:
-            property_schema['type'] = "string"
+        property_schema = bulk_property_schema(field)
+    elif CONFIG.get('api_type') == 'AUTO':
+        # A stream may be synced with either api, the REST alternatives come first so objects are kept as is
+        property_schema = union_property_schema(rest_property_schema(field), bulk_property_schema(field))
 
     return property_schema, mdata
 
@@ -109,89 +192,130 @@ def get_replication_key(fields):
     return None
 
 
+def describe_module(zh, sobject_name, cache=None, modified_time=None):
+    if cache is not None:
+        cached = cache.get(sobject_name, modified_time)
+        if cached is not None:
+            LOGGER.info('Using cached fields for {}.'.format(sobject_name))
+            return cached
+
+    LOGGER.info('Fetching fields for {}.'.format(sobject_name))
+    description = zh.describe(sobject_name)
+
+    if cache is not None:
+        cache.put(sobject_name, modified_time, description)
+    return description
+
+
+def get_discovery_cache(zh):
+    if not CONFIG.get('discover_cache_dir'):
+        return None
+
+    refresh = CONFIG.get('discover_cache_refresh')
+    return DiscoveryCache(
+        CONFIG['discover_cache_dir'],
+        zh.get_org_id(),
+        user=CONFIG.get('refresh_token'),
+        ttl=float(CONFIG.get('discover_cache_ttl') or DEFAULT_DISCOVER_CACHE_TTL),
+        max_modules=int(CONFIG.get('discover_cache_max_modules') or DEFAULT_DISCOVER_CACHE_MAX_MODULES),
+        refresh=refresh is True or (isinstance(refresh, str) and refresh.lower() == 'true'))
+
+
 # pylint: disable=too-many-branches,too-many-statements
 def do_discover(zh):
     """Describes a Zoho instance's objects and generates a JSON schema for each field."""
     global_description = zh.describe()
 
-    objects_to_discover = {o['api_name'] for o in global_description['modules']}
+    objects_to_discover = sorted({o['api_name'] for o in global_description['modules']}
+                                 - zoho.ZOHO_UNSUPPORTED_API_MODULES)
 
     key_properties = ['id']
 
     for module in global_description['modules']:
         LOGGER.info('Found Zoho Module {}.'.format(module['api_name']))
 
-    # For each ZH Object describe it, loop its fields and build a schema
-    entries = []
-    for sobject_name in objects_to_discover:
-        if sobject_name not in zoho.ZOHO_UNSUPPORTED_API_MODULES:
-            LOGGER.info('Fetching fields for {}.'.format(sobject_name))
-            sobject_description = zh.describe(sobject_name)
-            fields = sobject_description['fields']
+    # Modules whose modified_time did not change are described from the discovery cache
+    cache = get_discovery_cache(zh)
+    modified_times = {o['api_name']: o.get('modified_time') for o in global_description['modules']}
 
-            if zh.api_type == 'REST':
-                zoho.add_additional_fields(sobject_name, fields)
+    # Describe the ZH Objects concurrently, map() keeps the results in module name order
+    max_workers = int(CONFIG.get('discover_max_workers') or 1)
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        descriptions = list(executor.map(
+            lambda sobject_name: describe_module(zh, sobject_name, cache, modified_times.get(sobject_name)),
+            objects_to_discover))
 
-            for field in fields:
-                LOGGER.info(
-                    'Field {} of Table {} has Data type {}'.format(field['api_name'], sobject_name, field['data_type']))
+    if cache is not None:
+        cache.save()
 
-            replication_key = get_replication_key(fields)
+    # For each ZH Object loop its fields and build a schema
+    entries = []
+    for sobject_name, sobject_description in zip(objects_to_discover, descriptions):
+        # Copied so the additional fields never end up in the cached description
+        fields = list(sobject_description['fields'])
 
-            properties = {}
-            mdata = metadata.new()
+        if zh.api_type in (zoho.REST_API_TYPE, zoho.AUTO_API_TYPE):
+            zoho.add_additional_fields(sobject_name, fields)
 
-            # Adding 'id' in the schema as the first property because this doesn't come with fields by default
-            property_schema, mdata = create_property_schema({'api_name': key_properties[0], 'data_type': 'bigint'},
-                                                            mdata)
-            mdata = metadata.write(
-                mdata, ('properties', key_properties[0]), 'inclusion', 'automatic')
-            properties[key_properties[0]] = property_schema
+        for field in fields:
+            LOGGER.debug('Field %s of Table %s has Data type %s', field['api_name'], sobject_name, field['data_type'])
+
+        replication_key = get_replication_key(fields)
 
-            # Loop over the object's fields
-            for f in fields:
-                field_name = f['api_name']
-                LOGGER.info('Object {} Data Type {} of field {}'.format(sobject_name, f['data_type'], field_name))
-                property_schema, mdata = create_property_schema(
-                    f, mdata)
+        properties = {}
+        mdata = metadata.new()
 
-                inclusion = metadata.get(
-                    mdata, ('properties', field_name), 'inclusion')
+        # Adding 'id' in the schema as the first property because this doesn't come with fields by default
+        property_schema, mdata = create_property_schema({'api_name': key_properties[0], 'data_type': 'bigint'},
+                                                        mdata)
+        mdata = metadata.write(
+            mdata, ('properties', key_properties[0]), 'inclusion', 'automatic')
+        properties[key_properties[0]] = property_schema
 
-                if zh.select_fields_by_default and inclusion != 'unsupported':
-                    mdata = metadata.write(
-                        mdata, ('properties', field_name), 'selected-by-default', True)
+        # Loop over the object's fields
+        for f in fields:
+            field_name = f['api_name']
+            LOGGER.debug('Object %s Data Type %s of field %s', sobject_name, f['data_type'], field_name)
+            property_schema, mdata = create_property_schema(
+                f, mdata)
 
-                properties[field_name] = property_schema
+            inclusion = metadata.get(
+                mdata, ('properties', field_name), 'inclusion')
 
-            if replication_key:
+            if zh.select_fields_by_default and inclusion != 'unsupported':
                 mdata = metadata.write(
-                    mdata, ('properties', replication_key), 'inclusion', 'automatic')
+                    mdata, ('properties', field_name), 'selected-by-default', True)
 
-            if replication_key:
-                mdata = metadata.write(
-                    mdata, (), 'valid-replication-keys', [replication_key])
-                mdata = metadata.write(
-                    mdata, (), 'replication-key', replication_key)
+            properties[field_name] = property_schema
 
+        if replication_key:
             mdata = metadata.write(
-                mdata, (), 'replication-method', 'INCREMENTAL')
+                mdata, ('properties', replication_key), 'inclusion', 'automatic')
+
+        if replication_key:
+            mdata = metadata.write(
+                mdata, (), 'valid-replication-keys', [replication_key])
+            mdata = metadata.write(
+                mdata, (), 'replication-key', replication_key)
+
+        mdata = metadata.write(
+            mdata, (), 'replication-method', 'INCREMENTAL')
 
-            mdata = metadata.write(mdata, (), 'table-key-properties', key_properties)
+        mdata = metadata.write(mdata, (), 'table-key-properties', key_properties)
 
-            schema = {
-                'type': 'object',
-                'properties': properties
-            }
+        schema = {
+            'type': 'object',
+            'properties': properties
+        }
 
-            entry = {
-                'stream': sobject_name,
-                'tap_stream_id': sobject_name,
-                'schema': schema,
-                'metadata': metadata.to_list(mdata)
-            }
+        entry = {
+            'stream': sobject_name,
+            'tap_stream_id': sobject_name,
+            'schema': schema,
+            'metadata': metadata.to_list(mdata)
+        }
 
-            entries.append(entry)
+        entries.append(entry)
 
     result = {'streams': entries}
     json.dump(result, sys.stdout, indent=4)
@@ -228,6 +352,13 @@ def build_state(raw_state, catalog):
             state = singer.write_bookmark(state, tap_stream_id, 'BatchIDs', batches)
             state = singer.write_bookmark(state, tap_stream_id, 'JobHighestBookmarkSeen', current_bookmark)
 
+        # Preserve state that deals with resuming a multi-page or sharded bulk query or a REST sync
+        for key in ['BulkQueryModifiedTime', 'BulkPagesEmitted', 'BulkShards', 'RestResumeModifiedTime',
+                    'RestResumeIds']:
+            value = singer.get_bookmark(raw_state, tap_stream_id, key)
+            if value is not None:
+                state = singer.write_bookmark(state, tap_stream_id, key, value)
+
         if replication_method == 'INCREMENTAL':
             replication_key = catalog_metadata.get((), {}).get('replication-key')
             replication_key_value = singer.get_bookmark(raw_state,
@@ -247,23 +378,17 @@ def build_state(raw_state, catalog):
 
 def do_sync(zh, catalog, state):
     starting_stream = state.get("current_stream")
+    max_concurrent_jobs = int(CONFIG.get('bulk_max_concurrent_jobs') or 1)
+    run_concurrently = zh.api_type in (zoho.BULK_API_TYPE, zoho.AUTO_API_TYPE) and max_concurrent_jobs > 1
 
     if starting_stream:
         LOGGER.info("Resuming sync from %s", starting_stream)
     else:
         LOGGER.info("Starting sync")
 
+    streams_to_sync = []
     for catalog_entry in catalog["streams"]:
-        stream_version = get_stream_version(catalog_entry, state)
-        stream = catalog_entry['stream']
-        stream_alias = catalog_entry.get('stream_alias')
         stream_name = catalog_entry["tap_stream_id"]
-        activate_version_message = singer.ActivateVersionMessage(
-            stream=(stream_alias or stream), version=stream_version)
-
-        catalog_metadata = metadata.to_map(catalog_entry['metadata'])
-        replication_key = catalog_metadata.get((), {}).get('replication-key')
-
         mdata = metadata.to_map(catalog_entry['metadata'])
 
         if not stream_is_selected(mdata):
@@ -277,49 +402,104 @@ def do_sync(zh, catalog, state):
             else:
                 LOGGER.info("%s: Skipping - already synced", stream_name)
                 continue
-        else:
-            LOGGER.info("%s: Starting", stream_name)
-
-        state["current_stream"] = stream_name
-        singer.write_state(state)
-        key_properties = metadata.to_map(catalog_entry['metadata']).get((), {}).get('table-key-properties')
-        singer.write_schema(
-            stream,
-            catalog_entry['schema'],
-            key_properties,
-            replication_key,
-            stream_alias)
-
-        job_id = singer.get_bookmark(state, catalog_entry['tap_stream_id'], 'JobID')
-
-        if job_id:
-            with metrics.record_counter(stream) as counter:
-                LOGGER.info("Found JobID from previous Bulk Query. Resuming sync for job: %s", job_id)
-        else:
-            # Tables with a replication_key or an empty bookmark will emit an
-            # activate_version at the beginning of their sync
-            bookmark_is_empty = state.get('bookmarks', {}).get(catalog_entry['tap_stream_id']) is None
-            if replication_key or bookmark_is_empty:
-                singer.write_message(activate_version_message)
-                state = singer.write_bookmark(state,
-                                              catalog_entry['tap_stream_id'],
-                                              'version',
-                                              stream_version)
-                counter = sync_stream(zh, catalog_entry, state)
-                LOGGER.info("%s: Completed sync (%s rows)", stream_name, counter.value)
+
+        if zh.api_type == zoho.AUTO_API_TYPE and not zh.select_stream_api_type(catalog_entry, state):
+            LOGGER.info("%s: Skipping - no changes", stream_name)
+            continue
+
+        streams_to_sync.append(catalog_entry)
+
+    if run_concurrently:
+        # Streams resuming a bulk job and, in AUTO mode, the streams synced with the REST api go first. So do the
+        # streams sync_catalog_entry does not sync the records of, no bulk job is created for them
+        sequential = [c for c in streams_to_sync if singer.get_bookmark(state, c['tap_stream_id'], 'JobID')
+                      or zh.get_stream_api_type(c['tap_stream_id']) != zoho.BULK_API_TYPE
+                      or not has_records_to_sync(c, state)]
+        for catalog_entry in sequential:
+            state = sync_catalog_entry(zh, catalog_entry, state)
+
+        scheduler = BulkJobScheduler(zh, max_concurrent_jobs)
+        for catalog_entry, job_id in scheduler.run([c for c in streams_to_sync if c not in sequential], state):
+            state = sync_catalog_entry(zh, catalog_entry, state, job_id=job_id)
+    else:
+        for catalog_entry in streams_to_sync:
+            state = sync_catalog_entry(zh, catalog_entry, state)
 
     state["current_stream"] = None
-    singer.write_state(state)
+    writer.write_state(state)
     LOGGER.info("Finished sync")
 
 
-def sync_stream(zh, catalog_entry, state):
+def sync_catalog_entry(zh, catalog_entry, state, job_id=None):
+    """Writes the SCHEMA message of a stream followed by its records and state.
+
+    `job_id` is the already created bulk job for the stream's first page, if any.
+    """
+    stream_version = get_stream_version(catalog_entry, state)
+    stream = catalog_entry['stream']
+    stream_alias = catalog_entry.get('stream_alias')
+    stream_name = catalog_entry["tap_stream_id"]
+    activate_version_message = singer.ActivateVersionMessage(
+        stream=(stream_alias or stream), version=stream_version)
+
+    catalog_metadata = metadata.to_map(catalog_entry['metadata'])
+    replication_key = catalog_metadata.get((), {}).get('replication-key')
+
+    LOGGER.info("%s: Starting", stream_name)
+
+    state["current_stream"] = stream_name
+    writer.write_state(state)
+    key_properties = catalog_metadata.get((), {}).get('table-key-properties')
+    writer.write_schema(
+        stream,
+        catalog_entry['schema'],
+        key_properties,
+        replication_key,
+        stream_alias)
+
+    saved_job_id = singer.get_bookmark(state, catalog_entry['tap_stream_id'], 'JobID')
+
+    if saved_job_id and zh.get_stream_api_type(stream_name) == zoho.BULK_API_TYPE:
+        # The ACTIVATE_VERSION message was written by the interrupted sync, which used the same version
+        LOGGER.info("Found JobID from previous Bulk Query. Resuming sync for job: %s", saved_job_id)
+        counter = sync_stream(zh, catalog_entry, state)
+        LOGGER.info("%s: Completed sync (%s rows)", stream_name, counter.value)
+    elif has_records_to_sync(catalog_entry, state):
+        # Tables with a replication_key or an empty bookmark will emit an
+        # activate_version at the beginning of their sync
+        writer.write_message(activate_version_message)
+        state = singer.write_bookmark(state,
+                                      catalog_entry['tap_stream_id'],
+                                      'version',
+                                      stream_version)
+        counter = sync_stream(zh, catalog_entry, state, job_id=job_id)
+        LOGGER.info("%s: Completed sync (%s rows)", stream_name, counter.value)
+
+    return state
+
+
+def has_records_to_sync(catalog_entry, state):
+    """Returns whether the records of a stream that does not resume a bulk job are synced.
+
+    Streams without a replication_key are only synced while their bookmark is empty.
+    """
+    catalog_metadata = metadata.to_map(catalog_entry['metadata'])
+    replication_key = catalog_metadata.get((), {}).get('replication-key')
+    bookmark_is_empty = state.get('bookmarks', {}).get(catalog_entry['tap_stream_id']) is None
+    return bool(replication_key) or bookmark_is_empty
+
+
+def sync_stream(zh, catalog_entry, state, job_id=None):
     stream = catalog_entry['stream']
 
     with metrics.record_counter(stream) as counter:
         try:
-            sync_records(zh, catalog_entry, state, counter)
-            singer.write_state(state)
+            sync_records(zh, catalog_entry, state, counter, job_id=job_id)
+            writer.write_state(state)
+        except TapZohoQuotaExceededException:
+            # Checkpoint what was synced so far, the next run resumes from here
+            writer.write_state(state)
+            raise
         except Exception as ex:
             raise Exception("Error syncing {}: {}".format(
                 stream, ex)) from ex
@@ -350,10 +530,15 @@ def do_cleanup():
 
 
 def validate():
-    if CONFIG.get('api_type') not in ['REST', 'BULK']:
+    if CONFIG.get('api_type') not in zoho.API_TYPES:
         # Raising error un-supported API_TYPE
         raise TapZohoException(
-            "Found unsupported api_type: {}. Supported api_type are {}".format(CONFIG.get('api_type'), '[REST, BULK]'))
+            "Found unsupported api_type: {}. Supported api_type are [{}]".format(
+                CONFIG.get('api_type'), ', '.join(zoho.API_TYPES)))
+    if CONFIG.get('output_mode') not in writer.OUTPUT_MODES:
+        raise TapZohoException(
+            "Found unsupported output_mode: {}. Supported output_mode are [{}]".format(
+                CONFIG.get('output_mode'), ', '.join(writer.OUTPUT_MODES)))
 
 
 def main_impl():
@@ -374,7 +559,25 @@ def main_impl():
         elif args.properties:
             catalog = args.properties
             state = build_state(args.state, catalog)
-            do_sync(zh, catalog, state)
+            writer.configure(
+                buffer_size=int(CONFIG.get('output_buffer_size') or writer.DEFAULT_BUFFER_SIZE),
+                flush_interval=float(CONFIG.get('output_flush_interval') or 0),
+                output_mode=CONFIG.get('output_mode') or writer.RECORD_OUTPUT_MODE,
+                batch_dir=CONFIG.get('batch_dir') or writer.DEFAULT_BATCH_DIR,
+                batch_max_records=int(CONFIG.get('batch_max_records') or writer.DEFAULT_BATCH_MAX_RECORDS),
+                batch_compression_level=int(CONFIG.get('batch_compression_level')
+                                            or writer.DEFAULT_BATCH_COMPRESSION_LEVEL))
+            trace_memory = CONFIG.get('instrumentation_tracemalloc')
+            instrumentation.configure(
+                trace_memory=trace_memory is True or (isinstance(trace_memory, str) and trace_memory.lower() == 'true'))
+            zh.start_bulk_callback_listener()
+            try:
+                do_sync(zh, catalog, state)
+            finally:
+                zh.stop_bulk_callback_listener()
+                zh.stop_csv_parse_pool()
+                writer.close()
+                instrumentation.INSTRUMENTATION.write_summary(CONFIG.get('instrumentation_summary_path'))
     finally:
         LOGGER.info('Finally printing')
         do_cleanup()
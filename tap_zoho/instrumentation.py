@@ -0,0 +1,215 @@
+"""
+Per-stream, per-stage timing and memory instrumentation of a sync.
+
+Stages time the work of one step of a stream, such as waiting on a bulk job, downloading, reading and sorting
+the result, transforming, serializing or writing state. They are emitted as Singer metrics when the stream ends
+and written as a JSON summary when the run ends. With tracemalloc enabled the peak Python memory of each stream
+and of each `stage` block is attributed too, at a considerable cost in speed.
+"""
+
+import contextlib
+import json
+import resource
+import sys
+import threading
+import time
+import tracemalloc
+
+import singer
+from singer import metrics
+
+LOGGER = singer.get_logger()
+
+
+def get_peak_rss():
+  """Returns the peak resident set size of the process in bytes."""
+  peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+  # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+  return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def _reset_peak():
+  # tracemalloc.reset_peak is new in Python 3.9, without it peaks are those since the start of tracing
+  if hasattr(tracemalloc, 'reset_peak'):
+    tracemalloc.reset_peak()
+
+
+class IterTimer():
+  """Iterates `iterable`, adding up the time spent producing its items in `seconds`.
+
+  The time the consumer spends between items is not included.
+  """
+
+  def __init__(self, iterable):
+    self._iterator = iter(iterable)
+    self.seconds = 0.0
+    self.calls = 0
+
+  def __iter__(self):
+    return self
+
+  def __next__(self):
+    started = time.perf_counter()
+    try:
+      item = next(self._iterator)
+    finally:
+      self.seconds += time.perf_counter() - started
+    self.calls += 1
+    return item
+
+
+class _StreamStats():
+  def __init__(self):
+    self.stages = {}
+    self.records = 0
+    self.seconds = 0.0
+    self.started = None
+    self.rss_before = None
+    self.rss_growth = None
+    self.peak_memory = None
+
+  def add(self, stage, seconds, calls):
+    totals = self.stages.setdefault(stage, {'seconds': 0.0, 'calls': 0})
+    totals['seconds'] += seconds
+    totals['calls'] += calls
+
+  def set_peak_memory(self, stage, peak):
+    totals = self.stages.setdefault(stage, {'seconds': 0.0, 'calls': 0})
+    totals['peak_memory'] = max(totals.get('peak_memory', 0), peak)
+
+  def asdict(self):
+    result = {'records': self.records,
+              'seconds': round(self.seconds, 4),
+              'records_per_sec': round(self.records / self.seconds, 1) if self.seconds else None,
+              'rss_growth': self.rss_growth,
+              'stages': {stage: dict(totals, seconds=round(totals['seconds'], 4))
+                         for stage, totals in sorted(self.stages.items())}}
+    if self.peak_memory is not None:
+      result['peak_memory'] = self.peak_memory
+    return result
+
+
+class Instrumentation():
+  """Collects stage timings and memory per stream.
+
+  Stages may nest: the bulk and REST stages run inside the `extract` stage of sync_records, which includes them.
+  Stages running in background threads, such as fetching REST pages ahead, overlap the other stages.
+  """
+
+  def __init__(self, trace_memory=False):
+    self.trace_memory = trace_memory
+    self.started = time.monotonic()
+    self._streams = {}
+    self._lock = threading.Lock()
+    # Peaks of the stage blocks open in the main thread, innermost last
+    self._open_peaks = []
+
+  def _get_stream(self, stream):
+    stats = self._streams.get(stream)
+    if stats is None:
+      with self._lock:
+        stats = self._streams.setdefault(stream, _StreamStats())
+    return stats
+
+  def enable_tracemalloc(self):
+    self.trace_memory = True
+    if not tracemalloc.is_tracing():
+      tracemalloc.start()
+
+  def add(self, stream, stage, seconds, calls=1):
+    stats = self._get_stream(stream)
+    with self._lock:
+      stats.add(stage, seconds, calls)
+
+  def _fold_peak(self):
+    """Adds the traced peak since the last reset to every open stage block and resets it."""
+    peak = tracemalloc.get_traced_memory()[1]
+    _reset_peak()
+    for index, open_peak in enumerate(self._open_peaks):
+      self._open_peaks[index] = max(open_peak, peak)
+
+  @contextlib.contextmanager
+  def stage(self, stream, stage):
+    """Times the block as `stage` of `stream`.
+
+    With tracemalloc the peak traced memory of the whole process while the block ran is kept as its peak_memory.
+    """
+    trace = self.trace_memory and tracemalloc.is_tracing() and threading.current_thread() is threading.main_thread()
+    if trace:
+      self._fold_peak()
+      self._open_peaks.append(tracemalloc.get_traced_memory()[0])
+    started = time.perf_counter()
+    try:
+      yield
+    finally:
+      self.add(stream, stage, time.perf_counter() - started)
+      if trace:
+        self._fold_peak()
+        peak = self._open_peaks.pop()
+        stats = self._get_stream(stream)
+        stats.set_peak_memory(stage, peak)
+        # The traced peak is reset by every stage block, so the stream keeps the highest of its stages too
+        stats.peak_memory = max(stats.peak_memory or 0, peak)
+
+  def start_stream(self, stream):
+    stats = self._get_stream(stream)
+    stats.started = time.monotonic()
+    stats.rss_before = get_peak_rss()
+    if self.trace_memory and tracemalloc.is_tracing():
+      _reset_peak()
+
+  def end_stream(self, stream, records):
+    """Records the totals of `stream` and emits its stages as Singer metrics."""
+    stats = self._get_stream(stream)
+    stats.records += records
+    if stats.started is not None:
+      stats.seconds += time.monotonic() - stats.started
+      stats.started = None
+    if stats.rss_before is not None:
+      # The growth of the process peak RSS while this stream was synced
+      stats.rss_growth = get_peak_rss() - stats.rss_before
+    if self.trace_memory and tracemalloc.is_tracing():
+      stats.peak_memory = max(stats.peak_memory or 0, tracemalloc.get_traced_memory()[1])
+
+    for stage, totals in sorted(stats.stages.items()):
+      metrics.log(LOGGER, metrics.Point('timer', 'stage_duration', round(totals['seconds'], 4),
+                                        {'endpoint': stream, 'stage': stage, 'calls': totals['calls']}))
+    metrics.log(LOGGER, metrics.Point('gauge', 'peak_rss_growth', stats.rss_growth, {'endpoint': stream}))
+    if stats.peak_memory is not None:
+      metrics.log(LOGGER, metrics.Point('gauge', 'peak_traced_memory', stats.peak_memory, {'endpoint': stream}))
+
+  def get_summary(self):
+    with self._lock:
+      streams = {stream: stats.asdict() for stream, stats in sorted(self._streams.items())}
+    return {'seconds': round(time.monotonic() - self.started, 4),
+            'peak_rss': get_peak_rss(),
+            'tracemalloc': self.trace_memory,
+            'streams': streams}
+
+  def write_summary(self, path=None):
+    """Writes the JSON summary of the run to `path`, or logs it when no path is given."""
+    summary = self.get_summary()
+    if path:
+      with open(path, 'w') as summary_file:
+        json.dump(summary, summary_file, indent=2)
+      LOGGER.info('Wrote sync summary to {}'.format(path))
+    else:
+      LOGGER.info('Sync summary: {}'.format(json.dumps(summary)))
+    return summary
+
+
+INSTRUMENTATION = Instrumentation()
+
+
+def configure(trace_memory=False):
+  if trace_memory:
+    INSTRUMENTATION.enable_tracemalloc()
+
+
+def stage(stream, name):
+  return INSTRUMENTATION.stage(stream, name)
+
+
+def add(stream, name, seconds, calls=1):
+  INSTRUMENTATION.add(stream, name, seconds, calls)
+
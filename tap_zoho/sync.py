@@ -4,15 +4,22 @@ Created on Dec 14, 2019
 @author: Juned Jabbar
 """
 
+import datetime
 import time
 import singer
 import singer.utils as singer_utils
 import copy
 from tap_zoho.zoho.exceptions import TapZohoDataNotFoundException, get_error_message
-from singer import Transformer, metadata
+from singer import metadata
+from tap_zoho.transform import RecordTransformer
+from tap_zoho import writer
+from tap_zoho import instrumentation
 
 LOGGER = singer.get_logger()
 
+DEFAULT_CHECKPOINT_RECORDS = 1000
+DEFAULT_CHECKPOINT_SECONDS = 30
+
 
 # pylint: disable=unused-argument
 def transform_bulk_data_hook(data, typ, schema):
@@ -38,6 +45,33 @@ def transform_bulk_data_hook(data, typ, schema):
   return result
 
 
+def compile_bulk_data_hook(typ, schema):
+  """Returns transform_bulk_data_hook specialised for one (typ, schema) pair, for the compiled transformer."""
+  types = schema.get('type', [])
+  zero_float_to_zero = 'integer' in types
+  none_to_zero = 'integer' in types or 'number' in types
+  empty_to_none = "null" in schema['type']
+  none_to_empty = 'string' in types or 'date-time' in types
+
+  if none_to_empty:
+    none_value = ''
+  elif none_to_zero:
+    none_value = '0'
+  else:
+    none_value = None
+
+  def hook(data):
+    if data is None:
+      return none_value
+    if zero_float_to_zero and data == '0.0':
+      return '0'
+    if empty_to_none and data == "":
+      return None
+    return data
+
+  return hook
+
+
 def fix_tuple_keys(rec):
   to_return = copy.copy(rec)
   if isinstance(rec, dict):
@@ -60,6 +94,81 @@ def fix_tuple_keys(rec):
   return to_return
 
 
+def _get_utc_offset(value):
+  """Returns the UTC offset suffix of an ISO 8601 timestamp such as '2019-12-14T10:00:00+05:30', or None."""
+  if len(value) < 20 or value[10] != 'T':
+    return None
+  if value[-1] == 'Z':
+    return 'Z'
+  if value[-6] in '+-' and value[-3] == ':':
+    return value[-6:]
+  return None
+
+
+class ReplicationKeyTracker():
+  """Keeps the highest replication key value seen that is not later than `start_time`.
+
+  Values that share their length and UTC offset are compared as strings, which orders ISO 8601 timestamps
+  correctly without parsing them. Any other pair of values is parsed. Records may arrive in any order, the
+  tracked value never moves backwards.
+  """
+
+  def __init__(self, start_time, value=None):
+    self.start_time = start_time
+    self.value = value
+    self._start_times = {}
+
+  def _start_time_as(self, offset):
+    if offset not in self._start_times:
+      if offset == 'Z':
+        start_time = self.start_time.astimezone(datetime.timezone.utc)
+      else:
+        sign = -1 if offset[0] == '-' else 1
+        delta = datetime.timedelta(hours=int(offset[1:3]), minutes=int(offset[4:6]))
+        start_time = self.start_time.astimezone(datetime.timezone(sign * delta))
+      self._start_times[offset] = start_time.strftime('%Y-%m-%dT%H:%M:%S') + offset
+    return self._start_times[offset]
+
+  def offer(self, value):
+    """Returns True if `value` became the tracked value."""
+    if not value:
+      return False
+
+    offset = _get_utc_offset(value)
+    if offset and len(value) == 19 + len(offset):
+      if value > self._start_time_as(offset):
+        return False
+    elif singer_utils.strptime_with_tz(value) > self.start_time:
+      return False
+
+    if self.value and _get_utc_offset(self.value) == offset and len(self.value) == len(value) and offset:
+      is_newer = value > self.value
+    else:
+      is_newer = not self.value or singer_utils.strptime_with_tz(value) > singer_utils.strptime_with_tz(self.value)
+
+    if is_newer:
+      self.value = value
+    return is_newer
+
+
+class StateCheckpointer():
+  """Decides when to write STATE: every `every_records` records or `every_seconds` seconds, whichever is first."""
+
+  def __init__(self, every_records=DEFAULT_CHECKPOINT_RECORDS, every_seconds=DEFAULT_CHECKPOINT_SECONDS):
+    self.every_records = every_records
+    self.every_seconds = every_seconds
+    self._records = 0
+    self._last_checkpoint = time.monotonic()
+
+  def checkpoint(self, state):
+    self._records += 1
+    now = time.monotonic()
+    if self._records >= self.every_records or now - self._last_checkpoint >= self.every_seconds:
+      writer.write_state(state)
+      self._records = 0
+      self._last_checkpoint = now
+
+
 def get_stream_version(catalog_entry, state):
   tap_stream_id = catalog_entry['tap_stream_id']
   catalog_metadata = metadata.to_map(catalog_entry['metadata'])
@@ -75,7 +184,7 @@ def get_stream_version(catalog_entry, state):
   return int(time.time() * 1000)
 
 
-def sync_records(zh, catalog_entry, state, counter):
+def sync_records(zh, catalog_entry, state, counter, job_id=None):
   stream = catalog_entry['stream']
   schema = catalog_entry['schema']
   stream_alias = catalog_entry.get('stream_alias')
@@ -86,44 +195,69 @@ def sync_records(zh, catalog_entry, state, counter):
                                                            version=stream_version)
 
   start_time = singer_utils.now()
+  started = time.monotonic()
 
   LOGGER.info('Syncing Zoho data for stream {}'.format(stream))
 
+  transformer = RecordTransformer(schema, pre_hook=transform_bulk_data_hook, hook_compiler=compile_bulk_data_hook)
+  bookmarks = ReplicationKeyTracker(
+    start_time, replication_key and singer.get_bookmark(state, catalog_entry['tap_stream_id'], replication_key))
+  checkpointer = StateCheckpointer(
+    every_records=int(zh.config.get('state_checkpoint_records') or DEFAULT_CHECKPOINT_RECORDS),
+    every_seconds=float(zh.config.get('state_checkpoint_seconds') or DEFAULT_CHECKPOINT_SECONDS))
+
+  is_rest = zh.get_stream_api_type(catalog_entry['tap_stream_id']) == 'REST'
+  instrumentation.INSTRUMENTATION.start_stream(stream)
+  records = instrumentation.IterTimer(zh.get_data(sobject=stream, state=state, catalog=catalog_entry, job_id=job_id))
+  transform_seconds = serialize_seconds = state_seconds = 0.0
+  perf_counter = time.perf_counter
+
   try:
-    for rec in zh.get_data(sobject=stream, state=state, catalog=catalog_entry):
+    for rec in records:
       counter.increment()
-      if zh.api_type == 'REST':
-        with Transformer(pre_hook=transform_bulk_data_hook) as transformer:
-          rec = transformer.transform(rec, schema)
-      singer.write_message(
-        singer.RecordMessage(
-          stream=(
-            stream_alias or stream),
-          record=rec,
-          version=stream_version,
-          time_extracted=start_time))
-
-      replication_key_value = replication_key and singer_utils.strptime_with_tz(rec[replication_key])
-
-      if replication_key_value and replication_key_value <= start_time:
+      transform_started = perf_counter()
+      if is_rest:
+        rec = transformer.transform(rec)
+      serialize_started = perf_counter()
+      writer.write_record(stream_alias or stream, rec, version=stream_version, time_extracted=start_time)
+      state_started = perf_counter()
+
+      if replication_key and bookmarks.offer(rec.get(replication_key)):
         state = singer.write_bookmark(
           state,
           catalog_entry['tap_stream_id'],
           replication_key,
-          rec[replication_key])
-        singer.write_state(state)
+          bookmarks.value)
+
+      checkpointer.checkpoint(state)
+      state_finished = perf_counter()
+      transform_seconds += serialize_started - transform_started
+      serialize_seconds += state_started - serialize_started
+      state_seconds += state_finished - state_started
 
         # Tables with no replication_key will send an
         # activate_version message for the next sync
     if not replication_key:
-      singer.write_message(activate_version_message)
+      writer.write_message(activate_version_message)
       state = singer.write_bookmark(
         state, catalog_entry['tap_stream_id'], 'version', None)
 
   except TapZohoDataNotFoundException as data_not_found_ex:
     LOGGER.warning('No data found for stream {} error msg {} '.format(stream, get_error_message(data_not_found_ex)))
 
+  finally:
+    instrumentation.add(stream, 'extract', records.seconds, records.calls)
+    instrumentation.add(stream, 'transform', transform_seconds, records.calls)
+    instrumentation.add(stream, 'serialize', serialize_seconds, records.calls)
+    instrumentation.add(stream, 'state', state_seconds, records.calls)
+
+  transformer.log_warning()
+  elapsed = time.monotonic() - started
+  LOGGER.info('Wrote {} records of stream {} in {:.1f}s ({:.0f} records/sec)'.format(
+    counter.value, stream, elapsed, counter.value / elapsed if elapsed else 0))
+  instrumentation.INSTRUMENTATION.end_stream(stream, counter.value)
+
   if not replication_key:
-    singer.write_message(activate_version_message)
+    writer.write_message(activate_version_message)
     state = singer.write_bookmark(
       state, catalog_entry['tap_stream_id'], 'version', None)
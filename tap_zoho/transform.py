@@ -0,0 +1,211 @@
+"""
+Record transformer compiled once per stream from the catalog schema.
+
+Produces the same output as `singer.Transformer.transform`, but resolves the schema of every property, the order
+of its types and its pre hook once instead of for every value of every record.
+"""
+
+import singer
+from singer import Transformer
+from singer.transform import string_to_datetime
+
+LOGGER = singer.get_logger()
+
+
+def _identity(data):
+  return data
+
+
+def _compile_type(typ, schema, factory, path, removed):
+  # pylint: disable=too-many-statements
+  hook = factory.compile(typ, schema)
+
+  if typ == "null":
+    def convert(data):
+      data = hook(data)
+      if data is None or data == "":
+        return True, None
+      return False, None
+
+  elif schema.get("format") == "date-time":
+    def convert(data):
+      data = hook(data)
+      if data is None or data == "":
+        return False, None
+      data = string_to_datetime(data)
+      if data is None:
+        return False, None
+      return True, data
+
+  elif typ == "object":
+    properties = schema.get("properties", {})
+    if properties == {}:
+      def convert(data):
+        data = hook(data)
+        return isinstance(data, dict), data
+    else:
+      convert = _compile_object(properties, hook, factory, path, removed)
+
+  elif typ == "array":
+    items = _compile_schema(schema["items"], factory, path, removed)
+
+    def convert(data):
+      data = hook(data)
+      if not isinstance(data, list):
+        return False, data
+      result = []
+      success = True
+      for row in data:
+        row_success, row = items(row)
+        success = success and row_success
+        result.append(row)
+      return success, result
+
+  elif typ == "string":
+    def convert(data):
+      data = hook(data)
+      if data is None:
+        return False, None
+      try:
+        return True, str(data)
+      except Exception:  # pylint: disable=broad-except
+        return False, None
+
+  elif typ in ("integer", "number"):
+    cast = int if typ == "integer" else float
+
+    def convert(data):
+      data = hook(data)
+      if isinstance(data, str):
+        data = data.replace(",", "")
+      try:
+        return True, cast(data)
+      except Exception:  # pylint: disable=broad-except
+        return False, None
+
+  elif typ == "boolean":
+    def convert(data):
+      data = hook(data)
+      if isinstance(data, str) and data.lower() == "false":
+        return True, False
+      try:
+        return True, bool(data)
+      except Exception:  # pylint: disable=broad-except
+        return False, None
+
+  else:
+    def convert(data):
+      return False, None
+
+  return convert
+
+
+def _compile_object(properties, hook, factory, path, removed):
+  compiled = {key: _compile_schema(subschema, factory, path + [key], removed)
+              for key, subschema in properties.items()}
+  prefix = ".".join(map(str, path + [""]))
+
+  def convert(data):
+    data = hook(data)
+    if not isinstance(data, dict):
+      return False, data
+    result = {}
+    success = True
+    for key, value in data.items():
+      property_convert = compiled.get(key)
+      if property_convert is None:
+        removed.add(prefix + str(key))
+        continue
+      value_success, result[key] = property_convert(value)
+      success = success and value_success
+    return success, result
+
+  return convert
+
+
+class _HookFactory():
+  """Builds the pre hook applied before converting a value to one type of a schema."""
+
+  def __init__(self, pre_hook=None, hook_compiler=None):
+    self.pre_hook = pre_hook
+    self.hook_compiler = hook_compiler
+
+  def compile(self, typ, schema):
+    if self.hook_compiler:
+      return self.hook_compiler(typ, schema)
+    if self.pre_hook:
+      pre_hook = self.pre_hook
+      return lambda data: pre_hook(data, typ, schema)
+    return _identity
+
+
+def _compile_schema(schema, factory, path, removed):
+  if "anyOf" in schema:
+    subschemas = [_compile_schema(subschema, factory, path, removed) for subschema in schema["anyOf"]]
+
+    def convert(data):
+      for subschema_convert in subschemas:
+        success, result = subschema_convert(data)
+        if success:
+          return success, result
+      return False, None
+
+    return convert
+
+  if "type" not in schema:
+    return lambda data: (True, data)
+
+  types = schema["type"]
+  if not isinstance(types, list):
+    types = [types]
+  # Singer always tries 'null' last
+  types = [typ for typ in types if typ != "null"] + [typ for typ in types if typ == "null"]
+
+  converters = [_compile_type(typ, schema, factory, path, removed) for typ in types]
+  if len(converters) == 1:
+    return converters[0]
+
+  def convert(data):
+    for type_convert in converters:
+      success, result = type_convert(data)
+      if success:
+        return success, result
+    return False, None
+
+  return convert
+
+
+class RecordTransformer():
+  """Transforms records of one stream against its schema.
+
+  `pre_hook` has the signature of a `singer.Transformer` pre hook. `hook_compiler(typ, schema)` may return an
+  equivalent single-argument function per (type, schema) pair, which is then used instead of `pre_hook`. Records
+  that do not match the schema are transformed again by `singer.Transformer`, which raises the usual
+  SchemaMismatch.
+  """
+
+  def __init__(self, schema, pre_hook=None, hook_compiler=None):
+    self.schema = schema
+    self.pre_hook = pre_hook
+    self.removed = set()
+    self._convert = _compile_schema(schema, _HookFactory(pre_hook, hook_compiler), [], self.removed)
+
+  def transform(self, data):
+    success, result = self._convert(data)
+    if success:
+      return result
+
+    with Transformer(pre_hook=self.pre_hook) as transformer:
+      return transformer.transform(data, self.schema)
+
+  def log_warning(self):
+    if self.removed:
+      LOGGER.warning("Removed %s paths during transforms:\n\t%s",
+                     len(self.removed),
+                     "\n\t".join(sorted(self.removed)))
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, *args):
+    self.log_warning()
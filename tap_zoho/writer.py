@@ -0,0 +1,299 @@
+"""
+Buffered writer of Singer messages to stdout.
+
+RECORD messages are built from a per-stream prefix and suffix around the encoded record, and written in large
+buffered writes instead of one write and flush per message. Every other message flushes the buffer, so STATE is
+always written after the records it covers. Records are encoded with orjson when it is installed.
+
+In BATCH output mode the records are written to gzipped JSONL files referenced by BATCH messages instead.
+"""
+
+import datetime
+import gzip
+import os
+import pathlib
+import sys
+import tempfile
+import time
+
+import pytz
+import simplejson
+import singer
+import singer.utils as singer_utils
+
+try:
+  import orjson
+except ImportError:  # pragma: no cover
+  orjson = None
+
+DEFAULT_BUFFER_SIZE = 1024 * 1024
+DEFAULT_FLUSH_INTERVAL = 1.0
+
+RECORD_OUTPUT_MODE = 'RECORD'
+BATCH_OUTPUT_MODE = 'BATCH'
+OUTPUT_MODES = [RECORD_OUTPUT_MODE, BATCH_OUTPUT_MODE]
+DEFAULT_BATCH_DIR = os.path.join(tempfile.gettempdir(), 'tap-zoho-batches')
+DEFAULT_BATCH_MAX_RECORDS = 100000
+# Compression favours speed, the files are read once by the target
+DEFAULT_BATCH_COMPRESSION_LEVEL = 1
+BATCH_ENCODING = {'format': 'jsonl', 'compression': 'gzip'}
+
+_ENCODER = simplejson.JSONEncoder(use_decimal=True)
+
+
+def encode_record(record):
+  """Returns `record` encoded as JSON bytes."""
+  if orjson is not None:
+    try:
+      return orjson.dumps(record)
+    except TypeError:
+      # orjson has no Decimal support, they are written with all their digits like singer does
+      pass
+  return _ENCODER.encode(record).encode('utf-8')
+
+
+class EncodedRecord():
+  """A record already encoded by `encode_record`, such as in a worker process.
+
+  `values` holds the few values of the record the tap reads, like its replication key, and is read with `get`.
+  """
+
+  __slots__ = ('record_json', 'values')
+
+  def __init__(self, record_json, values=None):
+    self.record_json = record_json
+    self.values = values or {}
+
+  def get(self, key, default=None):
+    return self.values.get(key, default)
+
+
+class MessageWriter():
+  """Writes Singer messages to `out`, a binary stream, holding up to `buffer_size` bytes of RECORD messages.
+
+  The buffer is written when it is full, when `flush_interval` seconds passed since the last write, and before
+  any other message.
+  """
+
+  def __init__(self, out=None, buffer_size=DEFAULT_BUFFER_SIZE, flush_interval=DEFAULT_FLUSH_INTERVAL):
+    self.out = out
+    self.buffer_size = buffer_size
+    self.flush_interval = flush_interval
+    self._parts = []
+    self._size = 0
+    self._last_flush = time.monotonic()
+    self._affixes = {}
+
+  def _get_out(self):
+    if self.out is not None:
+      return self.out
+    # Anything written to the text layer of stdout has to go out before the buffered bytes
+    sys.stdout.flush()
+    return sys.stdout.buffer
+
+  def _get_affixes(self, stream, version, time_extracted):
+    key = (stream, version, time_extracted)
+    affixes = self._affixes.get(key)
+    if affixes is None:
+      prefix = '{{"type": "RECORD", "stream": {}, "record": '.format(_ENCODER.encode(stream))
+      suffix = ''
+      if version is not None:
+        suffix += ', "version": {}'.format(_ENCODER.encode(version))
+      if time_extracted:
+        suffix += ', "time_extracted": {}'.format(
+          _ENCODER.encode(singer_utils.strftime(time_extracted.astimezone(pytz.utc))))
+      affixes = (prefix.encode('utf-8'), (suffix + '}\n').encode('utf-8'))
+      self._affixes[key] = affixes
+    return affixes
+
+  def write_record(self, stream, record, version=None, time_extracted=None):
+    prefix, suffix = self._get_affixes(stream, version, time_extracted)
+    if isinstance(record, EncodedRecord):
+      self.write_record_json(prefix, record.record_json, suffix)
+    else:
+      self.write_record_json(prefix, encode_record(record), suffix)
+
+  def write_record_json(self, prefix, record_json, suffix):
+    self._parts.append(prefix)
+    self._parts.append(record_json)
+    self._parts.append(suffix)
+    self._size += len(prefix) + len(record_json) + len(suffix)
+    if self._size >= self.buffer_size or time.monotonic() - self._last_flush >= self.flush_interval:
+      self.flush()
+
+  def write_message(self, message):
+    self._parts.append((singer.format_message(message) + '\n').encode('utf-8'))
+    self.flush()
+
+  def flush(self):
+    if self._parts:
+      out = self._get_out()
+      out.write(b''.join(self._parts))
+      out.flush()
+      self._parts = []
+      self._size = 0
+    self._last_flush = time.monotonic()
+
+  def close(self):
+    """Writes everything that is held back."""
+    self.flush()
+
+
+class BatchMessage(singer.Message):
+  """BATCH message, referencing files of records of `stream` encoded as described by `encoding`."""
+
+  def __init__(self, stream, encoding, manifest):
+    self.stream = stream
+    self.encoding = encoding
+    self.manifest = manifest
+
+  def asdict(self):
+    return {
+      'type': 'BATCH',
+      'stream': self.stream,
+      'encoding': self.encoding,
+      'manifest': self.manifest
+    }
+
+
+class _BatchFile():
+  def __init__(self, path, compression_level, buffer_size):
+    self.path = path
+    self.buffer_size = buffer_size
+    self.records = 0
+    self._file = gzip.open(path, 'wb', compresslevel=compression_level)
+    self._parts = []
+    self._size = 0
+
+  def write(self, record_json):
+    self._parts.append(record_json)
+    self._parts.append(b'\n')
+    self._size += len(record_json) + 1
+    self.records += 1
+    if self._size >= self.buffer_size:
+      self._write_parts()
+
+  def _write_parts(self):
+    self._file.write(b''.join(self._parts))
+    self._parts = []
+    self._size = 0
+
+  def close(self):
+    self._write_parts()
+    self._file.close()
+
+
+class BatchMessageWriter(MessageWriter):
+  """Writes the records of each stream to gzipped JSONL files of at most `max_records` records in `batch_dir`
+  instead of RECORD messages, and a BATCH message referencing every file once it is complete.
+
+  STATE messages are held back until the files holding the records they cover are referenced, only the last
+  one is kept. Any other message completes the open files first, so messages stay in order with the records.
+  """
+
+  def __init__(self, out=None, batch_dir=DEFAULT_BATCH_DIR, max_records=DEFAULT_BATCH_MAX_RECORDS,
+               compression_level=DEFAULT_BATCH_COMPRESSION_LEVEL, buffer_size=DEFAULT_BUFFER_SIZE):
+    super().__init__(out=out, buffer_size=buffer_size, flush_interval=0)
+    self.batch_dir = batch_dir
+    self.max_records = max_records
+    self.compression_level = compression_level
+    self._files = {}
+    self._sequence = 0
+    self._run_id = datetime.datetime.now(datetime.timezone.utc).strftime('%Y%m%dT%H%M%S')
+    self._held_state = None
+
+  def _open_file(self, stream):
+    os.makedirs(self.batch_dir, exist_ok=True)
+    self._sequence += 1
+    file_name = '{}-{}-{}-{:05d}.jsonl.gz'.format(stream, self._run_id, os.getpid(), self._sequence)
+    return _BatchFile(os.path.join(self.batch_dir, file_name), self.compression_level, self.buffer_size)
+
+  def write_record(self, stream, record, version=None, time_extracted=None):
+    batch_file = self._files.get(stream)
+    if batch_file is None:
+      batch_file = self._files[stream] = self._open_file(stream)
+    batch_file.write(record.record_json if isinstance(record, EncodedRecord) else encode_record(record))
+    if batch_file.records >= self.max_records:
+      self._complete(stream)
+      self._write_held_state()
+
+  def _complete(self, stream):
+    batch_file = self._files.pop(stream)
+    batch_file.close()
+    uri = pathlib.Path(os.path.abspath(batch_file.path)).as_uri()
+    super().write_message(BatchMessage(stream, dict(BATCH_ENCODING), [uri]))
+
+  def _write_held_state(self):
+    if self._held_state is not None:
+      self._parts.append(self._held_state)
+      self._held_state = None
+      self.flush()
+
+  def complete_batches(self):
+    """Completes every open file and writes the STATE held back."""
+    for stream in list(self._files):
+      self._complete(stream)
+    self._write_held_state()
+
+  def write_message(self, message):
+    if isinstance(message, singer.StateMessage) and self._files:
+      # Formatted now, the state is modified in place as the sync goes on
+      self._held_state = (singer.format_message(message) + '\n').encode('utf-8')
+      return
+    self.complete_batches()
+    super().write_message(message)
+
+  def close(self):
+    self.complete_batches()
+    self.flush()
+
+
+WRITER = MessageWriter()
+
+
+def configure(buffer_size=DEFAULT_BUFFER_SIZE, flush_interval=DEFAULT_FLUSH_INTERVAL, output_mode=RECORD_OUTPUT_MODE,
+              batch_dir=DEFAULT_BATCH_DIR, batch_max_records=DEFAULT_BATCH_MAX_RECORDS,
+              batch_compression_level=DEFAULT_BATCH_COMPRESSION_LEVEL):
+  """Configures the writer of the sync, BATCH `output_mode` writes the records to files referenced by BATCH
+  messages."""
+  # pylint: disable=global-statement,too-many-arguments
+  global WRITER
+  WRITER.close()
+  if output_mode == BATCH_OUTPUT_MODE:
+    WRITER = BatchMessageWriter(out=WRITER.out, batch_dir=batch_dir, max_records=batch_max_records,
+                                compression_level=batch_compression_level, buffer_size=buffer_size)
+  else:
+    WRITER = MessageWriter(out=WRITER.out, buffer_size=buffer_size, flush_interval=flush_interval)
+
+
+def write_record(stream, record, version=None, time_extracted=None):
+  WRITER.write_record(stream, record, version=version, time_extracted=time_extracted)
+
+
+def write_message(message):
+  WRITER.write_message(message)
+
+
+def write_state(value):
+  WRITER.write_message(singer.StateMessage(value=value))
+
+
+def write_schema(stream_name, schema, key_properties, bookmark_properties=None, stream_alias=None):
+  if isinstance(key_properties, (str, bytes)):
+    key_properties = [key_properties]
+  if not isinstance(key_properties, list):
+    raise Exception("key_properties must be a string or list of strings")
+
+  WRITER.write_message(singer.SchemaMessage(
+    stream=(stream_alias or stream_name),
+    schema=schema,
+    key_properties=key_properties,
+    bookmark_properties=bookmark_properties))
+
+
+def flush():
+  WRITER.flush()
+
+
+def close():
+  WRITER.close()
@@ -9,16 +9,22 @@ import zcrmsdk
 import singer.utils as singer_utils
 import dateutil.parser as parser
 import datetime
-import backoff
-import requests
-from requests.exceptions import RequestException
 
-from zcrmsdk import ZCRMRestClient, ZCRMModule, ZohoOAuthClient, ZCRMOrganization
+from zcrmsdk import ZohoOAuthClient
 from singer import metadata
 
 from tap_zoho.zoho.exceptions import TapZohoException
+from tap_zoho.zoho.auth import TokenCache, DEFAULT_TOKEN_REFRESH_MARGIN
+from tap_zoho.zoho.client import (ZohoClient, DEFAULT_POOL_SIZE, DEFAULT_CONNECT_TIMEOUT, DEFAULT_READ_TIMEOUT,
+                                  get_api_domain)
+from tap_zoho.zoho.ratelimit import (RequestScheduler, DEFAULT_MAX_CONCURRENCY, DEFAULT_MAX_RETRIES,
+                                     DEFAULT_QUOTA_RESERVE)
 from tap_zoho.zoho.rest import Rest
 from tap_zoho.zoho.bulk import Bulk
+from tap_zoho.zoho.callback import BulkCallbackListener, DEFAULT_CALLBACK_HOST
+from tap_zoho.zoho.csv_parallel import CsvParsePool, DEFAULT_PARSE_CHUNK_SIZE
+from tap_zoho.zoho.products import (ProductCache, DEFAULT_PRODUCT_CACHE_SIZE, ORDER_INVOIVE_TABLE,
+                                    ORDER_ADDITIONAL_FIELDS)
 
 LOGGER = singer.get_logger()
 
@@ -57,11 +63,6 @@ ZOHO_STANDARD_MODULES = {
     'Solutions'
 }
 
-ORDER_INVOIVE_TABLE = set([
-    'Sales_Orders',
-    'Invoices'
-])
-
 LOOKUP_TYPES = set([
     'ownerlookup',
     'lookup'
@@ -98,31 +99,24 @@ NUMBER_TYPES = set([
     'autonumber',
 ])
 
-ORDER_ADDITIONAL_FIELDS = [
-    {'api_name': 'Product_Code', 'data_type': 'text'},
-    {'api_name': 'Product_Category', 'data_type': 'text'},
-    {'api_name': 'Product_Id', 'data_type': 'text', 'zoho_key': 'id'},
-    {'api_name': 'Product_Name', 'data_type': 'text', 'zoho_key': 'name'},
-    {'api_name': 'Quantity', 'data_type': 'integer', 'zoho_key': 'quantity'},
-    {'api_name': 'Discount', 'data_type': 'integer', 'zoho_key': 'quantity'},
-    {'api_name': 'Net_Item_Cost', 'data_type': 'integer', 'zoho_key': 'net_total'},
-    {'api_name': 'Unit_Price', 'data_type': 'integer', 'zoho_key': 'net_total'},
-    {'api_name': 'Tax', 'data_type': 'integer'},
-    {'api_name': 'List_Price', 'data_type': 'integer', 'zoho_key': 'list_price'},
-    {'api_name': 'Unit_Price', 'data_type': 'integer', 'zoho_key': 'unit_price'},
-    {'api_name': 'Quantity_In_Stock', 'data_type': 'integer', 'zoho_key': 'quantity_in_stock'},
-    {'api_name': 'Total_Item_Cost', 'data_type': 'integer', 'zoho_key': 'total'},
-    {'api_name': 'Total_Item_Cost_After_Discount', 'data_type': 'integer', 'zoho_key': 'total_after_discount'},
-    {'api_name': 'Product_Description', 'data_type': 'integer', 'zoho_key': 'product_description'},
-    {'api_name': 'Line_Tax', 'data_type': 'text', 'zoho_key': 'line_tax'}
-]
+# Number types kept as text in bulk results, bigint ids exceed the precision of many targets and autonumbers can
+# have a prefix
+BULK_STRING_NUMBER_TYPES = set([
+    'bigint',
+    'autonumber',
+])
+
 
 BULK_API_TYPE = "BULK"
 REST_API_TYPE = "REST"
+# Selects REST or BULK for each stream from the volume of its changes
+AUTO_API_TYPE = "AUTO"
+API_TYPES = [REST_API_TYPE, BULK_API_TYPE, AUTO_API_TYPE]
 
-
-def log_backoff_attempt(details):
-    LOGGER.info("ConnectionError detected, triggering backoff: %d try", details.get("tries"))
+DEFAULT_AUTO_BULK_MIN_ROWS = 2000
+REST_PAGE_SIZE = 200
+# Bookmarks of an interrupted bulk query, a stream holding any of them is resumed with the bulk api
+BULK_RESUME_BOOKMARKS = ['JobID', 'BulkQueryModifiedTime', 'BulkShards']
 
 
 def add_additional_fields(sobject, fields):
@@ -149,7 +143,25 @@ class Zoho():
 
         self.api_type = api_type.upper() if api_type else None
         self.ZohoOAuthClient = None
-        self.session = requests.Session()
+        self.token_cache = None
+        self.client = ZohoClient(
+            self.get_auth_headers,
+            api_domain=get_api_domain(config),
+            is_sandbox=self.is_sandbox,
+            pool_size=int(config.get('http_pool_size') or DEFAULT_POOL_SIZE),
+            connect_timeout=float(config.get('http_connect_timeout') or DEFAULT_CONNECT_TIMEOUT),
+            read_timeout=float(config.get('http_read_timeout') or DEFAULT_READ_TIMEOUT),
+            scheduler=RequestScheduler(
+                max_concurrency=int(config.get('http_max_concurrency') or DEFAULT_MAX_CONCURRENCY),
+                max_retries=int(config.get('http_max_retries') or DEFAULT_MAX_RETRIES),
+                quota_reserve=int(config.get('api_quota_reserve') or DEFAULT_QUOTA_RESERVE)))
+        self.session = self.client.session
+        self.rest_url = self.client.rest_url
+        self.bulk_callback_listener = None
+        self.product_cache = None
+        self.csv_parse_pool = None
+        # api_type selected for each stream in AUTO mode, by tap_stream_id
+        self.stream_api_types = {}
 
         # validate start_date
         singer_utils.strptime(default_start_date)
@@ -157,12 +169,37 @@ class Zoho():
     def describe(self, sobject=None):
         """Describes all objects or a specific object"""
         if sobject is None:
-            to_return = ZCRMRestClient.get_instance().get_all_modules()
-            # resp = ZCRMOrganization.get_instance().get_all_users()
-            return to_return.response_json
+            return self.client.get_modules()
         else:
-            to_return = ZCRMModule.get_instance(sobject).get_all_fields()
-            return to_return.response_json
+            return self.client.get_fields(sobject)
+
+    def get_org_id(self):
+        return self.client.get_org()['id']
+
+    def get_selected_fields(self, catalog_entry):
+        """Returns the api names of the selected properties of a stream, or None when none is deselected.
+
+        `id` and the replication key are always included.
+        """
+        mdata = metadata.to_map(catalog_entry['metadata'])
+        replication_key = mdata.get((), {}).get('replication-key')
+        properties = catalog_entry['schema'].get('properties', {})
+
+        selected = []
+        for field_name in properties:
+            field_mdata = mdata.get(('properties', field_name), {})
+            if field_mdata.get('inclusion') == 'automatic' or field_name in ('id', replication_key):
+                selected.append(field_name)
+            elif field_mdata.get('selected') is not False and field_mdata.get('inclusion') != 'unsupported':
+                selected.append(field_name)
+
+        for field_name in ('id', replication_key):
+            if field_name and field_name not in selected:
+                selected.append(field_name)
+
+        if len(selected) >= len(properties):
+            return None
+        return selected
 
     def get_start_date(self, state, catalog_entry, add_1_sec=False):
         catalog_metadata = metadata.to_map(catalog_entry['metadata'])
@@ -178,40 +215,105 @@ class Zoho():
             start_date = parser.parse(start_date)
         return start_date.isoformat()
 
-    def get_data(self, sobject=None, state=None, catalog=None):
-        if self.api_type == REST_API_TYPE:
+    def get_stream_api_type(self, tap_stream_id):
+        """Returns the api_type syncing `tap_stream_id`, the one selected for it in AUTO mode."""
+        if self.api_type == AUTO_API_TYPE:
+            return self.stream_api_types.get(tap_stream_id)
+        return self.api_type
+
+    def select_stream_api_type(self, catalog_entry, state):
+        """Selects the api_type of a stream in AUTO mode from its changes since the bookmark and returns it.
+
+        Returns None when nothing changed. At most two pages of changed record ids are read: streams with fewer
+        than `auto_bulk_min_rows` changes are synced with the REST api, which has no job to wait for, and the
+        others with the bulk api. Interrupted syncs are resumed with the api they used.
+        """
+        tap_stream_id = catalog_entry['tap_stream_id']
+        sobject = catalog_entry['stream']
+        if any(singer.get_bookmark(state, tap_stream_id, key) for key in BULK_RESUME_BOOKMARKS):
+            api_type = BULK_API_TYPE
+        elif singer.get_bookmark(state, tap_stream_id, 'RestResumeModifiedTime'):
+            api_type = REST_API_TYPE
+        else:
+            min_rows = int(self.config.get('auto_bulk_min_rows') or DEFAULT_AUTO_BULK_MIN_ROWS)
+            modified_since = self.get_start_date(state, catalog_entry, True)
+            body = self.client.get_changed_page(sobject, modified_since, per_page=REST_PAGE_SIZE)
+            if not body or not body.get('data'):
+                LOGGER.info('No changes of stream {} since the bookmark'.format(sobject))
+                self.stream_api_types[tap_stream_id] = None
+                return None
+
+            api_type = REST_API_TYPE
+            if body.get('info', {}).get('more_records'):
+                # The last page of the first min_rows changes tells whether there are more
+                last_page = max(2, -(-min_rows // REST_PAGE_SIZE))
+                body = self.client.get_changed_page(sobject, modified_since, page=last_page, per_page=REST_PAGE_SIZE)
+                if body and body.get('info', {}).get('more_records'):
+                    api_type = BULK_API_TYPE
+
+        LOGGER.info('Syncing stream {} with the {} api'.format(sobject, api_type))
+        self.stream_api_types[tap_stream_id] = api_type
+        return api_type
+
+    def get_data(self, sobject=None, state=None, catalog=None, job_id=None):
+        api_type = self.get_stream_api_type(catalog['tap_stream_id'])
+        if api_type == REST_API_TYPE:
             return Rest(self).get_data(sobject, state, catalog)
-        elif self.api_type == BULK_API_TYPE:
-            return Bulk(self).get_data(sobject, state, catalog)
+        elif api_type == BULK_API_TYPE:
+            return Bulk(self).get_data(sobject, state, catalog, job_id=job_id)
         else:
             raise TapZohoException(
                 "api_type should be REST or BULK was: {}".format(
-                    self.api_type))
+                    api_type))
+
+    def get_auth_headers(self):
+        return {"Authorization": "Zoho-oauthtoken " + self.token_cache.get_access_token()}
+
+    def get_product_cache(self):
+        """Returns the Products lookup cache shared by every stream of this sync."""
+        if self.product_cache is None:
+            self.product_cache = ProductCache(
+                self,
+                max_size=int(self.config.get('product_cache_size') or DEFAULT_PRODUCT_CACHE_SIZE),
+                path=self.config.get('product_cache_path'))
+        return self.product_cache
+
+    def start_bulk_callback_listener(self):
+        """Starts listening for bulk job callbacks when `bulk_callback_url` is configured."""
+        if not self.config.get('bulk_callback_url'):
+            return None
+
+        host = self.config.get('bulk_callback_host')
+        self.bulk_callback_listener = BulkCallbackListener(
+            host=DEFAULT_CALLBACK_HOST if host is None else host,
+            port=int(self.config.get('bulk_callback_port') or 0),
+            url=self.config['bulk_callback_url']).start()
+        return self.bulk_callback_listener
+
+    def stop_bulk_callback_listener(self):
+        if self.bulk_callback_listener:
+            self.bulk_callback_listener.stop()
+            self.bulk_callback_listener = None
+
+    def get_csv_parse_pool(self):
+        """Returns the pool parsing bulk results in `bulk_parse_workers` processes, or None when it is not set."""
+        workers = int(self.config.get('bulk_parse_workers') or 0)
+        if workers < 1:
+            return None
+        if self.csv_parse_pool is None:
+            self.csv_parse_pool = CsvParsePool(
+                workers,
+                chunk_size=int(self.config.get('bulk_parse_chunk_size') or DEFAULT_PARSE_CHUNK_SIZE))
+        return self.csv_parse_pool
+
+    def stop_csv_parse_pool(self):
+        if self.csv_parse_pool:
+            self.csv_parse_pool.shutdown()
+            self.csv_parse_pool = None
 
     # pylint: disable=too-many-arguments
-    @backoff.on_exception(backoff.expo,
-                          requests.exceptions.ConnectionError,
-                          max_tries=10,
-                          factor=2,
-                          on_backoff=log_backoff_attempt)
     def _make_request(self, http_method, url, headers=None, body=None, stream=False, params=None):
-        if http_method == "GET":
-            LOGGER.info("Making %s request to %s with params: %s", http_method, url, params)
-            resp = self.session.get(url, headers=headers, stream=stream, params=params)
-        elif http_method == "POST":
-            LOGGER.info("Making %s request to %s with body %s", http_method, url, body)
-            resp = self.session.post(url, headers=headers, data=body)
-        else:
-            raise TapZohoException("Unsupported HTTP method")
-
-        try:
-            resp.raise_for_status()
-        except RequestException as ex:
-            raise ex
-
-        LOGGER.info('Check for headers')
-
-        return resp
+        return self.client.request(http_method, url, headers=headers, body=body, stream=stream, params=params)
 
     # Login with refresh token, .pkl file is generated under {tmp_directory}/refresh_token/*.pkl
     # Zoho SDK uses this file to manage login state.
@@ -224,8 +326,13 @@ class Zoho():
         """
         zcrmsdk.ZCRMRestClient.initialize(self.config)
         ins = ZohoOAuthClient.get_instance(self.config)
-        ins.generate_access_token_from_refresh_token(refreshToken=self.config['refresh_token'], userEmail=None)
         self.ZohoOAuthClient = ins
+        self.token_cache = TokenCache(
+            ins,
+            self.config['refresh_token'],
+            user_email=self.config.get('currentUserEmail'),
+            refresh_margin=float(self.config.get('token_refresh_margin') or DEFAULT_TOKEN_REFRESH_MARGIN))
+        self.token_cache.refresh()
 
     def append_product_record(self, rec, product_record):
         # Normalize Product_Record first and then append them to rec
@@ -0,0 +1,60 @@
+"""
+In-process cache of the OAuth access token.
+"""
+
+import threading
+import time
+
+import singer
+
+from tap_zoho.zoho.exceptions import TapZohoException
+
+LOGGER = singer.get_logger()
+
+# Zoho access tokens are valid for an hour, refresh them this many seconds before they expire
+DEFAULT_TOKEN_REFRESH_MARGIN = 300
+
+
+class TokenCache():
+    """Keeps the access token in memory and refreshes it `refresh_margin` seconds before it expires.
+
+    Only one thread refreshes at a time; the others wait for it and reuse the new token instead of refreshing
+    again. The refreshed tokens are saved through the SDK persistence handler, so SDK calls see them too.
+    """
+
+    def __init__(self, oauth_client, refresh_token, user_email=None, refresh_margin=DEFAULT_TOKEN_REFRESH_MARGIN):
+        self.oauth_client = oauth_client
+        self.refresh_token = refresh_token
+        self.user_email = user_email
+        self.refresh_margin = refresh_margin
+        self.refreshes = 0
+        self._lock = threading.Lock()
+        self._access_token = None
+        self._expires_at = 0
+
+    def _is_fresh(self):
+        return self._access_token is not None and self._expires_at - time.time() > self.refresh_margin
+
+    def set_tokens(self, oauth_tokens):
+        """Caches the access token of a `ZohoOAuthTokens`, whose expiry time is in milliseconds."""
+        self._access_token = oauth_tokens.accessToken
+        self._expires_at = oauth_tokens.expiryTime / 1000.0
+
+    def refresh(self):
+        oauth_tokens = self.oauth_client.refresh_access_token(self.refresh_token, self.user_email)
+        if oauth_tokens is None or not oauth_tokens.accessToken:
+            raise TapZohoException("Zoho did not return an access token for the refresh token")
+        self.set_tokens(oauth_tokens)
+        self.refreshes += 1
+        LOGGER.info('Refreshed access token, valid for {:.0f}s'.format(self._expires_at - time.time()))
+        return self._access_token
+
+    def get_access_token(self):
+        if self._is_fresh():
+            return self._access_token
+
+        with self._lock:
+            # Another thread may have refreshed the token while this one waited for the lock
+            if self._is_fresh():
+                return self._access_token
+            return self.refresh()
@@ -1,30 +1,40 @@
 # pylint: disable=protected-access
 import csv
-import operator
+import datetime
+import io
+import math
+import dateutil.parser
 import singer
 import json
 import time
 import tempfile
 import zipfile
 import os
-import shutil
-from singer import metrics
+from requests.exceptions import HTTPError
+from singer import metadata, metrics
 
-from tap_zoho.zoho.exceptions import TapZohoException
+from tap_zoho import writer
+from tap_zoho import instrumentation
+from tap_zoho.zoho.client import CHANGED_PAGE_SIZE
+from tap_zoho.zoho.csv_sort import sort_csv_rows, DEFAULT_SORT_RUN_SIZE
+from tap_zoho.zoho.csv_types import compile_row_converter
+from tap_zoho.zoho.exceptions import TapZohoException, TapZohoQuotaExceededException
+from tap_zoho.zoho.products import ORDER_INVOIVE_TABLE, ORDER_ADDITIONAL_FIELDS
 
 LOGGER = singer.get_logger()
 
 
-def get_body(sobject=None, page=1, modified_time=None):
+def get_body(sobject=None, page=1, modified_time=None, callback_url=None, fields=None, until=None):
+  """Returns the bulk read query of records modified after `modified_time`, and up to `until` when it is set."""
   if sobject == 'Events':
-    return {
+    body = {
       "query": {
         "module": sobject,
         "page": page
       }
     }
   else:
-    return {
+    body = {
       "query": {
         "module": sobject,
         "criteria": {
@@ -36,29 +46,96 @@ def get_body(sobject=None, page=1, modified_time=None):
       }
     }
 
+  if until and sobject != 'Events':
+    body['query']['criteria'] = {
+      "group_operator": "and",
+      "group": [
+        body['query']['criteria'],
+        {
+          "api_name": "Modified_Time",
+          "comparator": "less_equal",
+          "value": until
+        }
+      ]
+    }
+
+  if fields:
+    body['query']['fields'] = fields
 
-BATCH_STATUS_POLLING_SLEEP = 20
-ITER_CHUNK_SIZE = 1024
+  if callback_url:
+    body['callback'] = {
+      "url": callback_url,
+      "method": "post"
+    }
 
+  return body
+
+
+BATCH_STATUS_POLLING_MIN_SLEEP = 2
+BATCH_STATUS_POLLING_MAX_SLEEP = 60
+BATCH_STATUS_POLLING_BACKOFF = 1.5
+# Rough rate at which Zoho processes a bulk read job, used to bound the polling interval by the job size
+BATCH_ROWS_PER_SECOND = 10000
+JOB_RUNNING_STATES = {'ADDED', 'QUEUED', 'IN PROGRESS'}
+JOB_COMPLETED_STATE = 'COMPLETED'
+# Zoho accepts at most 200 field api names in the fields of a bulk read query
+MAX_BULK_FIELDS = 200
+ITER_CHUNK_SIZE = 1024 * 1024
+DEFAULT_SHARD_MAX_WINDOWS = 10
+
+
+def plan_windows(modified_time, first_change, last_change, count):
+  """Splits the changes after `modified_time` into `count` windows of Modified_Time.
+
+  The windows between `first_change` and `last_change` are of equal duration. The first one starts at
+  `modified_time` and the last one is open ended, so it includes the records modified during the sync.
+  """
+  first_change = dateutil.parser.parse(first_change).astimezone(datetime.timezone.utc)
+  last_change = dateutil.parser.parse(last_change).astimezone(datetime.timezone.utc)
+  step = max(last_change - first_change, datetime.timedelta(0)) / count
+  boundaries = [modified_time]
+  last_boundary = dateutil.parser.parse(modified_time)
+  for index in range(1, count):
+    boundary = (first_change + step * index).replace(microsecond=0)
+    if boundary > last_boundary:
+      boundaries.append(boundary.isoformat())
+      last_boundary = boundary
+  boundaries.append(None)
+
+  return [{'after': after, 'until': until, 'pages_emitted': [], 'job_id': None, 'resumed': False, 'done': False}
+          for after, until in zip(boundaries, boundaries[1:])]
+
+
+def get_polling_interval(attempt, expected_rows=None):
+  """Returns the seconds to wait before status check number `attempt` + 1 of a running job.
+
+  Checks start every BATCH_STATUS_POLLING_MIN_SLEEP seconds and back off geometrically. The interval is capped
+  in proportion to `expected_rows` when the size of the job is known, and by BATCH_STATUS_POLLING_MAX_SLEEP
+  otherwise.
+  """
+  interval = BATCH_STATUS_POLLING_MIN_SLEEP * (BATCH_STATUS_POLLING_BACKOFF ** attempt)
+  ceiling = BATCH_STATUS_POLLING_MAX_SLEEP
+  if expected_rows is not None:
+    ceiling = min(ceiling, BATCH_STATUS_POLLING_MIN_SLEEP + expected_rows / BATCH_ROWS_PER_SECOND)
+  return min(interval, ceiling)
 
-class Bulk():
-  bulk_url = 'https://www.zohoapis.com/crm/bulk/v2/read'
-  job_status_uri = bulk_url + "/{job_id}"
-  job_result_uri = bulk_url + "/{job_id}/result"
 
+class Bulk():
   message = "Job {job_id} {message} Job Creation Time {created_time}"
 
   def __init__(self, zh):
     self.zh = zh
+    self.bulk_url = zh.client.bulk_url
+    self.job_status_uri = self.bulk_url + "/{job_id}"
+    self.job_result_uri = self.bulk_url + "/{job_id}/result"
 
   def _get_bulk_headers(self):
-    return {"Authorization": "Zoho-oauthtoken " + self.zh.ZohoOAuthClient.get_access_token(
-      userEmail=self.zh.config['currentUserEmail'])}
+    return self.zh.get_auth_headers()
 
-  def _create_job(self, sobject=None, state=None, catalog_entry=None):
+  def _create_job(self, sobject=None, page=1, modified_time=None, fields=None, until=None):
     url = self.bulk_url
-    modified_time = self.zh.get_start_date(state, catalog_entry)
-    body = get_body(sobject, 1, modified_time)
+    callback_url = self.zh.bulk_callback_listener.url if self.zh.bulk_callback_listener else None
+    body = get_body(sobject, page, modified_time, callback_url, fields, until)
 
     LOGGER.info('Starting job for stream {} with body {}'.format(sobject, body))
 
@@ -97,51 +174,115 @@ class Bulk():
 
     return batch['data'][0]
 
-  def _poll_on_job_id(self, job_id):
+  def wait_for_jobs(self, job_ids, timeout):
+    """Waits up to `timeout` seconds, returning early when Zoho calls back for one of `job_ids`."""
+    if self.zh.bulk_callback_listener:
+      self.zh.bulk_callback_listener.wait(job_ids, timeout)
+    else:
+      time.sleep(timeout)
+
+  def _poll_on_job_id(self, job_id, expected_rows=None):
+    attempt = 0
     batch_status = self._get_batch_status(job_id=job_id)
-    LOGGER.info('Batch status is {state}'.format(state=batch_status['state']))
-    while batch_status['state'] not in ['COMPLETED']:
-      time.sleep(BATCH_STATUS_POLLING_SLEEP)
-      LOGGER.info('Batch status is {state}'.format(state=batch_status['state']))
+    while batch_status['state'] in JOB_RUNNING_STATES:
+      interval = get_polling_interval(attempt, expected_rows)
+      LOGGER.info('Batch status is {state}, checking again in {interval:.1f}s'.format(
+        state=batch_status['state'], interval=interval))
+      self.wait_for_jobs([job_id], interval)
+      attempt += 1
       batch_status = self._get_batch_status(job_id=job_id)
 
+    LOGGER.info('Batch status is {state}'.format(state=batch_status['state']))
+    if batch_status['state'] != JOB_COMPLETED_STATE:
+      raise TapZohoException('Bulk job {} did not complete. Job Status {}'.format(job_id, json.dumps(batch_status)))
+
     return batch_status
 
-  def get_batch_results(self, job_id, sobject):
-    """Given a job_id, queries the job and saves csv file by extracting it from zip file."""
+  def _download_batch_results(self, job_id):
+    """Streams the result zip of a job to a temporary file in ITER_CHUNK_SIZE chunks and returns its path."""
     headers = self._get_bulk_headers()
     url = self.job_result_uri.format(job_id=job_id)
 
-    with tempfile.NamedTemporaryFile(mode="wb", delete=False) as zip_file:
+    with tempfile.NamedTemporaryFile(mode="wb", suffix=".zip", delete=False) as zip_file:
       resp = self.zh._make_request('GET', url, headers=headers, stream=True)
-      zip_file.write(resp.content)
-      zip_file.close()
-
-    with zipfile.ZipFile(zip_file.name, 'r') as zip_ref:
-      tmp_dir = tempfile.gettempdir()
-      path = os.path.join(tmp_dir, sobject)
-      zip_ref.extractall(path)
-      zip_file.close()
-      json_message = {'message': 'CSV file is available at location {}'.format(path)}
-      LOGGER.info(json.dumps(json_message, indent=4))
-      csv_f = os.path.join(path, job_id + '.csv')
-
-      with open(csv_f) as csv_file:
-        csv_reader = csv.reader(csv_file, delimiter=',', quotechar='"')
-        column_name_list = next(csv_reader)
-        col_index = self.__get_index_by_column_name__(column_name_list, 'Modified_Time')
-        csv_reader = sorted(csv_reader, key=operator.itemgetter(col_index), reverse=False)
-
-        for line in csv_reader:
-          rec = dict(zip(column_name_list, line))
-          yield rec
-        csv_file.close()
-
       try:
-        if os.path.exists(path):
-          shutil.rmtree(path)
-      except Exception as ex:
-        LOGGER.warning('Unable to cleanup temporary csv file {}'.format(path))
+        for chunk in resp.iter_content(chunk_size=ITER_CHUNK_SIZE):
+          if chunk:
+            zip_file.write(chunk)
+      finally:
+        resp.close()
+
+    return zip_file.name
+
+  def _read_batch_results(self, zip_path, job_id, sobject, schema=None, fields=None):
+    """Yields the rows of a downloaded result archive ordered by Modified_Time and removes the archive.
+
+    The values are converted to the types of the stream `schema`. Results larger than a parse chunk are parsed
+    and encoded by the CSV parse pool when one is configured, yielding writer.EncodedRecords holding the values
+    of `fields` instead of dicts.
+    """
+    json_message = {'message': 'Result archive for {} is available at location {}'.format(sobject, zip_path)}
+    LOGGER.info(json.dumps(json_message, indent=4))
+
+    try:
+      with zipfile.ZipFile(zip_path, 'r') as zip_ref:
+        member_name = job_id + '.csv'
+        parse_pool = self.zh.get_csv_parse_pool()
+        with zip_ref.open(member_name) as member:
+          if parse_pool and zip_ref.getinfo(member_name).file_size > parse_pool.chunk_size:
+            records = parse_pool.read_records(member, sobject, schema, 'Modified_Time', fields or ['Modified_Time'])
+          else:
+            records = self._read_csv_rows(member, sobject, schema)
+          for rec in records:
+            yield rec
+    finally:
+      try:
+        os.remove(zip_path)
+      except OSError:
+        LOGGER.warning('Unable to cleanup temporary result archive {}'.format(zip_path))
+
+  def _read_csv_rows(self, member, sobject, schema=None):
+    reader = rows = None
+    convert_seconds = 0.0
+    perf_counter = time.perf_counter
+    try:
+      csv_file = io.TextIOWrapper(member, encoding='utf-8', newline='')
+      reader = instrumentation.IterTimer(csv.reader(csv_file, delimiter=',', quotechar='"'))
+      column_name_list = next(reader)
+      col_index = self.__get_index_by_column_name__(column_name_list, 'Modified_Time')
+      run_size = int(self.zh.config.get('bulk_sort_run_size') or DEFAULT_SORT_RUN_SIZE)
+      convert_row = compile_row_converter(column_name_list, schema)
+
+      # The reader is timed inside the sort, which is timed as a whole, the sort itself is the difference
+      rows = instrumentation.IterTimer(sort_csv_rows(reader, col_index, run_size=run_size))
+      for line in rows:
+        convert_started = perf_counter()
+        rec = convert_row(line)
+        convert_seconds += perf_counter() - convert_started
+        yield rec
+    finally:
+      if reader is not None:
+        instrumentation.add(sobject, 'read_csv', reader.seconds, reader.calls)
+      if rows is not None:
+        instrumentation.add(sobject, 'sort', max(rows.seconds - reader.seconds, 0.0), rows.calls)
+        instrumentation.add(sobject, 'convert', convert_seconds, rows.calls)
+
+  def _get_resumable_job(self, job_id):
+    """Returns `job_id` if the job saved in state is still running or completed on Zoho, None otherwise."""
+    if not job_id:
+      return None
+
+    try:
+      batch_status = self._get_batch_status(job_id=job_id)
+    except HTTPError as ex:
+      LOGGER.warning('Bulk job {} from the previous sync is no longer available: {}'.format(job_id, ex))
+      return None
+
+    if batch_status['state'] in JOB_RUNNING_STATES or batch_status['state'] == JOB_COMPLETED_STATE:
+      return job_id
+
+    LOGGER.warning('Bulk job {} from the previous sync ended in state {}'.format(job_id, batch_status['state']))
+    return None
 
   @staticmethod
   def __get_index_by_column_name__(data_array=None, key=None):
@@ -157,15 +298,352 @@ class Bulk():
 
     return to_return
 
-  def get_data(self, sobject=None, state=None, catalog=None):
-    job_id = self._create_job(sobject=sobject, state=state, catalog_entry=catalog) # '4212079000000395009'
-
-    batch_status = self._poll_on_job_id(job_id)
+  def _get_query_position(self, state=None, catalog=None):
+    """Returns the criteria value of the stream's bulk query, the pages already emitted and the next page."""
+    tap_stream_id = catalog['tap_stream_id']
+    modified_time = (singer.get_bookmark(state, tap_stream_id, 'BulkQueryModifiedTime')
+                     or self.zh.get_start_date(state, catalog))
+    pages_emitted = singer.get_bookmark(state, tap_stream_id, 'BulkPagesEmitted') or []
+    page = max(pages_emitted) + 1 if pages_emitted else 1
+    return modified_time, pages_emitted, page
+
+  def get_projection(self, catalog=None):
+    """Returns the fields to query for the selected properties, or None to query every field."""
+    fields = self.zh.get_selected_fields(catalog)
+    if fields is None:
+      return None
+
+    if catalog['stream'] in ORDER_INVOIVE_TABLE:
+      # The line item properties of AUTO catalogs are derived from Product_Details, which bulk reads do not return
+      additional_fields = {field['api_name'] for field in ORDER_ADDITIONAL_FIELDS}
+      fields = [field for field in fields if field not in additional_fields and field != 'Product_Details']
+
+    if len(fields) > MAX_BULK_FIELDS:
+      return None
+    return fields
+
+  def start_job(self, sobject=None, state=None, catalog=None, max_jobs=1):
+    """Creates the job for the next page of the stream's bulk query and returns the ids of the jobs started.
+
+    The jobs of up to `max_jobs` windows of a sharded query are started at once, the first id is the job of the
+    first window.
+    """
+    tap_stream_id = catalog['tap_stream_id']
+    plan = self._get_shard_plan(sobject, state, catalog)
+    if plan:
+      self._start_windows(sobject, state, catalog, plan, self.get_projection(catalog), True, max_jobs)
+      job_ids = [window['job_id'] for window in plan if not window['done'] and window['job_id']]
+      if job_ids:
+        return job_ids
+      singer.clear_bookmark(state, tap_stream_id, 'BulkShards')
+
+    modified_time, _, page = self._get_query_position(state, catalog)
+    # The query is not sharded, get_data continues it without estimating the changes again
+    state = singer.write_bookmark(state, tap_stream_id, 'BulkQueryModifiedTime', modified_time)
+    return [self._create_job(sobject=sobject, page=page, modified_time=modified_time,
+                             fields=self.get_projection(catalog))]
+
+  def _get_changed_rows(self, sobject, modified_since, page):
+    """Returns the Modified_Time of the records on `page` of the changes since `modified_since` and whether more
+    pages follow."""
+    body = self.zh.client.get_changed_page(sobject, modified_since, page=page)
+    if not body or not body.get('data'):
+      return [], False
+    return [record['Modified_Time'] for record in body['data']], bool(body.get('info', {}).get('more_records'))
+
+  def _count_changes(self, sobject, modified_since, limit, full_pages):
+    """Returns the number of records changed since `modified_since`, or a number above `limit` when more changed.
+
+    The first `full_pages` pages are known to be full and followed by more pages. The page holding change number
+    `limit` + 1 is read first, when it is empty the last page of changes is bisected.
+    """
+    low = full_pages
+    high = last_page = limit // CHANGED_PAGE_SIZE + 1
+    if last_page <= low:
+      return low * CHANGED_PAGE_SIZE
+    page = last_page
+    while True:
+      rows, more = self._get_changed_rows(sobject, modified_since, page)
+      if rows and not more:
+        return (page - 1) * CHANGED_PAGE_SIZE + len(rows)
+      if rows and page == last_page:
+        return page * CHANGED_PAGE_SIZE
+      if rows:
+        low = page
+      else:
+        high = page
+      if high - low <= 1:
+        # The changes after page `low` were deleted or modified again while the pages were read
+        return low * CHANGED_PAGE_SIZE
+      page = (low + high) // 2
+
+  def _estimate_changes(self, sobject, modified_since, shard_rows, max_rows):
+    """Returns the Modified_Time of the first record changed since `modified_since` and the number of changed
+    records, or None for the number when at most `shard_rows` records changed.
+
+    The page holding change number `shard_rows` + 1 tells whether more than `shard_rows` records changed. Only
+    then are the changes counted, up to `max_rows`.
+    """
+    rows, more = self._get_changed_rows(sobject, modified_since, 1)
+    if not more:
+      return (rows[0] if rows else None), None
+    first_change = rows[0]
+
+    page = shard_rows // CHANGED_PAGE_SIZE + 1
+    if page > 1:
+      rows, more = self._get_changed_rows(sobject, modified_since, page)
+    if not more and (page - 1) * CHANGED_PAGE_SIZE + len(rows) <= shard_rows:
+      return first_change, None
+    if not more:
+      return first_change, (page - 1) * CHANGED_PAGE_SIZE + len(rows)
+    return first_change, self._count_changes(sobject, modified_since, max_rows, page)
+
+  def _get_last_change(self, sobject, modified_since):
+    """Returns the Modified_Time of the last record changed since `modified_since`, or None when none did."""
+    body = self.zh.client.get_changed_page(sobject, modified_since, per_page=1, sort_order='desc')
+    if not body or not body.get('data'):
+      return None
+    return body['data'][0]['Modified_Time']
+
+  def _get_shard_plan(self, sobject=None, state=None, catalog=None):
+    """Returns the windows of the stream's sharded bulk query, from state or planned from the estimated changes.
+
+    Returns None when sharding is disabled, a query that is not sharded is in progress or the changes fit in
+    `bulk_shard_rows` rows.
+    """
+    tap_stream_id = catalog['tap_stream_id']
+    plan = singer.get_bookmark(state, tap_stream_id, 'BulkShards')
+    if plan is not None:
+      return plan
+
+    shard_rows = int(self.zh.config.get('bulk_shard_rows') or 0)
+    if shard_rows < 1 or sobject == 'Events':
+      return None
+    if (singer.get_bookmark(state, tap_stream_id, 'BulkQueryModifiedTime')
+        or singer.get_bookmark(state, tap_stream_id, 'JobID')):
+      return None
+
+    max_windows = int(self.zh.config.get('bulk_shard_max_windows') or DEFAULT_SHARD_MAX_WINDOWS)
+    modified_since = self.zh.get_start_date(state, catalog, True)
+    first_change, estimate = self._estimate_changes(sobject, modified_since, shard_rows, max_windows * shard_rows)
+    if estimate is None:
+      return None
+    last_change = self._get_last_change(sobject, modified_since)
+    if last_change is None:
+      # The changes were deleted since they were counted
+      return None
+
+    count = min(max_windows, math.ceil(estimate / shard_rows))
+    plan = plan_windows(self.zh.get_start_date(state, catalog), first_change, last_change, count)
+    LOGGER.info('Splitting the bulk query of stream {} with about {} records in {} windows'.format(
+      sobject, estimate, len(plan)))
+    return plan
 
-    if batch_status['state'] == 'COMPLETED':
-      for result in self.get_batch_results(job_id, sobject):
-        yield result
+  @staticmethod
+  def _get_window_page(window):
+    return max(window['pages_emitted']) + 1 if window['pages_emitted'] else 1
+
+  def _start_window_jobs(self, sobject, plan, fields, max_jobs):
+    """Creates the jobs of the windows still to emit, in order, until `max_jobs` windows have a job."""
+    windows = [window for window in plan if not window['done']]
+    running = len([window for window in windows if window['job_id']])
+    for window in windows:
+      if running >= max_jobs:
+        break
+      if not window['job_id']:
+        window['job_id'] = self._create_job(sobject=sobject, page=self._get_window_page(window),
+                                            modified_time=window['after'], fields=fields, until=window['until'])
+        window['resumed'] = False
+        running += 1
+
+  def _start_windows(self, sobject, state, catalog, plan, fields, resume, max_jobs):
+    """Creates the jobs of up to `max_jobs` windows still to emit so Zoho runs them in parallel, and saves the
+    plan.
+
+    When `resume` is set the jobs saved by an interrupted sync are reused while Zoho still has them, and marked
+    as resumed in the plan. Their jobs count towards `max_jobs`.
+    """
+    # pylint: disable=too-many-arguments
+    for window in plan:
+      if window['done'] or not window['job_id'] or not resume:
+        continue
+      window['job_id'] = self._get_resumable_job(window['job_id'])
+      window['resumed'] = bool(window['job_id'])
+    self._start_window_jobs(sobject, plan, fields, max_jobs)
+
+    state = singer.write_bookmark(state, catalog['tap_stream_id'], 'BulkShards', plan)
+    writer.write_state(state)
+
+  def _get_sharded_data(self, sobject, state, catalog, plan, fields, record_fields, max_jobs=None):
+    """Yields the rows of every window of a sharded query in window order, so they stay ordered by
+    Modified_Time across windows.
+
+    Each window records the pages it emitted and the job of its next page in the plan, and is marked done once
+    emitted, so an interrupted sync only queries the windows that are not done. When `max_jobs` is set the jobs
+    saved by an interrupted sync are resumed and the jobs of up to `max_jobs` windows started, otherwise the
+    windows keep the jobs started by start_job. As many windows have a job while the windows are emitted.
+    """
+    # pylint: disable=too-many-arguments,too-many-locals
+    tap_stream_id = catalog['tap_stream_id']
+    if max_jobs is None:
+      self._start_windows(sobject, state, catalog, plan, fields, False, 0)
+      max_jobs = len([window for window in plan if not window['done'] and window['job_id']])
     else:
-      raise TapZohoException('An error occurred. Job Status {}'.format(json.dumps(batch_status)))
+      self._start_windows(sobject, state, catalog, plan, fields, True, max_jobs)
+    max_jobs = max(1, max_jobs)
+
+    for index, window in enumerate(plan):
+      if window['done']:
+        continue
+
+      LOGGER.info('Syncing window {} of {} of stream {}, modified after {} until {}'.format(
+        index + 1, len(plan), sobject, window['after'], window['until'] or 'now'))
+      page = self._get_window_page(window)
+      self._start_window_jobs(sobject, plan, fields, max_jobs)
+      job_id = window['job_id']
+      expected_rows = None
+      while job_id:
+        zip_path = None
+        try:
+          with instrumentation.stage(sobject, 'job_wait'):
+            result = self._poll_on_job_id(job_id, expected_rows).get('result', {})
+          if result.get('count', 1):
+            with instrumentation.stage(sobject, 'download'):
+              zip_path = self._download_batch_results(job_id)
+        except TapZohoQuotaExceededException:
+          raise
+        except (HTTPError, TapZohoException) as ex:
+          if not window.get('resumed'):
+            raise
+          LOGGER.warning('Bulk job {} of the previous sync failed or expired ({}), starting a new job'.format(
+            job_id, ex))
+          job_id = self._create_job(sobject=sobject, page=page, modified_time=window['after'], fields=fields,
+                                    until=window['until'])
+          window['job_id'] = job_id
+          window['resumed'] = False
+          continue
+
+        next_job_id = None
+        if result.get('more_records'):
+          next_job_id = self._create_job(sobject=sobject, page=page + 1, modified_time=window['after'],
+                                         fields=fields, until=window['until'])
+          expected_rows = result.get('per_page')
+
+        if zip_path:
+          for rec in self._read_batch_results(zip_path, job_id, sobject, catalog['schema'], record_fields):
+            yield rec
+
+        window['pages_emitted'].append(page)
+        window['job_id'] = next_job_id
+        window['resumed'] = False
+        writer.write_state(state)
+        page += 1
+        job_id = next_job_id
+
+      window['done'] = True
+      # The job of the next window without one takes the place of the job of this window
+      self._start_window_jobs(sobject, plan, fields, max_jobs)
+      writer.write_state(state)
+
+    singer.clear_bookmark(state, tap_stream_id, 'BulkShards')
+
+  def get_job_status(self, job_id):
+    return self._get_batch_status(job_id=job_id)
+
+  def get_data(self, sobject=None, state=None, catalog=None, job_id=None):
+    """Yields the rows of every result page of the bulk read query for `sobject`.
+
+    Zoho returns at most one page per job, so the job for page N + 1 is created as soon as page N completes and
+    is processed by Zoho while page N is still being streamed. The query value and the pages already emitted are
+    kept in state so an interrupted sync continues with the next page of the same query.
+
+    `job_id` is the job already created for the next page by `start_job`, if any. Otherwise the job saved as
+    JobID by an interrupted sync is reused while Zoho still has its result, skipping the rows that were emitted
+    before JobHighestBookmarkSeen.
+    """
+    tap_stream_id = catalog['tap_stream_id']
+    modified_time, pages_emitted, page = self._get_query_position(state, catalog)
+    fields = self.get_projection(catalog)
+    # Values read from the records by the tap, kept when the records are encoded by the CSV parse pool
+    record_fields = ['Modified_Time']
+    replication_key = metadata.to_map(catalog['metadata']).get((), {}).get('replication-key')
+    if replication_key and replication_key not in record_fields:
+      record_fields.append(replication_key)
+
+    plan = self._get_shard_plan(sobject, state, catalog)
+    if plan:
+      # A job passed in was started by start_job along with the jobs of other windows, which are kept
+      max_jobs = None if job_id else int(self.zh.config.get('bulk_max_concurrent_jobs') or 1)
+      for rec in self._get_sharded_data(sobject, state, catalog, plan, fields, record_fields, max_jobs):
+        yield rec
+      return
+
+    state = singer.write_bookmark(state, tap_stream_id, 'BulkQueryModifiedTime', modified_time)
+
+    if pages_emitted:
+      LOGGER.info('Pages {} of stream {} were already emitted, resuming at page {}'.format(
+        pages_emitted, sobject, page))
+
+    resume_bookmark = None
+    if job_id is None:
+      job_id = self._get_resumable_job(singer.get_bookmark(state, tap_stream_id, 'JobID'))
+      if job_id:
+        resume_bookmark = singer.get_bookmark(state, tap_stream_id, 'JobHighestBookmarkSeen')
+        LOGGER.info('Resuming bulk job {} of stream {} after {}'.format(job_id, sobject, resume_bookmark))
+
+    if job_id is None:
+      job_id = self._create_job(sobject=sobject, page=page, modified_time=modified_time, fields=fields)
+
+    expected_rows = None
+    while job_id:
+      state = singer.write_bookmark(state, tap_stream_id, 'JobID', job_id)
+      with instrumentation.stage(sobject, 'job_wait'):
+        batch_status = self._poll_on_job_id(job_id, expected_rows)
+      result = batch_status.get('result', {})
+
+      zip_path = None
+      if result.get('count', 1):
+        try:
+          with instrumentation.stage(sobject, 'download'):
+            zip_path = self._download_batch_results(job_id)
+        except HTTPError as ex:
+          if resume_bookmark is None:
+            raise
+          LOGGER.warning('Result of bulk job {} has expired ({}), starting a new job'.format(job_id, ex))
+          resume_bookmark = None
+          singer.clear_bookmark(state, tap_stream_id, 'JobHighestBookmarkSeen')
+          job_id = self._create_job(sobject=sobject, page=page, modified_time=modified_time, fields=fields)
+          continue
+
+      next_job_id = None
+      if result.get('more_records'):
+        next_job_id = self._create_job(sobject=sobject, page=page + 1, modified_time=modified_time,
+                                       fields=fields)
+        # Every page but the last one is full, which bounds the size of the next job
+        expected_rows = result.get('per_page')
+
+      if zip_path:
+        highest_bookmark = resume_bookmark
+        for rec in self._read_batch_results(zip_path, job_id, sobject, catalog['schema'], record_fields):
+          bookmark = rec.get('Modified_Time')
+          if bookmark and resume_bookmark and bookmark < resume_bookmark:
+            continue
+          if bookmark and (highest_bookmark is None or bookmark > highest_bookmark):
+            highest_bookmark = bookmark
+            state = singer.write_bookmark(state, tap_stream_id, 'JobHighestBookmarkSeen', highest_bookmark)
+          yield rec
+      else:
+        LOGGER.info('Page {} of stream {} has no records'.format(page, sobject))
+
+      resume_bookmark = None
+      pages_emitted.append(page)
+      state = singer.write_bookmark(state, tap_stream_id, 'BulkPagesEmitted', pages_emitted)
+      singer.clear_bookmark(state, tap_stream_id, 'JobID')
+      singer.clear_bookmark(state, tap_stream_id, 'JobHighestBookmarkSeen')
+      writer.write_state(state)
+
+      page += 1
+      job_id = next_job_id
 
-    # check if there are more records, fetch them as well and append them to the existing csv/results
+    singer.clear_bookmark(state, tap_stream_id, 'BulkQueryModifiedTime')
+    singer.clear_bookmark(state, tap_stream_id, 'BulkPagesEmitted')
@@ -0,0 +1,103 @@
+"""
+Local listener for Zoho bulk read job callbacks.
+
+Zoho calls the `callback.url` of a bulk read job once the job is finished. The listener records those calls so
+that pollers waiting on a job wake up immediately instead of sleeping until their next status check.
+"""
+
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import singer
+
+LOGGER = singer.get_logger()
+
+DEFAULT_CALLBACK_HOST = '127.0.0.1'
+
+
+def parse_callback_payload(body, query=''):
+    """Returns `(job_id, state)` from the body or query string of a Zoho bulk read callback."""
+    payload = {}
+    if body:
+        try:
+            payload = json.loads(body)
+        except ValueError:
+            payload = {k: v[0] for k, v in parse_qs(body).items()}
+    if not payload and query:
+        payload = {k: v[0] for k, v in parse_qs(query).items()}
+
+    job_id = payload.get('job_id') or payload.get('id') or payload.get('details', {}).get('id')
+    return (str(job_id) if job_id else None), payload.get('state')
+
+
+def _make_handler(listener):
+    class BulkCallbackHandler(BaseHTTPRequestHandler):
+        def _handle(self):
+            length = int(self.headers.get('Content-Length') or 0)
+            body = self.rfile.read(length).decode('utf-8') if length else ''
+            job_id, state = parse_callback_payload(body, urlparse(self.path).query)
+            if job_id:
+                listener.notify(job_id, state)
+            self.send_response(200)
+            self.end_headers()
+
+        do_GET = _handle
+        do_POST = _handle
+
+        def log_message(self, format, *args):  # pylint: disable=redefined-builtin
+            LOGGER.debug('Bulk callback: ' + format, *args)
+
+    return BulkCallbackHandler
+
+
+class BulkCallbackListener():
+    """Runs a small HTTP server in a daemon thread and records the job ids Zoho calls back for.
+
+    `url` is the address Zoho should call, usually a public address forwarded to `host`:`port`. When it is not
+    given, the local address of the server is used. The listener does not authenticate callers, it only accepts
+    local connections unless `host` is set to a public address, such as '' for every interface.
+    """
+
+    def __init__(self, host=DEFAULT_CALLBACK_HOST, port=0, url=None):
+        self._condition = threading.Condition()
+        self._states = {}
+        self._server = ThreadingHTTPServer((host, port), _make_handler(self))
+        self._thread = None
+        self.url = url or 'http://{}:{}/'.format(host or 'localhost', self._server.server_address[1])
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, name='bulk-callback', daemon=True)
+        self._thread.start()
+        LOGGER.info('Listening for bulk job callbacks on port {}, callback url {}'.format(
+            self._server.server_address[1], self.url))
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def notify(self, job_id, state):
+        LOGGER.info('Received callback for bulk job {} with state {}'.format(job_id, state))
+        with self._condition:
+            self._states[job_id] = state
+            self._condition.notify_all()
+
+    def wait(self, job_ids, timeout):
+        """Blocks until one of `job_ids` calls back or `timeout` seconds pass, returns the job ids that called back."""
+        job_ids = [str(job_id) for job_id in job_ids]
+        deadline = time.monotonic() + timeout
+        with self._condition:
+            while True:
+                called_back = [job_id for job_id in job_ids if job_id in self._states]
+                if called_back:
+                    for job_id in called_back:
+                        del self._states[job_id]
+                    return called_back
+
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return []
+                self._condition.wait(remaining)
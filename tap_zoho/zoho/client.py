@@ -0,0 +1,138 @@
+"""
+Lean Zoho CRM v2 client on a pooled keep-alive session.
+
+Used instead of zcrmsdk for discovery, REST paging and product lookups, the responses are returned as the decoded
+JSON dicts.
+"""
+
+import backoff
+import requests
+import singer
+from requests.adapters import HTTPAdapter
+
+from tap_zoho.zoho.exceptions import TapZohoException, TapZohoDataNotFoundException
+from tap_zoho.zoho.ratelimit import RequestScheduler
+
+LOGGER = singer.get_logger()
+
+DEFAULT_API_DOMAIN = 'https://www.zohoapis.com'
+DEFAULT_POOL_SIZE = 10
+DEFAULT_CONNECT_TIMEOUT = 10
+DEFAULT_READ_TIMEOUT = 300
+
+# 204 No Content and 304 Not Modified, returned when no record was modified since If-Modified-Since
+NO_DATA_STATUS_CODES = (204, 304)
+# The largest page of GET records
+CHANGED_PAGE_SIZE = 200
+
+
+def get_api_domain(config):
+    """Returns the api domain of the data centre of the org: `api_domain`, or the `apiBaseUrl` the SDK used,
+    which may have no scheme, or www.zohoapis.com when neither is set."""
+    api_domain = config.get('api_domain') or config.get('apiBaseUrl') or DEFAULT_API_DOMAIN
+    if '://' not in api_domain:
+        api_domain = 'https://' + api_domain.strip()
+    return api_domain
+
+
+def log_backoff_attempt(details):
+    LOGGER.info("ConnectionError detected, triggering backoff: %d try", details.get("tries"))
+
+
+class ZohoClient():
+    """Zoho CRM v2 client sharing one connection pool of `pool_size` connections between all threads.
+
+    `get_auth_headers` returns the Authorization header of each request. For sandbox orgs the `www` host of
+    `api_domain` is replaced by `sandbox`, as the SDK does. Every request goes through `scheduler`, which
+    throttles and retries them.
+    """
+
+    # pylint: disable=too-many-arguments
+    def __init__(self, get_auth_headers, api_domain=DEFAULT_API_DOMAIN, is_sandbox=False,
+                 pool_size=DEFAULT_POOL_SIZE, connect_timeout=DEFAULT_CONNECT_TIMEOUT,
+                 read_timeout=DEFAULT_READ_TIMEOUT, scheduler=None):
+        self.get_auth_headers = get_auth_headers
+        self.scheduler = scheduler or RequestScheduler()
+        api_domain = api_domain.rstrip('/')
+        if is_sandbox:
+            api_domain = api_domain.replace('://www.', '://sandbox.')
+        self.rest_url = api_domain + '/crm/v2'
+        self.bulk_url = api_domain + '/crm/bulk/v2/read'
+        self.timeout = (connect_timeout, read_timeout)
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self.session.headers['Accept-Encoding'] = 'gzip, deflate'
+
+    # pylint: disable=too-many-arguments
+    @backoff.on_exception(backoff.expo,
+                          requests.exceptions.ConnectionError,
+                          max_tries=10,
+                          factor=2,
+                          on_backoff=log_backoff_attempt)
+    def request(self, http_method, url, headers=None, body=None, stream=False, params=None):
+        if http_method == "GET":
+            LOGGER.info("Making %s request to %s with params: %s", http_method, url, params)
+            resp = self.scheduler.execute(lambda: self.session.get(
+                url, headers=headers, stream=stream, params=params, timeout=self.timeout))
+        elif http_method == "POST":
+            LOGGER.info("Making %s request to %s with body %s", http_method, url, body)
+            resp = self.scheduler.execute(lambda: self.session.post(
+                url, headers=headers, data=body, timeout=self.timeout))
+        else:
+            raise TapZohoException("Unsupported HTTP method")
+
+        resp.raise_for_status()
+        return resp
+
+    def _get(self, path, params=None, headers=None):
+        request_headers = self.get_auth_headers()
+        request_headers.update(headers or {})
+        return self.request('GET', '{}/{}'.format(self.rest_url, path), headers=request_headers, params=params)
+
+    def get(self, path, params=None, headers=None):
+        """GETs `path` below the v2 api url and returns the decoded body, or None when there is no content."""
+        resp = self._get(path, params=params, headers=headers)
+        if resp.status_code in NO_DATA_STATUS_CODES:
+            return None
+        return resp.json()
+
+    def get_modules(self):
+        return self.get('settings/modules')
+
+    def get_fields(self, module):
+        return self.get('settings/fields', params={'module': module})
+
+    def get_org(self):
+        return self.get('org')['org'][0]
+
+    def get_changed_page(self, module, modified_since, page=1, per_page=CHANGED_PAGE_SIZE, sort_order='asc'):
+        """Returns a page of the Modified_Time of the records of `module` changed since `modified_since`, sorted
+        by Modified_Time, or None when none changed."""
+        return self.get(module,
+                        params={'page': page, 'per_page': per_page, 'sort_by': 'Modified_Time',
+                                'sort_order': sort_order, 'fields': 'Modified_Time'},
+                        headers={'If-Modified-Since': modified_since})
+
+    def get_record_pages(self, module, params=None, headers=None):
+        """Yields the `data` of each page of GET records, following `more_records`.
+
+        Raises TapZohoDataNotFoundException when the first page has no content.
+        """
+        params = dict(params or {})
+        params.setdefault('page', 1)
+        first_page = params['page']
+
+        while True:
+            resp = self._get(module, params=params, headers=headers)
+            if resp.status_code in NO_DATA_STATUS_CODES:
+                if params['page'] == first_page:
+                    raise TapZohoDataNotFoundException(resp)
+                return
+            body = resp.json()
+            yield body.get('data', [])
+            if not body.get('info', {}).get('more_records'):
+                return
+            params['page'] += 1
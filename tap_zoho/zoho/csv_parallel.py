@@ -0,0 +1,188 @@
+"""
+Multi-process parsing and encoding of bulk read CSV results.
+
+The result CSV is split into byte ranges that end on row boundaries, found by tracking whether a newline is
+inside a quoted value. Every range is parsed, converted, sorted by Modified_Time and encoded to JSON by a worker
+process, which spills the encoded records to a temporary file. The main process merges the files in
+Modified_Time order, so it only reads already encoded records.
+
+The ranges are contiguous and merged in file order, and the ordering of every range is stable, so the records
+and their order are identical to reading the CSV in a single process. Quotes are assumed to occur only around
+values and doubled inside them, as Zoho writes them.
+"""
+
+import concurrent.futures
+import csv
+import heapq
+import io
+import multiprocessing
+import operator
+import os
+import pickle
+import shutil
+import tempfile
+import time
+
+import singer
+
+from tap_zoho import instrumentation, writer
+from tap_zoho.zoho.csv_types import compile_row_converter
+
+LOGGER = singer.get_logger()
+
+DEFAULT_PARSE_CHUNK_SIZE = 16 * 1024 * 1024
+SCAN_BLOCK_SIZE = 1024 * 1024
+COPY_BUFFER_SIZE = 1024 * 1024
+READ_BUFFER_SIZE = 256 * 1024
+
+
+def split_csv_rows(csv_file, chunk_size, block_size=SCAN_BLOCK_SIZE):
+    """Returns the end of the header row and the (start, end) byte ranges of about `chunk_size` bytes holding
+    the rows after it, read from the binary `csv_file`."""
+    header_end = None
+    ranges = []
+    chunk_start = 0
+    # A range may end at the first row boundary after next_cut, the first one ends the header row
+    next_cut = 0
+    in_quotes = False
+    offset = 0
+
+    while True:
+        block = csv_file.read(block_size)
+        if not block:
+            break
+        position = 0
+        while next_cut - offset < len(block):
+            newline = block.find(b'\n', max(next_cut - offset, position))
+            if newline == -1:
+                break
+            in_quotes ^= block.count(b'"', position, newline) % 2 == 1
+            position = newline + 1
+            if in_quotes:
+                # The newline is part of a quoted value, the row ends at a later one
+                next_cut = offset + position
+                continue
+            if header_end is None:
+                header_end = offset + position
+            else:
+                ranges.append((chunk_start, offset + position))
+            chunk_start = offset + position
+            next_cut = chunk_start + chunk_size
+        in_quotes ^= block.count(b'"', position) % 2 == 1
+        offset += len(block)
+
+    if header_end is None:
+        header_end = offset
+        chunk_start = offset
+    if chunk_start < offset:
+        ranges.append((chunk_start, offset))
+    return header_end, ranges
+
+
+def read_header(path, header_end):
+    with open(path, 'rb') as csv_file:
+        data = csv_file.read(header_end)
+    return next(csv.reader(io.StringIO(data.decode('utf-8'), newline='')), [])
+
+
+def encode_csv_range(path, start, end, header, schema, key_index, fields, tmp_dir):
+    """Parses, converts, sorts and encodes the rows of bytes `start` to `end` of the CSV at `path`.
+
+    The encoded records are written to a temporary file as pickled (sort key, record JSON, values of `fields`)
+    tuples in Modified_Time order. Returns the path of the file, the number of rows and the seconds spent.
+    """
+    # pylint: disable=too-many-arguments,too-many-locals
+    started = time.perf_counter()
+    with open(path, 'rb') as csv_file:
+        csv_file.seek(start)
+        data = csv_file.read(end - start)
+
+    rows = list(csv.reader(io.StringIO(data.decode('utf-8'), newline=''), delimiter=',', quotechar='"'))
+    del data
+    rows.sort(key=operator.itemgetter(key_index))
+
+    convert_row = compile_row_converter(header, schema)
+    encode_record = writer.encode_record
+    fd, out_path = tempfile.mkstemp(prefix='tap_zoho_encoded_', suffix='.pickle', dir=tmp_dir)
+    with os.fdopen(fd, 'wb') as out_file:
+        for line in rows:
+            rec = convert_row(line)
+            values = {field: rec.get(field) for field in fields}
+            # Every record is pickled on its own, a shared pickler would keep every dumped object in its memo
+            out_file.write(pickle.dumps((line[key_index], encode_record(rec), values),
+                                        protocol=pickle.HIGHEST_PROTOCOL))
+
+    return out_path, len(rows), time.perf_counter() - started
+
+
+def _read_encoded(path):
+    with open(path, 'rb', buffering=READ_BUFFER_SIZE) as encoded_file:
+        while True:
+            try:
+                yield pickle.load(encoded_file)
+            except EOFError:
+                return
+
+
+class CsvParsePool():
+    """Parses bulk result CSVs of more than `chunk_size` bytes in `workers` processes.
+
+    The processes are started on first use and kept until `shutdown`.
+    """
+
+    def __init__(self, workers, chunk_size=DEFAULT_PARSE_CHUNK_SIZE):
+        self.workers = workers
+        self.chunk_size = chunk_size
+        self._executor = None
+
+    def _get_executor(self):
+        if self._executor is None:
+            # Forking a process running the prefetch and callback threads is unsafe, workers are spawned instead
+            self._executor = concurrent.futures.ProcessPoolExecutor(
+                max_workers=self.workers, mp_context=multiprocessing.get_context('spawn'))
+        return self._executor
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+    def read_records(self, member, sobject, schema, key_column, fields):
+        """Yields the records of the CSV file object `member` ordered by `key_column`, as writer.EncodedRecords
+        holding the values of `fields`."""
+        # pylint: disable=too-many-locals
+        tmp_dir = tempfile.mkdtemp(prefix='tap_zoho_parse_')
+        try:
+            csv_path = os.path.join(tmp_dir, 'result.csv')
+            with instrumentation.stage(sobject, 'unzip'):
+                with open(csv_path, 'wb') as csv_file:
+                    shutil.copyfileobj(member, csv_file, COPY_BUFFER_SIZE)
+
+            with instrumentation.stage(sobject, 'split'), open(csv_path, 'rb') as csv_file:
+                header_end, ranges = split_csv_rows(csv_file, self.chunk_size)
+            header = read_header(csv_path, header_end)
+            key_index = header.index(key_column) if key_column in header else 0
+            LOGGER.info('Parsing the result of stream {} in {} ranges with {} processes'.format(
+                sobject, len(ranges), self.workers))
+
+            executor = self._get_executor()
+            futures = [executor.submit(encode_csv_range, csv_path, start, end, header, schema, key_index,
+                                       list(fields), tmp_dir)
+                       for start, end in ranges]
+            paths = []
+            with instrumentation.stage(sobject, 'parse_wait'):
+                for future in futures:
+                    path, rows, seconds = future.result()
+                    paths.append(path)
+                    # Time spent in the workers, which overlaps across them
+                    instrumentation.add(sobject, 'parse', seconds, rows)
+
+            merged = instrumentation.IterTimer(heapq.merge(*[_read_encoded(path) for path in paths],
+                                                           key=operator.itemgetter(0)))
+            try:
+                for _, record_json, values in merged:
+                    yield writer.EncodedRecord(record_json, values)
+            finally:
+                instrumentation.add(sobject, 'merge', merged.seconds, merged.calls)
+        finally:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
@@ -0,0 +1,65 @@
+"""
+Bounded-memory ordering of bulk CSV rows.
+
+Rows are sorted in runs of at most `run_size` rows. Every full run is spilled
+to a temporary CSV file and the runs are merged lazily, so memory stays
+proportional to a single run regardless of the size of the export.
+"""
+
+import csv
+import heapq
+import operator
+import os
+import tempfile
+
+import singer
+
+LOGGER = singer.get_logger()
+
+DEFAULT_SORT_RUN_SIZE = 50000
+
+
+def _spill_run(run, tmp_dir=None):
+    fd, path = tempfile.mkstemp(prefix='tap_zoho_run_', suffix='.csv', dir=tmp_dir)
+    with os.fdopen(fd, 'w', newline='', encoding='utf-8') as run_file:
+        csv.writer(run_file).writerows(run)
+    return path
+
+
+def _read_run(path):
+    with open(path, newline='', encoding='utf-8') as run_file:
+        for row in csv.reader(run_file):
+            yield row
+
+
+def sort_csv_rows(rows, key_index, run_size=DEFAULT_SORT_RUN_SIZE, tmp_dir=None):
+    """Yields `rows` ordered by the column at `key_index`.
+
+    The ordering is stable, identical to `sorted(rows, key=itemgetter(key_index))`.
+    """
+    key = operator.itemgetter(key_index)
+    run_paths = []
+    run = []
+    try:
+        for row in rows:
+            run.append(row)
+            if len(run) >= run_size:
+                run.sort(key=key)
+                run_paths.append(_spill_run(run, tmp_dir))
+                run = []
+        run.sort(key=key)
+
+        if not run_paths:
+            yield from run
+            return
+
+        LOGGER.info('Merging %s sorted runs spilled to disk', len(run_paths) + 1)
+        runs = [_read_run(path) for path in run_paths]
+        runs.append(iter(run))
+        yield from heapq.merge(*runs, key=key)
+    finally:
+        for path in run_paths:
+            try:
+                os.remove(path)
+            except OSError:
+                LOGGER.warning('Unable to cleanup temporary sort run {}'.format(path))
@@ -0,0 +1,108 @@
+"""
+Typed conversion of the columns of bulk read CSV results.
+"""
+
+import singer
+
+LOGGER = singer.get_logger()
+
+TRUE_VALUES = {'true', 'TRUE', 'True'}
+FALSE_VALUES = {'false', 'FALSE', 'False'}
+
+
+def _get_types(property_schema):
+    """Returns the types a CSV value of `property_schema` is converted to.
+
+    For anyOf schemas, such as the union of the REST and bulk schemas of AUTO catalogs, the value is kept as text
+    when an alternative is a string, as bulk results hold ids, lookups and dates as text. Otherwise it is
+    converted to the types of the alternatives.
+    """
+    if 'anyOf' in property_schema:
+        types = [typ for alternative in property_schema['anyOf'] for typ in _get_types(alternative)]
+        return ['string'] if 'string' in types else types
+
+    types = property_schema.get('type', [])
+    if not isinstance(types, list):
+        types = [types]
+    return types
+
+
+def _make_converter(column, cast, failures):
+    def convert(value):
+        if value == '':
+            return None
+        try:
+            return cast(value)
+        except ValueError:
+            if column not in failures:
+                failures.add(column)
+                LOGGER.warning('Unable to convert value {!r} of column {}, keeping it as text'.format(value, column))
+            return value
+
+    return convert
+
+
+def _to_integer(value):
+    try:
+        return int(value)
+    except ValueError:
+        # Zoho writes some integer fields as '12.0'
+        number = float(value)
+        if not number.is_integer():
+            raise
+        return int(number)
+
+
+def _to_boolean(value):
+    if value in TRUE_VALUES:
+        return True
+    if value in FALSE_VALUES:
+        return False
+    raise ValueError(value)
+
+
+def get_column_converter(column, property_schema, failures):
+    """Returns the function converting the CSV text of `column` to its schema type, or None to keep the text."""
+    types = _get_types(property_schema)
+    if 'integer' in types:
+        return _make_converter(column, _to_integer, failures)
+    if 'number' in types:
+        return _make_converter(column, float, failures)
+    if 'boolean' in types:
+        return _make_converter(column, _to_boolean, failures)
+    return None
+
+
+def compile_row_converter(header, schema):
+    """Returns a function building the record of a CSV row of a bulk result with `header`.
+
+    Converters are resolved once from the stream `schema`; rows are zipped with the header and only the integer,
+    number and boolean columns are converted. Empty values of those columns become None. Every other column is
+    kept as text.
+    """
+    properties = (schema or {}).get('properties', {})
+    failures = set()
+    converters = []
+    for index, column in enumerate(header):
+        converter = get_column_converter(column, properties.get(column, {}), failures)
+        if converter is not None:
+            converters.append((index, converter))
+
+    if not converters:
+        return lambda line: dict(zip(header, line))
+
+    width = len(header)
+
+    def convert_row(line):
+        values = list(line)
+        if len(values) >= width:
+            for index, converter in converters:
+                values[index] = converter(values[index])
+        else:
+            # Short rows are zipped with the first columns of the header only
+            for index, converter in converters:
+                if index < len(values):
+                    values[index] = converter(values[index])
+        return dict(zip(header, values))
+
+    return convert_row
@@ -0,0 +1,91 @@
+"""
+On-disk cache of module field descriptions used by discovery.
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+
+import singer
+
+LOGGER = singer.get_logger()
+
+DEFAULT_DISCOVER_CACHE_TTL = 24 * 60 * 60
+DEFAULT_DISCOVER_CACHE_MAX_MODULES = 500
+
+
+def get_cache_name(org_id, user=None):
+    """Returns the file name of the cache of `org_id` as seen by `user`.
+
+    The fields a user can see depend on their profile, so every user has their own cache. The descriptions do not
+    depend on the api_type, which is applied when the schemas are built from them. `user` is hashed, it is usually
+    the refresh token.
+    """
+    user_hash = hashlib.sha256((user or '').encode('utf-8')).hexdigest()[:16]
+    return 'discover-{}-{}.json'.format(org_id, user_hash)
+
+
+class DiscoveryCache():
+    """Field descriptions of the modules of one org seen by one user, keyed by module api name.
+
+    A cached description is reused while the module's `modified_time` from the modules listing is unchanged and
+    it is younger than `ttl` seconds. Adding a field does not always change `modified_time`, so a cached description
+    can miss fields added within `ttl`. `refresh` ignores every cached description. At most `max_modules`
+    descriptions are kept, the least recently fetched ones are dropped first.
+    """
+
+    # pylint: disable=too-many-arguments
+    def __init__(self, directory, org_id, user=None, ttl=DEFAULT_DISCOVER_CACHE_TTL,
+                 max_modules=DEFAULT_DISCOVER_CACHE_MAX_MODULES, refresh=False):
+        self.path = os.path.join(directory, get_cache_name(org_id, user))
+        self.ttl = ttl
+        self.max_modules = max_modules
+        self.refresh = refresh
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._modules = {}
+
+        os.makedirs(directory, exist_ok=True)
+        if os.path.isfile(self.path):
+            try:
+                with open(self.path) as cache_file:
+                    self._modules = json.load(cache_file)
+            except (OSError, ValueError) as ex:
+                LOGGER.warning('Ignoring unreadable discovery cache {}: {}'.format(self.path, ex))
+
+    def get(self, module, modified_time):
+        """Returns the cached description of `module`, or None when it is missing, stale or changed."""
+        with self._lock:
+            entry = self._modules.get(module)
+            if (self.refresh
+                    or entry is None
+                    or entry['modified_time'] != modified_time
+                    or time.time() - entry['fetched_at'] > self.ttl):
+                self.misses += 1
+                return None
+            self.hits += 1
+            return entry['description']
+
+    def put(self, module, modified_time, description):
+        with self._lock:
+            self._modules[module] = {
+                'modified_time': modified_time,
+                'fetched_at': time.time(),
+                'description': description
+            }
+
+    def save(self):
+        with self._lock:
+            if len(self._modules) > self.max_modules:
+                newest = sorted(self._modules, key=lambda m: self._modules[m]['fetched_at'], reverse=True)
+                self._modules = {module: self._modules[module] for module in newest[:self.max_modules]}
+
+            tmp_path = self.path + '.tmp'
+            with open(tmp_path, 'w') as cache_file:
+                json.dump(self._modules, cache_file)
+            os.replace(tmp_path, self.path)
+
+        LOGGER.info('Discovery cache {}: {} modules reused, {} described'.format(self.path, self.hits, self.misses))
@@ -25,12 +25,13 @@ def get_error_message(ex):
   message = 'Error occurred for {url}. Error Code: {code} Error Code Desc: {code_desc} Error: Response ' \
             'error_content: {error_content}. Error Details:: {error_details}'
 
-  ex = ex.args[0]
-  url = ex is not None and ex.url or ''
-  status_code = ex is not None and ex.status_code or 'UNKNOWN'
-  error_content = ex is not None and ex.error_content or 'UNKNOWN Exception occurred'
-  error_code_desc = ex is not None and ex.error_code or 'UNKNOWN'
-  error_details = ex is not None and ex.error_details or ''
+  # The argument is either a ZCRMException or the requests Response of the failed call
+  ex = ex.args[0] if ex.args else None
+  url = getattr(ex, 'url', None) or ''
+  status_code = getattr(ex, 'status_code', None) or 'UNKNOWN'
+  error_content = getattr(ex, 'error_content', None) or getattr(ex, 'text', None) or 'UNKNOWN Exception occurred'
+  error_code_desc = getattr(ex, 'error_code', None) or getattr(ex, 'reason', None) or 'UNKNOWN'
+  error_details = getattr(ex, 'error_details', None) or ''
 
   return message.format(url=url,
                         code=status_code,
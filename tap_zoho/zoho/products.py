@@ -0,0 +1,141 @@
+"""
+Cached, batched lookups of Products records for the line items of Invoices and Sales_Orders.
+"""
+
+import collections
+import json
+import os
+
+import singer
+import singer.utils as singer_utils
+
+from tap_zoho.zoho.exceptions import TapZohoDataNotFoundException
+
+LOGGER = singer.get_logger()
+
+PRODUCTS_MODULE = 'Products'
+# Modules whose Product_Details line items are looked up in Products
+ORDER_INVOIVE_TABLE = {
+    'Sales_Orders',
+    'Invoices'
+}
+# Line item properties added to Invoices and Sales_Orders, 'zoho_key' is the key of the value in Product_Details
+ORDER_ADDITIONAL_FIELDS = [
+    {'api_name': 'Product_Code', 'data_type': 'text'},
+    {'api_name': 'Product_Category', 'data_type': 'text'},
+    {'api_name': 'Product_Id', 'data_type': 'text', 'zoho_key': 'id'},
+    {'api_name': 'Product_Name', 'data_type': 'text', 'zoho_key': 'name'},
+    {'api_name': 'Quantity', 'data_type': 'integer', 'zoho_key': 'quantity'},
+    {'api_name': 'Discount', 'data_type': 'integer', 'zoho_key': 'quantity'},
+    {'api_name': 'Net_Item_Cost', 'data_type': 'integer', 'zoho_key': 'net_total'},
+    {'api_name': 'Unit_Price', 'data_type': 'integer', 'zoho_key': 'net_total'},
+    {'api_name': 'Tax', 'data_type': 'integer'},
+    {'api_name': 'List_Price', 'data_type': 'integer', 'zoho_key': 'list_price'},
+    {'api_name': 'Unit_Price', 'data_type': 'integer', 'zoho_key': 'unit_price'},
+    {'api_name': 'Quantity_In_Stock', 'data_type': 'integer', 'zoho_key': 'quantity_in_stock'},
+    {'api_name': 'Total_Item_Cost', 'data_type': 'integer', 'zoho_key': 'total'},
+    {'api_name': 'Total_Item_Cost_After_Discount', 'data_type': 'integer', 'zoho_key': 'total_after_discount'},
+    {'api_name': 'Product_Description', 'data_type': 'integer', 'zoho_key': 'product_description'},
+    {'api_name': 'Line_Tax', 'data_type': 'text', 'zoho_key': 'line_tax'}
+]
+
+# Zoho accepts at most 100 ids in a single GET records request
+MAX_IDS_PER_REQUEST = 100
+DEFAULT_PRODUCT_CACHE_SIZE = 10000
+
+
+def _chunks(items, size):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+class ProductCache():
+    """LRU cache of Products records keyed by product id.
+
+    Missing ids are fetched in multi-id requests. When `path` is given the cache is loaded from and saved to that
+    file, and entries for products modified since the cache was last refreshed are evicted on load.
+    """
+
+    def __init__(self, zh, max_size=DEFAULT_PRODUCT_CACHE_SIZE, path=None):
+        self.zh = zh
+        self.max_size = max_size
+        self.path = path
+        self.refreshed_at = None
+        self._records = collections.OrderedDict()
+
+        if path:
+            self.load()
+
+    def _put(self, product_id, record):
+        self._records[product_id] = record
+        self._records.move_to_end(product_id)
+        while len(self._records) > self.max_size:
+            self._records.popitem(last=False)
+
+    def _get_records(self, params, headers=None):
+        """Yields the records of GET Products requests with `params`, following `more_records`."""
+        try:
+            for page in self.zh.client.get_record_pages(PRODUCTS_MODULE, params=params, headers=headers):
+                yield from page
+        except TapZohoDataNotFoundException:
+            return
+
+    def get_many(self, product_ids):
+        """Returns a dict of the records of `product_ids`, fetching the ones not cached yet."""
+        product_ids = [str(product_id) for product_id in product_ids]
+        missing = [product_id for product_id in dict.fromkeys(product_ids) if product_id not in self._records]
+
+        for chunk in _chunks(missing, MAX_IDS_PER_REQUEST):
+            LOGGER.info('Fetching {} products'.format(len(chunk)))
+            for record in self._get_records({'ids': ','.join(chunk)}):
+                self._put(str(record['id']), record)
+
+        found = {}
+        for product_id in product_ids:
+            if product_id in self._records:
+                self._records.move_to_end(product_id)
+                found[product_id] = self._records[product_id]
+        return found
+
+    def get(self, product_id):
+        return self.get_many([product_id]).get(str(product_id))
+
+    def load(self):
+        if not os.path.isfile(self.path):
+            self.refresh()
+            return
+
+        try:
+            with open(self.path) as cache_file:
+                cached = json.load(cache_file)
+        except (OSError, ValueError) as ex:
+            LOGGER.warning('Ignoring unreadable product cache {}: {}'.format(self.path, ex))
+            return
+
+        for product_id, record in cached.get('records', {}).items():
+            self._put(product_id, record)
+        self.refreshed_at = cached.get('refreshed_at')
+        self.refresh()
+
+    def refresh(self):
+        """Evicts the cached products modified since the last refresh."""
+        refreshed_at = singer_utils.now().replace(microsecond=0).isoformat()
+        if self.refreshed_at and self._records:
+            modified = self._get_records({'fields': 'id', 'per_page': 200},
+                                         headers={'If-Modified-Since': self.refreshed_at})
+            evicted = 0
+            for record in modified:
+                if self._records.pop(str(record['id']), None) is not None:
+                    evicted += 1
+            LOGGER.info('Evicted {} products modified since {} from the product cache'.format(
+                evicted, self.refreshed_at))
+        self.refreshed_at = refreshed_at
+
+    def save(self):
+        if not self.path:
+            return
+
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w') as cache_file:
+            json.dump({'refreshed_at': self.refreshed_at, 'records': self._records}, cache_file)
+        os.replace(tmp_path, self.path)
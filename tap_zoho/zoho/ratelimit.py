@@ -0,0 +1,225 @@
+"""
+Rate limit aware scheduling of the requests made to Zoho.
+"""
+
+import email.utils
+import random
+import threading
+import time
+
+import singer
+
+from tap_zoho.zoho.exceptions import TapZohoQuotaExceededException
+
+LOGGER = singer.get_logger()
+
+# Credits of the current rate limit window, and when it resets
+RATELIMIT_LIMIT_HEADER = 'X-RATELIMIT-LIMIT'
+RATELIMIT_REMAINING_HEADER = 'X-RATELIMIT-REMAINING'
+RATELIMIT_RESET_HEADER = 'X-RATELIMIT-RESET'
+# Credits of the day
+RATELIMIT_DAY_LIMIT_HEADER = 'X-RATELIMIT-DAY-LIMIT'
+RATELIMIT_DAY_REMAINING_HEADER = 'X-RATELIMIT-DAY-REMAINING'
+
+TOO_MANY_REQUESTS = 429
+RETRY_STATUS_CODES = {TOO_MANY_REQUESTS, 500, 502, 503, 504}
+# Error codes of the responses returned once the API credits of the org are used up
+QUOTA_ERROR_CODES = {'LIMIT_REACHED', 'LIMIT_EXCEEDED', 'API_LIMIT_EXCEEDED'}
+
+DEFAULT_MAX_CONCURRENCY = 10
+DEFAULT_MAX_RETRIES = 8
+DEFAULT_RETRY_BASE_DELAY = 1
+DEFAULT_RETRY_MAX_DELAY = 60
+DEFAULT_QUOTA_RESERVE = 0
+# Longest wait for a rate limit window to reset, longer resets are waited for in steps
+MAX_WINDOW_WAIT = 60
+# Successful responses needed before the concurrency limit grows by one again
+SUCCESSES_PER_INCREASE = 20
+
+
+def get_retry_after(resp):
+    """Returns the seconds to wait given by the Retry-After header of `resp`, or None."""
+    value = resp.headers.get('Retry-After')
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        retry_at = email.utils.parsedate_to_datetime(value)
+        if retry_at is None:
+            return None
+        return max(0.0, retry_at.timestamp() - time.time())
+
+
+def get_quota_error_code(resp):
+    """Returns the error code of `resp` when it reports that the API credits are used up, otherwise None."""
+    if resp.status_code < 400:
+        return None
+    try:
+        body = resp.json()
+    except ValueError:
+        return None
+    if not isinstance(body, dict):
+        return None
+    code = body.get('code')
+    if code is None and body.get('data'):
+        code = body['data'][0].get('code')
+    return code if code in QUOTA_ERROR_CODES else None
+
+
+def _get_int_header(resp, name):
+    try:
+        return int(resp.headers[name])
+    except (KeyError, ValueError):
+        return None
+
+
+def get_reset_time(value, now):
+    """Returns the epoch time of an X-RATELIMIT-RESET `value`, given in epoch milliseconds, epoch seconds or
+    seconds from `now`."""
+    if value > 10 ** 11:
+        return value / 1000.0
+    if value > 10 ** 9:
+        return float(value)
+    return now + value
+
+
+class RequestScheduler():
+    """Runs requests under an adaptive concurrency limit and retries throttled and failed ones.
+
+    The concurrency limit starts at `max_concurrency`, is halved on every 429 and grows by one after
+    SUCCESSES_PER_INCREASE successful responses. 429 and 5xx responses are retried up to `max_retries` times with
+    full jitter exponential backoff, waiting at least as long as their Retry-After header asks.
+
+    Once the credits of the current rate limit window are used up, requests wait until the window resets. Once the
+    credits of the day drop to `quota_reserve`, or Zoho reports them used up, no further request is sent and
+    TapZohoQuotaExceededException is raised.
+    """
+
+    # pylint: disable=too-many-arguments,too-many-instance-attributes
+    def __init__(self, max_concurrency=DEFAULT_MAX_CONCURRENCY, max_retries=DEFAULT_MAX_RETRIES,
+                 retry_base_delay=DEFAULT_RETRY_BASE_DELAY, retry_max_delay=DEFAULT_RETRY_MAX_DELAY,
+                 quota_reserve=DEFAULT_QUOTA_RESERVE, sleep=time.sleep, clock=time.time):
+        self.max_concurrency = max(1, max_concurrency)
+        self.max_retries = max_retries
+        self.retry_base_delay = retry_base_delay
+        self.retry_max_delay = retry_max_delay
+        self.quota_reserve = quota_reserve
+        self.sleep = sleep
+        self.clock = clock
+
+        self.concurrency = self.max_concurrency
+        self.limit = None
+        self.remaining = None
+        self.reset_at = None
+        self.day_limit = None
+        self.day_remaining = None
+        self.window_waits = 0
+        self.retries = 0
+        self._active = 0
+        self._successes = 0
+        self._quota_error = None
+        self._condition = threading.Condition()
+
+    def _check_quota(self):
+        if self._quota_error:
+            raise TapZohoQuotaExceededException(self._quota_error)
+        if self.day_remaining is not None and self.day_remaining <= self.quota_reserve:
+            self._quota_error = 'Zoho API credits of the day nearly used up: {} of {} remaining, reserve is {}'.format(
+                self.day_remaining, self.day_limit, self.quota_reserve)
+            raise TapZohoQuotaExceededException(self._quota_error)
+
+    def _get_window_wait(self):
+        """Returns the seconds until the used up rate limit window resets, or 0 when credits are left."""
+        if self.remaining is None or self.remaining > 0 or self.reset_at is None:
+            return 0
+        wait = self.reset_at - self.clock()
+        if wait <= 0:
+            # The window has reset, the next response reports the credits of the new one
+            self.remaining = None
+            return 0
+        return min(wait, MAX_WINDOW_WAIT)
+
+    def _acquire(self):
+        while True:
+            with self._condition:
+                self._check_quota()
+                wait = self._get_window_wait()
+                if not wait:
+                    while self._active >= self.concurrency:
+                        self._condition.wait()
+                        self._check_quota()
+                    self._active += 1
+                    return
+                self.window_waits += 1
+            LOGGER.info('Zoho rate limit window used up, waiting {:.1f}s for it to reset'.format(wait))
+            self.sleep(wait)
+
+    def _release(self):
+        with self._condition:
+            self._active -= 1
+            self._condition.notify_all()
+
+    def _observe(self, resp):
+        """Records the rate limit headers of `resp` and returns whether it is retried."""
+        retry = resp.status_code in RETRY_STATUS_CODES
+        with self._condition:
+            remaining = _get_int_header(resp, RATELIMIT_REMAINING_HEADER)
+            if remaining is not None:
+                self.remaining = remaining
+                self.limit = _get_int_header(resp, RATELIMIT_LIMIT_HEADER)
+                reset = _get_int_header(resp, RATELIMIT_RESET_HEADER)
+                self.reset_at = get_reset_time(reset, self.clock()) if reset is not None else None
+            day_remaining = _get_int_header(resp, RATELIMIT_DAY_REMAINING_HEADER)
+            if day_remaining is not None:
+                self.day_remaining = day_remaining
+                self.day_limit = _get_int_header(resp, RATELIMIT_DAY_LIMIT_HEADER)
+
+            quota_error_code = get_quota_error_code(resp)
+            if quota_error_code and self.day_remaining is not None and self.day_remaining > self.quota_reserve:
+                # Credits of the day are left, only the window is used up and the request is retried
+                quota_error_code = None
+                retry = True
+            if quota_error_code:
+                self._quota_error = 'Zoho API credits used up ({}): {}'.format(quota_error_code, resp.text)
+
+            if resp.status_code == TOO_MANY_REQUESTS:
+                self._successes = 0
+                self.concurrency = max(1, self.concurrency // 2)
+                LOGGER.warning('Throttled by Zoho, lowering request concurrency to {}'.format(self.concurrency))
+            elif resp.status_code < 400:
+                self._successes += 1
+                if self._successes >= SUCCESSES_PER_INCREASE and self.concurrency < self.max_concurrency:
+                    self._successes = 0
+                    self.concurrency += 1
+                    self._condition.notify_all()
+
+        if quota_error_code:
+            raise TapZohoQuotaExceededException(self._quota_error)
+        return retry
+
+    def get_retry_delay(self, attempt, retry_after=None):
+        delay = random.uniform(0, min(self.retry_max_delay, self.retry_base_delay * 2 ** attempt))
+        if retry_after is not None:
+            delay = max(delay, retry_after)
+        return delay
+
+    def execute(self, send):
+        """Calls `send()` until it returns a response that is not retried, and returns that response."""
+        attempt = 0
+        while True:
+            self._acquire()
+            try:
+                resp = send()
+            finally:
+                self._release()
+            if not self._observe(resp) or attempt >= self.max_retries:
+                return resp
+
+            delay = self.get_retry_delay(attempt, get_retry_after(resp))
+            LOGGER.warning('Zoho responded {} for {}, retrying in {:.1f}s ({} of {})'.format(
+                resp.status_code, resp.url, delay, attempt + 1, self.max_retries))
+            resp.close()
+            self.retries += 1
+            attempt += 1
+            self.sleep(delay)
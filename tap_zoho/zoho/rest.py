@@ -4,15 +4,128 @@ Created on Dec 14, 2019
 @author: Juned Jabbar
 """
 
+import datetime
+import queue
+import threading
+
+import dateutil.parser
 import singer
-import zcrmsdk
+from requests.exceptions import RequestException
 
-from zcrmsdk import ZCRMRecord, ZCRMModule
+from tap_zoho import instrumentation
 from tap_zoho.sync import fix_tuple_keys
 from tap_zoho.zoho.exceptions import TapZohoException, TapZohoDataNotFoundException
+from tap_zoho.zoho.products import ORDER_INVOIVE_TABLE, ORDER_ADDITIONAL_FIELDS
 
 LOGGER = singer.get_logger()
 
+_PREFETCH_DONE = object()
+
+# Zoho accepts at most 50 field api names in the fields parameter of GET records
+MAX_REST_FIELDS = 50
+# Ids of the records modified at the same time kept in state to resume a REST sync
+MAX_RESUME_IDS = 1000
+# Fields of Invoices and Sales_Orders that the normalization of line items reads
+ORDER_NORMALIZED_FIELDS = ['Product_Details', 'Owner', 'Created_By', 'Modified_By', 'Account_Name']
+
+
+def prefetch(iterable, size):
+    """Iterates `iterable` in a background thread, keeping at most `size` items ahead of the consumer.
+
+    Exceptions raised by `iterable` are re-raised in the consuming thread.
+    """
+    if size <= 0:
+        yield from iterable
+        return
+
+    items = queue.Queue(maxsize=size)
+    stop = threading.Event()
+
+    def put(item):
+        while not stop.is_set():
+            try:
+                items.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def produce():
+        try:
+            for item in iterable:
+                if not put((item, None)):
+                    return
+            put((_PREFETCH_DONE, None))
+        except Exception as ex:  # pylint: disable=broad-except
+            put((_PREFETCH_DONE, ex))
+
+    threading.Thread(target=produce, name='prefetch', daemon=True).start()
+    try:
+        while True:
+            item, error = items.get()
+            if error is not None:
+                raise error
+            if item is _PREFETCH_DONE:
+                return
+            yield item
+    finally:
+        stop.set()
+
+
+class RestProgress():
+    """Keeps the position of the last fully emitted page of a REST sync in the RestResumeModifiedTime and
+    RestResumeIds bookmarks of `state`.
+
+    The ids are those of the records modified at RestResumeModifiedTime. Past `max_ids` of them only the
+    Modified_Time is kept, a resumed sync then emits the records modified at that time again.
+    """
+
+    def __init__(self, state, tap_stream_id, max_ids=MAX_RESUME_IDS):
+        self.state = state
+        self.tap_stream_id = tap_stream_id
+        self.max_ids = max_ids
+        self.modified_time = singer.get_bookmark(state, tap_stream_id, 'RestResumeModifiedTime')
+        ids = singer.get_bookmark(state, tap_stream_id, 'RestResumeIds')
+        self.ids = set(ids) if ids is not None else None
+        # Records emitted before the interruption are only found on the first pages of a resumed sync
+        self._resumed_from = dateutil.parser.parse(self.modified_time) if self.modified_time else None
+
+    def _is_emitted(self, rec):
+        modified_time = dateutil.parser.parse(rec['Modified_Time'])
+        if modified_time < self._resumed_from:
+            return True
+        return modified_time == self._resumed_from and self.ids is not None and rec.get('id') in self.ids
+
+    def skip_emitted(self, records):
+        """Returns the records of a page without those emitted by the interrupted sync."""
+        if self._resumed_from is None:
+            return records
+        remaining = [rec for rec in records if not self._is_emitted(rec)]
+        if remaining and dateutil.parser.parse(remaining[-1]['Modified_Time']) > self._resumed_from:
+            self._resumed_from = None
+        return remaining
+
+    def add_page(self, page_keys):
+        """Moves the position past a page of (Modified_Time, id) pairs in emitted order."""
+        if not page_keys:
+            return
+        last_time = page_keys[-1][0]
+        if last_time != self.modified_time:
+            self.modified_time = last_time
+            self.ids = set()
+        if self.ids is not None:
+            self.ids.update(record_id for modified_time, record_id in page_keys if modified_time == last_time)
+            if len(self.ids) > self.max_ids:
+                self.ids = None
+
+        singer.write_bookmark(self.state, self.tap_stream_id, 'RestResumeModifiedTime', self.modified_time)
+        singer.write_bookmark(self.state, self.tap_stream_id, 'RestResumeIds',
+                              sorted(self.ids) if self.ids is not None else None)
+
+    def clear(self):
+        singer.clear_bookmark(self.state, self.tap_stream_id, 'RestResumeModifiedTime')
+        singer.clear_bookmark(self.state, self.tap_stream_id, 'RestResumeIds')
+
 
 class Rest():
     def __init__(self, zh):
@@ -29,81 +142,130 @@ class Rest():
     #
     #   return resp
 
+    def _get_pages(self, sobject, c_headers, fields=None):
+        """Yields the records of each page, Zoho only returns 200 records per call."""
+        params = {'page': 1, 'per_page': 200, 'sort_by': 'Modified_Time', 'sort_order': 'asc'}
+        if fields:
+            params['fields'] = ','.join(fields)
+        return self.zh.client.get_record_pages(sobject, params=params, headers=c_headers)
+
+    def get_projection(self, sobject, catalog):
+        """Returns the fields to request for the selected properties, or None to request every field."""
+        selected = self.zh.get_selected_fields(catalog)
+        if selected is None:
+            return None
+
+        if sobject in ORDER_INVOIVE_TABLE:
+            # The line item properties are derived from Product_Details and the lookups rebuilt by normalization
+            additional_fields = {field['api_name'] for field in ORDER_ADDITIONAL_FIELDS}
+            selected = [field for field in selected if field not in additional_fields]
+            selected += [field for field in ORDER_NORMALIZED_FIELDS if field not in selected]
+
+        if len(selected) > MAX_REST_FIELDS:
+            return None
+        return selected
+
     def get_data(self, sobject=None, state=None, catalog=None):
-        to_return = []
-        page = 1
-        c_headers = {'If-Modified-Since': self.zh.get_start_date(state, catalog, True)}
+        """Yields the records changed since the bookmark, page by page in Modified_Time order.
+
+        After every page the Modified_Time of its last record and the ids of the records emitted with that
+        Modified_Time are kept in state as RestResumeModifiedTime and RestResumeIds. An interrupted sync resumes
+        from that Modified_Time, skipping those ids, instead of from the bookmark.
+        """
+        tap_stream_id = catalog['tap_stream_id']
+        resume_time = singer.get_bookmark(state, tap_stream_id, 'RestResumeModifiedTime')
+        if resume_time:
+            # Requested from a second earlier so the records modified at resume_time are included whether or not
+            # If-Modified-Since is inclusive, the ones already emitted are skipped
+            since = dateutil.parser.parse(resume_time) - datetime.timedelta(seconds=1)
+            c_headers = {'If-Modified-Since': since.isoformat()}
+            LOGGER.info('Resuming stream {} from records modified at {}'.format(sobject, resume_time))
+        else:
+            c_headers = {'If-Modified-Since': self.zh.get_start_date(state, catalog, True)}
         LOGGER.info('Adding custom headers as {}'.format(c_headers))
+        progress = RestProgress(state, tap_stream_id)
+        prefetch_pages = int(self.zh.config.get('rest_prefetch_pages') or 0)
+        fields = self.get_projection(sobject, catalog)
+        if fields:
+            LOGGER.info('Requesting {} fields of stream {}'.format(len(fields), sobject))
+        pages = instrumentation.IterTimer(self._get_pages(sobject, c_headers, fields))
+        normalized = None
         try:
-            module_ins = ZCRMModule.get_instance(sobject)
             # if state contains any is-modified variable which is to fetch modified data since the date.
-            # pass custom_headers = {} in get records
-            # get_records only returns 200 records per call, this function needs to be called iteratively
-            # in order to fetch all records.
-            resp = module_ins.get_records(custom_headers=c_headers, page=page, per_page=200, sort_by='Modified_Time',
-                                          sort_order='asc')
-            info = resp.response_json['info']
-            to_return.extend(resp.response_json['data'])
-
-            while True:
-                if info['more_records']:
-                    page += 1
-                    resp = module_ins.get_records(custom_headers=c_headers, page=page, per_page=200,
-                                                  sort_by='Modified_Time',
-                                                  sort_order='asc')
-                    info = resp.response_json['info']
-                    to_return.extend(resp.response_json['data'])
-                else:
-                    break
-
-            LOGGER.info('Normalizing data')
-            for rec in to_return:
-                if sobject == 'Invoices' or sobject == 'Sales_Orders':
-                    LOGGER.info('Normalizing Product_Details for steam {} '.format(sobject))
-                    # Here Product_Details can contain multiple line items, which needs to be converted in to separate
-                    # objects.
-                    product_details = rec['Product_Details']
-                    for product in product_details:
-                        product_id = product['product']['id']
-                        product_record = ZCRMRecord.get_instance('Products', product_id).get()
-                        product_record = product_record.response_json['data'][0]
-                        product['Product_Category'] = product_record['Product_Category']
-                        del product['id']
-                        self.zh.append_product_record(rec, product)
-
-                        owner = {'Owner': rec['Owner']}
-                        created_by = {'Created_By': rec['Created_By']}
-                        modified_by = {'Modified_By': rec['Modified_By']}
-                        account_name = {'Account_Name': rec['Account_Name']}
-
-                        del rec['Owner']
-                        del rec['Created_By']
-                        del rec['Modified_By']
-                        del rec['Account_Name']
-
-                        owner = fix_tuple_keys(owner)
-                        rec['Owner'] = owner['Owner']
-
-                        created_by = fix_tuple_keys(created_by)
-                        rec['Created_By'] = created_by['Created_By']
-
-                        modified_by = fix_tuple_keys(modified_by)
-                        rec['Modified_By'] = modified_by['Modified_By']
-
-                        account_name = fix_tuple_keys(account_name)
-                        rec['Account_Name'] = account_name['Account_Name']
-                        yield rec
-                else:
-                    # This will have data written to the singer target (target-csv) in this case.
-                    rec = fix_tuple_keys(rec)
+            # Pages are fetched in the background while the records of the current page are normalized and
+            # written, so only a few pages are held in memory.
+            for to_return in prefetch(pages, prefetch_pages):
+                to_return = progress.skip_emitted(to_return)
+                # Normalization modifies the records, the keys of the page are read first
+                page_keys = [(rec.get('Modified_Time'), rec.get('id')) for rec in to_return]
+                normalized = instrumentation.IterTimer(self._normalize_page(sobject, to_return))
+                for rec in normalized:
                     yield rec
+                instrumentation.add(sobject, 'normalize', normalized.seconds, normalized.calls)
+                normalized = None
+                progress.add_page(page_keys)
+
+            if sobject in ORDER_INVOIVE_TABLE:
+                self.zh.get_product_cache().save()
+            progress.clear()
 
-            return to_return
+        except TapZohoDataNotFoundException:
+            progress.clear()
+            raise
+        except RequestException as ex:
+            raise TapZohoException(ex)
+        finally:
+            # Pages are fetched in the prefetch thread, so the fetch stage overlaps the others
+            instrumentation.add(sobject, 'fetch', pages.seconds, pages.calls)
+            if normalized is not None:
+                instrumentation.add(sobject, 'normalize', normalized.seconds, normalized.calls)
 
-        except zcrmsdk.ZCRMException as ex:
-            if ex.error_code == 'No Content':
-                raise TapZohoDataNotFoundException(ex)
-            elif ex.error_code == 'Not Modified':
-                raise TapZohoDataNotFoundException(ex)
+    def _get_page_products(self, sobject, to_return):
+        """Looks up the products of every line item of the page at once, deduplicated and batched."""
+        product_ids = [product['product']['id'] for rec in to_return for product in rec['Product_Details']]
+        with instrumentation.stage(sobject, 'products'):
+            return self.zh.get_product_cache().get_many(product_ids)
+
+    def _normalize_page(self, sobject, to_return):
+        LOGGER.info('Normalizing data')
+        if sobject in ORDER_INVOIVE_TABLE:
+            products = self._get_page_products(sobject, to_return)
+        for rec in to_return:
+            if sobject in ORDER_INVOIVE_TABLE:
+                LOGGER.info('Normalizing Product_Details for steam {} '.format(sobject))
+                # Here Product_Details can contain multiple line items, which needs to be converted in to separate
+                # objects.
+                product_details = rec['Product_Details']
+                for product in product_details:
+                    product_id = product['product']['id']
+                    product_record = products.get(str(product_id), {})
+                    product['Product_Category'] = product_record.get('Product_Category')
+                    del product['id']
+                    self.zh.append_product_record(rec, product)
+
+                    owner = {'Owner': rec['Owner']}
+                    created_by = {'Created_By': rec['Created_By']}
+                    modified_by = {'Modified_By': rec['Modified_By']}
+                    account_name = {'Account_Name': rec['Account_Name']}
+
+                    del rec['Owner']
+                    del rec['Created_By']
+                    del rec['Modified_By']
+                    del rec['Account_Name']
+
+                    owner = fix_tuple_keys(owner)
+                    rec['Owner'] = owner['Owner']
+
+                    created_by = fix_tuple_keys(created_by)
+                    rec['Created_By'] = created_by['Created_By']
+
+                    modified_by = fix_tuple_keys(modified_by)
+                    rec['Modified_By'] = modified_by['Modified_By']
+
+                    account_name = fix_tuple_keys(account_name)
+                    rec['Account_Name'] = account_name['Account_Name']
+                    yield rec
             else:
-                raise TapZohoException(ex)
+                # This will have data written to the singer target (target-csv) in this case.
+                rec = fix_tuple_keys(rec)
+                yield rec
@@ -0,0 +1,66 @@
+"""
+Concurrent scheduling of bulk read jobs across streams.
+"""
+
+import collections
+
+import singer
+
+from tap_zoho.zoho.bulk import Bulk, JOB_RUNNING_STATES, get_polling_interval
+
+LOGGER = singer.get_logger()
+
+
+class BulkJobScheduler():
+    """Keeps up to `max_concurrent_jobs` bulk jobs running and hands out streams as their jobs finish.
+
+    Jobs for the first page of every stream are submitted up front, polled together and yielded in completion
+    order. While the caller streams the results of one job, Zoho keeps processing the others. Every window of a
+    sharded query started with its stream takes a slot until the stream is handed out.
+    """
+
+    def __init__(self, zh, max_concurrent_jobs=1):
+        self.zh = zh
+        self.bulk = Bulk(zh)
+        self.max_concurrent_jobs = max(1, max_concurrent_jobs)
+
+    def _submit(self, pending, active, state):
+        while pending:
+            free_slots = self.max_concurrent_jobs - sum(len(job_ids) for _, job_ids in active.values())
+            if free_slots < 1:
+                return
+            catalog_entry = pending.popleft()
+            job_ids = self.bulk.start_job(sobject=catalog_entry['stream'], state=state, catalog=catalog_entry,
+                                          max_jobs=free_slots)
+            # The stream is handed out once the job of its first page or window is done
+            active[job_ids[0]] = (catalog_entry, job_ids)
+
+    def run(self, catalog_entries, state):
+        """Yields `(catalog_entry, job_id)` for each entry once its first bulk job is no longer running."""
+        pending = collections.deque(catalog_entries)
+        active = collections.OrderedDict()
+        attempt = 0
+
+        while pending or active:
+            self._submit(pending, active, state)
+
+            finished = []
+            for job_id, (catalog_entry, _) in active.items():
+                job_state = self.bulk.get_job_status(job_id)['state']
+                if job_state not in JOB_RUNNING_STATES:
+                    finished.append((job_id, catalog_entry))
+
+            if not finished:
+                interval = get_polling_interval(attempt)
+                LOGGER.info('Waiting on {} bulk jobs, {} streams queued, checking again in {:.1f}s'.format(
+                    len(active), len(pending), interval))
+                self.bulk.wait_for_jobs(list(active), interval)
+                attempt += 1
+                continue
+
+            attempt = 0
+            for job_id, catalog_entry in finished:
+                del active[job_id]
+                yield catalog_entry, job_id
+                # Refill the freed slots before streaming the next finished job
+                self._submit(pending, active, state)
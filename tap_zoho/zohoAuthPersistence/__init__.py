@@ -9,6 +9,7 @@ import os
 import tempfile
 import singer.utils as singer_utils
 import pickle
+import threading
 from zcrmsdk.OAuthUtility import ZohoOAuthConstants
 from zcrmsdk.OAuthClient import ZohoOAuthTokens
 
@@ -20,63 +21,70 @@ LOGGER = singer.get_logger()
 class ZohoAuthPersistence(object):
   '''
   This class deals with persistance of oauth related tokens in File
+
+  The SDK creates a new instance for every token lookup, so the parsed arguments and the tokens are kept on the
+  class. The token file is read once per process and only written when the access token changes.
   '''
 
+  _args = None
+  _tokens = {}
+  _lock = threading.Lock()
+
   def __init__(self):
     self.expiryTime = None
-    self.args = singer_utils.parse_args(REQUIRED_CONFIG_KEYS)
+    if ZohoAuthPersistence._args is None:
+      ZohoAuthPersistence._args = singer_utils.parse_args(REQUIRED_CONFIG_KEYS)
+    self.args = ZohoAuthPersistence._args
     self.token_directory = os.path.join(tempfile.gettempdir(), self.args.config['refresh_token'])
     self.file_path = os.path.join(self.token_directory,
                                   ZohoOAuthConstants.PERSISTENCE_FILE_NAME)
 
   def save_oauthtokens(self, oAuthTokens):
     try:
-      self.delete_oauthtokens(oAuthTokens.userEmail)
-      if os.path.isfile(self.file_path):
-        with open(self.file_path, 'ab') as fp:
-          pickle.dump(oAuthTokens, fp, pickle.HIGHEST_PROTOCOL)
-      else:
-        with open(self.file_path, 'wb') as fp:
+      with ZohoAuthPersistence._lock:
+        cached = ZohoAuthPersistence._tokens.get(self.file_path)
+        ZohoAuthPersistence._tokens[self.file_path] = oAuthTokens
+        if cached is not None and cached.accessToken == oAuthTokens.accessToken:
+          return
+
+        os.makedirs(self.token_directory, exist_ok=True)
+        tmp_path = self.file_path + '.tmp'
+        with open(tmp_path, 'wb') as fp:
           pickle.dump(oAuthTokens, fp, pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, self.file_path)
 
     except Exception as ex:
-      LOGGER.error("Exception occurred while saving oauthtokens into File {}".format(self.file_path), ex)
+      LOGGER.error("Exception occurred while saving oauthtokens into File {}: {}".format(self.file_path, ex))
       raise ex
 
   def get_oauthtokens(self, userEmail=None):
+    cached = ZohoAuthPersistence._tokens.get(self.file_path)
+    if cached is not None:
+      return cached
+
     try:
-      responseObj = ZohoOAuthTokens(None, None, None, None)
-      if not os.path.isfile(self.file_path):
-        return responseObj
-      with open(self.file_path, 'rb') as fp:
-        while True:
+      with ZohoAuthPersistence._lock:
+        responseObj = ZohoOAuthTokens(None, None, None, None)
+        if not os.path.isfile(self.file_path):
+          return responseObj
+        with open(self.file_path, 'rb') as fp:
           try:
-            oAuthObj = pickle.load(fp)
-            responseObj = oAuthObj
-            break
+            responseObj = pickle.load(fp)
           except EOFError:
-            break
-      return responseObj
+            return responseObj
+        ZohoAuthPersistence._tokens[self.file_path] = responseObj
+        return responseObj
     except Exception as ex:
-      LOGGER.error("Exception occurred while fetching oauthtokens from File {}".format(self.file_path), ex)
+      LOGGER.error("Exception occurred while fetching oauthtokens from File {}: {}".format(self.file_path, ex))
       raise ex
 
   def delete_oauthtokens(self, userEmail):
     try:
-      if not os.path.isfile(self.file_path):
-        return
-      objectsToPreserve = []
-      with open(self.file_path, 'rb') as fp:
-        while True:
-          try:
-            oAuthObj = pickle.load(fp)
-            objectsToPreserve.append(oAuthObj)
-          except EOFError:
-            break
-      with open(self.file_path, 'wb') as fp:
-        for eachObj in objectsToPreserve:
-          pickle.dump(eachObj, fp, pickle.HIGHEST_PROTOCOL)
+      with ZohoAuthPersistence._lock:
+        ZohoAuthPersistence._tokens.pop(self.file_path, None)
+        if os.path.isfile(self.file_path):
+          os.remove(self.file_path)
 
     except Exception as ex:
-      LOGGER.error("Exception occurred while deleting oauthtokens from File {}".format(self.file_path), ex)
+      LOGGER.error("Exception occurred while deleting oauthtokens from File {}: {}".format(self.file_path, ex))
       raise ex
@@ -0,0 +1,46 @@
+import copy
+import logging
+import sys
+
+import pytest
+
+import tap_zoho
+from benchmarks import run as bench
+from benchmarks.server import ZohoStandIn
+from tap_zoho import writer
+
+
+@pytest.fixture
+def stand_in():
+    """Returns a function starting a ZohoStandIn, which is stopped after the test."""
+    stand_ins = []
+
+    def start(modules, **kwargs):
+        stand_ins.append(ZohoStandIn(modules, **kwargs).start())
+        return stand_ins[-1]
+
+    yield start
+    for server in stand_ins:
+        server.stop()
+
+
+@pytest.fixture
+def login(tmp_path):
+    """Returns a function logging in to a stand-in with `api_type` and extra config, the tap config, the command
+    line and the writer are restored after the test."""
+    config = copy.deepcopy(tap_zoho.CONFIG)
+    argv = sys.argv
+    out = writer.WRITER.out
+
+    def login_to(server, api_type, extra_config=None):
+        zh = bench._login(server.url, api_type, str(tmp_path), extra_config or {})
+        logging.disable(logging.INFO)
+        return zh
+
+    yield login_to
+    logging.disable(logging.NOTSET)
+    writer.configure()
+    writer.WRITER.out = out
+    sys.argv = argv
+    tap_zoho.CONFIG.clear()
+    tap_zoho.CONFIG.update(config)
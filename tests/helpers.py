@@ -0,0 +1,49 @@
+import io
+import json
+
+import pytest
+
+import tap_zoho
+from benchmarks import run as bench
+from tap_zoho import writer
+
+
+def discover(zh, streams):
+    """Returns the catalog of `zh` with `streams` selected."""
+    catalog = bench._discover(zh)
+    for stream in streams:
+        bench._get_catalog_entry(catalog, stream)
+    return catalog
+
+
+def sync(zh, catalog, state=None, **writer_config):
+    """Syncs `catalog` and returns the written messages and the state."""
+    out = io.BytesIO()
+    writer.WRITER.out = out
+    writer.configure(**writer_config)
+    state = state if state is not None else {}
+    tap_zoho.do_sync(zh, catalog, state)
+    writer.close()
+    return [json.loads(line) for line in out.getvalue().splitlines()], state
+
+
+def interrupted_sync(zh, catalog, monkeypatch, records):
+    """Syncs `catalog` until `records` records are written and returns the messages written until then."""
+    out = io.BytesIO()
+    writer.WRITER.out = out
+    writer.configure()
+    write_record = writer.write_record
+    written = []
+
+    def interrupting_write_record(*args, **kwargs):
+        if len(written) == records:
+            raise KeyboardInterrupt
+        written.append(args)
+        return write_record(*args, **kwargs)
+
+    with monkeypatch.context() as patch:
+        patch.setattr(writer, 'write_record', interrupting_write_record)
+        with pytest.raises(KeyboardInterrupt):
+            tap_zoho.do_sync(zh, catalog, {})
+    writer.flush()
+    return [json.loads(line) for line in out.getvalue().splitlines()]
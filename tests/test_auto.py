@@ -0,0 +1,28 @@
+import jsonschema
+
+from benchmarks.data import FIELD_TYPES, SyntheticModule
+from tests.helpers import discover, sync
+
+
+def test_auto_streams_match_their_catalog_schema(stand_in, login):
+    server = stand_in([SyntheticModule('Leads', 500, len(FIELD_TYPES)),
+                       SyntheticModule('Contacts', 50, len(FIELD_TYPES))])
+    zh = login(server, 'AUTO', {'auto_bulk_min_rows': 400})
+    catalog = discover(zh, ['Leads', 'Contacts'])
+    schemas = {entry['tap_stream_id']: entry['schema'] for entry in catalog['streams']}
+
+    messages, _ = sync(zh, catalog)
+
+    assert zh.stream_api_types == {'Leads': 'BULK', 'Contacts': 'REST'}
+    records = [message for message in messages if message['type'] == 'RECORD']
+    assert len(records) == 550
+    for message in records:
+        jsonschema.Draft4Validator(schemas[message['stream']]).validate(message['record'])
+
+    leads = [message['record'] for message in records if message['stream'] == 'Leads']
+    # Bulk values are typed, ids and lookups are kept as text
+    assert all(isinstance(record['Field_1_integer'], int) for record in leads)
+    assert all(isinstance(record['Field_2_double'], float) for record in leads)
+    assert all(isinstance(record['Field_4_boolean'], bool) for record in leads)
+    assert all(isinstance(record['Field_11_bigint'], str) for record in leads)
+    assert all(isinstance(record['Field_9_ownerlookup'], str) for record in leads)
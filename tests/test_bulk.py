@@ -0,0 +1,204 @@
+import datetime
+import io
+import json
+
+import pytest
+
+import tap_zoho
+from benchmarks.data import BASE_TIME, SyntheticModule, format_time
+from tap_zoho import writer
+from tap_zoho.zoho.bulk import Bulk
+from tests.helpers import discover, interrupted_sync, sync
+
+SHARD_CONFIG = {'bulk_shard_rows': 500, 'bulk_shard_max_windows': 6, 'bulk_max_concurrent_jobs': 2}
+
+
+def get_records(messages):
+    records = {}
+    for message in messages:
+        if message['type'] == 'RECORD':
+            records.setdefault(message['stream'], []).append(message['record'])
+    return records
+
+
+def get_entry(catalog, stream):
+    return next(entry for entry in catalog['streams'] if entry['tap_stream_id'] == stream)
+
+
+@pytest.fixture
+def outstanding_jobs(monkeypatch):
+    """Counts the bulk jobs created and not yet downloaded, and keeps the highest count."""
+    jobs = {'outstanding': 0, 'max': 0}
+    create_job = Bulk._create_job
+    download = Bulk._download_batch_results
+
+    def counted_create_job(self, *args, **kwargs):
+        jobs['outstanding'] += 1
+        jobs['max'] = max(jobs['max'], jobs['outstanding'])
+        return create_job(self, *args, **kwargs)
+
+    def counted_download(self, job_id):
+        jobs['outstanding'] -= 1
+        return download(self, job_id)
+
+    monkeypatch.setattr(Bulk, '_create_job', counted_create_job)
+    monkeypatch.setattr(Bulk, '_download_batch_results', counted_download)
+    return jobs
+
+
+@pytest.mark.parametrize('max_concurrent_jobs', [1, 2, 3])
+def test_sharded_sync_keeps_to_the_concurrent_jobs_limit(stand_in, login, outstanding_jobs, max_concurrent_jobs):
+    server = stand_in([SyntheticModule('Leads', 3000, 6), SyntheticModule('Contacts', 500, 6)])
+    zh = login(server, 'BULK')
+    catalog = discover(zh, ['Leads', 'Contacts'])
+    expected = get_records(sync(zh, catalog)[0])
+
+    tap_zoho.CONFIG.update(SHARD_CONFIG, bulk_max_concurrent_jobs=max_concurrent_jobs)
+    outstanding_jobs['max'] = 0
+    messages, state = sync(zh, catalog)
+
+    assert get_records(messages) == expected
+    assert len(expected['Leads']) == 3000
+    assert outstanding_jobs['max'] == max_concurrent_jobs
+    assert 'BulkShards' not in state['bookmarks']['Leads']
+
+
+def test_sharded_sync_restarts_expired_resumed_window(stand_in, login):
+    server = stand_in([SyntheticModule('Leads', 3000, 6)])
+    zh = login(server, 'BULK', SHARD_CONFIG)
+    catalog = discover(zh, ['Leads'])
+    interrupted_state = {}
+    writer.WRITER.out = io.BytesIO()
+    Bulk(zh).start_job('Leads', interrupted_state, get_entry(catalog, 'Leads'), max_jobs=2)
+    plan = interrupted_state['bookmarks']['Leads']['BulkShards']
+    server.expire_job(plan[0]['job_id'])
+
+    state = tap_zoho.build_state(json.loads(json.dumps(interrupted_state)), catalog)
+    messages, state = sync(zh, catalog, state)
+
+    assert len(get_records(messages)['Leads']) == 3000
+    assert 'BulkShards' not in state['bookmarks']['Leads']
+
+
+def test_unsharded_query_estimates_changes_once(stand_in, login, monkeypatch):
+    server = stand_in([SyntheticModule('Leads', 1000, 6)])
+    zh = login(server, 'BULK', dict(SHARD_CONFIG, bulk_shard_rows=5000))
+    catalog = discover(zh, ['Leads'])
+    estimates = []
+    estimate_changes = Bulk._estimate_changes
+    monkeypatch.setattr(Bulk, '_estimate_changes', lambda self, *args: estimates.append(args) or estimate_changes(
+        self, *args))
+    server.reset_calls()
+
+    messages, _ = sync(zh, catalog)
+
+    assert len(get_records(messages)['Leads']) == 1000
+    # The first changed page and the page of change number bulk_shard_rows + 1
+    assert len(estimates) == 1 and server.calls['records'] == 2 and server.calls['bulk_create'] == 1
+
+
+def test_small_delta_of_a_large_module_is_not_sharded(stand_in, login):
+    server = stand_in([SyntheticModule('Leads', 3000, 6)])
+    zh = login(server, 'BULK', SHARD_CONFIG)
+    catalog = discover(zh, ['Leads'])
+    state = {'bookmarks': {'Leads': {'Modified_Time': format_time(BASE_TIME + datetime.timedelta(seconds=2700))}}}
+    server.reset_calls()
+
+    messages, state = sync(zh, catalog, tap_zoho.build_state(state, catalog))
+
+    assert len(get_records(messages)['Leads']) == 299
+    assert server.calls['bulk_create'] == 1 and server.calls['records'] == 2
+    assert 'BulkShards' not in state['bookmarks']['Leads']
+
+
+@pytest.mark.parametrize('rows, estimate', [
+    (3000, ('2020-01-01T00:00:00+00:00', 3000)),
+    (4999, ('2020-01-01T00:00:00+00:00', 4999)),
+    (20000, ('2020-01-01T00:00:00+00:00', 5200)),
+    (700, ('2020-01-01T00:00:00+00:00', 700)),
+    (500, ('2020-01-01T00:00:00+00:00', None)),
+    (150, ('2020-01-01T00:00:00+00:00', None)),
+])
+def test_estimate_counts_the_changes_up_to_the_window_limit(stand_in, login, rows, estimate):
+    server = stand_in([SyntheticModule('Leads', rows, 6)])
+    zh = login(server, 'BULK')
+
+    assert Bulk(zh)._estimate_changes('Leads', '2019-12-31T00:00:00+00:00', 500, 5000) == estimate
+
+
+@pytest.mark.parametrize('pages, estimate', [
+    ([None], (None, None)),
+    # The changes after the first page were deleted while the pages were read
+    ([{'data': [{'Modified_Time': '1'}] * 200, 'info': {'more_records': True}}, None], ('1', None)),
+    ([{'data': [{'Modified_Time': '1'}] * 200, 'info': {'more_records': True}},
+      {'data': [{'Modified_Time': '2'}] * 200, 'info': {'more_records': True}}], ('1', 600)),
+])
+def test_estimate_changes_of_empty_pages(stand_in, login, monkeypatch, pages, estimate):
+    server = stand_in([SyntheticModule('Leads', 10, 6)])
+    zh = login(server, 'BULK')
+    pages = iter(pages)
+    monkeypatch.setattr(zh.client, 'get_changed_page', lambda *args, **kwargs: next(pages, None))
+
+    assert Bulk(zh)._estimate_changes('Leads', '2019-12-31T00:00:00+00:00', 500, 5000) == estimate
+
+
+def test_bulk_projection_drops_the_line_item_properties(stand_in, login):
+    server = stand_in([SyntheticModule('Invoices', 10, 6)])
+    zh = login(server, 'AUTO')
+    entry = get_entry(discover(zh, ['Invoices']), 'Invoices')
+    for mdata in entry['metadata']:
+        if tuple(mdata['breadcrumb']) == ('properties', 'Field_1_integer'):
+            mdata['metadata']['selected'] = False
+
+    fields = Bulk(zh).get_projection(entry)
+
+    assert 'Product_Code' in zh.get_selected_fields(entry)
+    assert 'Field_0_text' in fields and 'Field_1_integer' not in fields
+    assert not {'Product_Code', 'Quantity', 'Line_Tax', 'Product_Details'} & set(fields)
+
+
+@pytest.fixture
+def interrupted_bulk_sync(stand_in, login, monkeypatch):
+    """Returns the stand-in, the tap, the catalog, the messages of a sync of 1000 rows interrupted after 450 rows
+    and its last state."""
+    server = stand_in([SyntheticModule('Leads', 1000, 6)])
+    zh = login(server, 'BULK', {'state_checkpoint_records': 100})
+    catalog = discover(zh, ['Leads'])
+    messages = interrupted_sync(zh, catalog, monkeypatch, 450)
+    state = [message['value'] for message in messages if message['type'] == 'STATE'][-1]
+    server.reset_calls()
+    return server, zh, catalog, messages, tap_zoho.build_state(state, catalog)
+
+
+def test_interrupted_bulk_sync_reuses_its_job(interrupted_bulk_sync):
+    server, zh, catalog, messages, state = interrupted_bulk_sync
+    resume_bookmark = state['bookmarks']['Leads']['JobHighestBookmarkSeen']
+    assert state['bookmarks']['Leads']['JobID'] and resume_bookmark
+
+    resumed, state = sync(zh, catalog, state)
+
+    emitted = get_records(messages)['Leads']
+    resumed = get_records(resumed)['Leads']
+    assert server.calls['bulk_create'] == 0 and server.calls['bulk_result'] == 1
+    # The state written at row 400 holds its Modified_Time. The rows modified before it are not emitted again,
+    # the row modified at it is
+    assert resume_bookmark == emitted[399]['Modified_Time']
+    assert all(record['Modified_Time'] >= resume_bookmark for record in resumed)
+    assert [record['id'] for record in resumed][:51] == [record['id'] for record in emitted][399:]
+    assert len(resumed) == 601 and len({record['id'] for record in emitted + resumed}) == 1000
+    assert not {'JobID', 'JobHighestBookmarkSeen'} & set(state['bookmarks']['Leads'])
+
+
+def test_interrupted_bulk_sync_recreates_an_expired_job(interrupted_bulk_sync):
+    server, zh, catalog, _, state = interrupted_bulk_sync
+    saved_job_id = state['bookmarks']['Leads']['JobID']
+    server.expire_job(saved_job_id)
+
+    resumed, state = sync(zh, catalog, state)
+
+    assert server.calls['bulk_create'] == 1
+    new_job_id = max(server._jobs, key=int)
+    assert new_job_id != saved_job_id and server._jobs[new_job_id]['query'] == server._jobs[saved_job_id]['query']
+    # The rows of the new job are all emitted, as its order may differ from the one of the expired job
+    assert len(get_records(resumed)['Leads']) == 1000
+    assert not {'JobID', 'JobHighestBookmarkSeen'} & set(state['bookmarks']['Leads'])
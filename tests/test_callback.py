@@ -0,0 +1,62 @@
+import threading
+import time
+
+import pytest
+
+from benchmarks.data import SyntheticModule
+from tap_zoho.zoho.bulk import BATCH_STATUS_POLLING_MIN_SLEEP, Bulk
+from tap_zoho.zoho.callback import BulkCallbackListener
+from tap_zoho.zoho.exceptions import TapZohoException
+
+CALLBACK_DELAY = 0.2
+
+
+@pytest.fixture
+def held_job(stand_in, login):
+    """Returns the stand-in, a Bulk waiting on callbacks and the id of a job in progress."""
+    server = stand_in([SyntheticModule('Leads', 10, 6)], hold_jobs=True)
+    zh = login(server, 'BULK')
+    zh.bulk_callback_listener = BulkCallbackListener().start()
+    bulk = Bulk(zh)
+    yield server, bulk, bulk._create_job(sobject='Leads', modified_time='2019-12-31T00:00:00+00:00')
+    zh.bulk_callback_listener.stop()
+
+
+def finish_later(server, job_id, state):
+    timer = threading.Timer(CALLBACK_DELAY, server.finish_job, (job_id, state))
+    timer.start()
+    return timer
+
+
+def test_listener_binds_to_localhost_by_default():
+    listener = BulkCallbackListener().start()
+    try:
+        assert listener._server.server_address[0] == '127.0.0.1'
+        assert listener.url.startswith('http://127.0.0.1:')
+    finally:
+        listener.stop()
+
+
+def test_completed_callback_ends_polling_before_the_interval(held_job):
+    server, bulk, job_id = held_job
+    started = time.monotonic()
+    timer = finish_later(server, job_id, 'COMPLETED')
+
+    status = bulk._poll_on_job_id(job_id)
+    timer.join()
+
+    assert status['state'] == 'COMPLETED'
+    assert CALLBACK_DELAY <= time.monotonic() - started < BATCH_STATUS_POLLING_MIN_SLEEP
+    assert server.calls['bulk_status'] == 2
+
+
+def test_failure_callback_raises(held_job):
+    server, bulk, job_id = held_job
+    started = time.monotonic()
+    timer = finish_later(server, job_id, 'FAILURE')
+
+    with pytest.raises(TapZohoException, match='did not complete'):
+        bulk._poll_on_job_id(job_id)
+    timer.join()
+
+    assert time.monotonic() - started < BATCH_STATUS_POLLING_MIN_SLEEP
@@ -0,0 +1,19 @@
+import pytest
+
+from tap_zoho.zoho.client import ZohoClient, get_api_domain
+
+
+@pytest.mark.parametrize('config, api_domain', [
+    ({}, 'https://www.zohoapis.com'),
+    ({'api_domain': None, 'apiBaseUrl': 'www.zohoapis.eu'}, 'https://www.zohoapis.eu'),
+    ({'api_domain': 'https://www.zohoapis.in', 'apiBaseUrl': 'www.zohoapis.eu'}, 'https://www.zohoapis.in'),
+    ({'apiBaseUrl': 'https://www.zohoapis.com.au'}, 'https://www.zohoapis.com.au'),
+])
+def test_get_api_domain(config, api_domain):
+    assert get_api_domain(config) == api_domain
+
+
+def test_client_urls_of_sandbox_org():
+    client = ZohoClient(dict, api_domain=get_api_domain({'apiBaseUrl': 'www.zohoapis.eu'}), is_sandbox=True)
+    assert client.rest_url == 'https://sandbox.zohoapis.eu/crm/v2'
+    assert client.bulk_url == 'https://sandbox.zohoapis.eu/crm/bulk/v2/read'
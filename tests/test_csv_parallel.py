@@ -0,0 +1,107 @@
+import csv
+import io
+import random
+
+import pytest
+
+from benchmarks.data import SyntheticModule
+from tap_zoho import writer
+from tap_zoho.zoho.bulk import Bulk
+from tap_zoho.zoho.csv_parallel import CsvParsePool, split_csv_rows
+
+HEADER = ['id', 'Modified_Time', 'Name', 'Count', 'Active', 'Notes']
+SCHEMA = {'type': 'object', 'properties': {
+    'id': {'type': ['null', 'string']},
+    'Modified_Time': {'type': ['null', 'string'], 'format': 'date-time'},
+    'Name': {'type': ['null', 'string']},
+    'Count': {'type': ['null', 'integer']},
+    'Active': {'type': ['null', 'boolean']},
+    'Notes': {'type': ['null', 'string']},
+}}
+TEXTS = ['plain', 'Zoë Šťastná', '日本語のテキスト', 'say ""hi""', 'a, b', 'line\nbreak', 'ü\nü\n', '"',
+         '\r\nwindows', '😀 emoji', '', 'trailing "quote"', 'é' * 40]
+
+
+def make_csv(rows, line_terminator='\n', seed=0):
+    """Returns a Zoho like CSV of `rows` rows with quoted values, embedded newlines, doubled quotes, multibyte
+    characters and repeated Modified_Time values."""
+    rng = random.Random(seed)
+    out = io.StringIO()
+    csv_writer = csv.writer(out, lineterminator=line_terminator)
+    csv_writer.writerow(HEADER)
+    for row in range(rows):
+        csv_writer.writerow([str(4000000000000000000 + row),
+                             '2020-01-01T00:{:02d}:00+00:00'.format(rng.randrange(17)),
+                             ''.join(rng.choice(TEXTS) for _ in range(rng.randint(1, 3))),
+                             str(rng.randrange(-1000, 1000)) if rng.random() < 0.8 else '',
+                             rng.choice(['true', 'false', '']),
+                             rng.choice(TEXTS)])
+    return out.getvalue().encode('utf-8')
+
+
+def parse(data):
+    return list(csv.reader(io.StringIO(data.decode('utf-8'), newline='')))
+
+
+def split(data, chunk_size, block_size):
+    return split_csv_rows(io.BytesIO(data), chunk_size, block_size=block_size)
+
+
+@pytest.mark.parametrize('block_size', [1, 2, 3, 5, 7, 64, 1024 * 1024])
+@pytest.mark.parametrize('data, ranges', [
+    # The first cut falls inside the quoted value of the first row
+    (b'a,b\n1,"x\ny"\n2,z\n', [(4, 12), (12, 16)]),
+    # Doubled quotes and a newline inside the same quoted value
+    (b'a,b\n1,"say ""hi""\nthere"\n2,z\n', [(4, 25), (25, 29)]),
+    # A value holding several newlines and a quoted newline only
+    (b'a,b\n1,"\n\n\n"\n2,"\n"\n', [(4, 12), (12, 18)]),
+    # Multibyte characters next to the quotes, no newline after the last row
+    (b'a,b\n1,"\xc3\xa9\n\xe6\x97\xa5"\n2,\xf0\x9f\x98\x80', [(4, 15), (15, 21)]),
+    # A quoted newline in the header
+    (b'"a\nb",c\n1,2\n', [(8, 12)]),
+])
+def test_split_ends_ranges_after_quoted_newlines(data, ranges, block_size):
+    header_end, split_ranges = split(data, 1, block_size)
+
+    assert (header_end, split_ranges) == (ranges[0][0], ranges)
+
+
+@pytest.mark.parametrize('line_terminator', ['\n', '\r\n'])
+@pytest.mark.parametrize('chunk_size', [1, 37, 500, 4096, 1024 * 1024])
+@pytest.mark.parametrize('block_size', [1, 13, 256, 1024 * 1024])
+def test_split_ranges_hold_whole_rows(line_terminator, chunk_size, block_size):
+    data = make_csv(200, line_terminator)
+
+    header_end, ranges = split(data, chunk_size, block_size)
+
+    assert [start for start, _ in ranges] == [header_end] + [end for _, end in ranges[:-1]]
+    assert ranges[-1][1] == len(data)
+    assert parse(data[:header_end]) == [HEADER]
+    assert [row for start, end in ranges for row in parse(data[start:end])] == parse(data)[1:]
+    if chunk_size == 1:
+        assert len(ranges) == 200
+
+
+@pytest.fixture(scope='module')
+def parse_pool():
+    pool = CsvParsePool(workers=2)
+    yield pool
+    pool.shutdown()
+
+
+@pytest.mark.parametrize('line_terminator', ['\n', '\r\n'])
+@pytest.mark.parametrize('chunk_size', [1, 211, 3000, 1024 * 1024])
+def test_parse_pool_reads_the_records_of_a_single_process(stand_in, login, parse_pool, chunk_size, line_terminator):
+    zh = login(stand_in([SyntheticModule('Leads', 1, 1)]), 'BULK', {'bulk_sort_run_size': 40})
+    data = make_csv(300, line_terminator, seed=chunk_size)
+    parse_pool.chunk_size = chunk_size
+
+    expected = list(Bulk(zh)._read_csv_rows(io.BytesIO(data), 'Leads', SCHEMA))
+    records = list(parse_pool.read_records(io.BytesIO(data), 'Leads', SCHEMA, 'Modified_Time',
+                                           ['Modified_Time', 'id']))
+
+    assert [record.record_json for record in records] == [writer.encode_record(record) for record in expected]
+    assert [record.values for record in records] == [
+        {'Modified_Time': record['Modified_Time'], 'id': record['id']} for record in expected]
+    assert any('\n' in record['Name'] for record in expected)
+    assert any(isinstance(record['Count'], int) for record in expected)
@@ -0,0 +1,45 @@
+import operator
+import os
+import random
+
+import pytest
+
+from tap_zoho.zoho.csv_sort import sort_csv_rows
+
+
+def make_rows(count, seed=0):
+    """Returns rows with few distinct keys, so many rows share a key, and values a CSV must quote."""
+    rng = random.Random(seed)
+    return [[str(index), '2020-01-01T00:00:{:02d}+00:00'.format(rng.randrange(7)),
+             rng.choice(['plain', 'a, b', 'say "hi"', 'line\nbreak', 'Zoë 日本', ''])]
+            for index in range(count)]
+
+
+@pytest.mark.parametrize('count, run_size', [(0, 3), (5, 10), (10, 10), (100, 7), (1000, 1), (1001, 50)])
+def test_sort_matches_a_stable_sort(tmp_path, count, run_size):
+    rows = make_rows(count, seed=count)
+
+    ordered = list(sort_csv_rows(iter(rows), 1, run_size=run_size, tmp_dir=str(tmp_path)))
+
+    # Rows sharing a key keep their input order, which the ascending ids in column 0 show
+    assert ordered == sorted(rows, key=operator.itemgetter(1))
+    assert os.listdir(str(tmp_path)) == []
+
+
+def test_runs_are_spilled_and_removed(tmp_path):
+    rows = make_rows(100)
+    ordered = sort_csv_rows(iter(rows), 1, run_size=10, tmp_dir=str(tmp_path))
+
+    first = next(ordered)
+    assert len(os.listdir(str(tmp_path))) == 10
+    assert [first] + list(ordered) == sorted(rows, key=operator.itemgetter(1))
+    assert os.listdir(str(tmp_path)) == []
+
+
+def test_runs_are_removed_when_the_merge_is_not_finished(tmp_path):
+    ordered = sort_csv_rows(iter(make_rows(100)), 1, run_size=10, tmp_dir=str(tmp_path))
+
+    next(ordered)
+    ordered.close()
+
+    assert os.listdir(str(tmp_path)) == []
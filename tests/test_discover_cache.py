@@ -0,0 +1,34 @@
+import tap_zoho
+from benchmarks.data import FIELD_TYPES, SyntheticModule
+from tap_zoho.zoho.discover_cache import DiscoveryCache
+from tests.helpers import discover
+
+
+def test_discovery_cache_is_opt_in():
+    assert tap_zoho.CONFIG['discover_cache_dir'] is None
+
+
+def test_discovery_cache_is_kept_per_user(tmp_path):
+    cache = DiscoveryCache(str(tmp_path), 'org', user='token-a')
+    cache.put('Leads', '2020-01-01T00:00:00+00:00', {'fields': [{'api_name': 'Email'}]})
+    cache.save()
+
+    assert DiscoveryCache(str(tmp_path), 'org', user='token-a').get(
+        'Leads', '2020-01-01T00:00:00+00:00') == {'fields': [{'api_name': 'Email'}]}
+    assert DiscoveryCache(str(tmp_path), 'org', user='token-b').get(
+        'Leads', '2020-01-01T00:00:00+00:00') is None
+    # The refresh token never ends up in the file name
+    assert all('token-a' not in path.name for path in tmp_path.iterdir())
+
+
+def test_discovery_cache_is_shared_by_the_api_types(stand_in, login, tmp_path):
+    server = stand_in([SyntheticModule('Leads', 10, len(FIELD_TYPES)), SyntheticModule('Invoices', 10, 6)])
+    cache_config = {'discover_cache_dir': str(tmp_path / 'cache'), 'refresh_token': 'token-a'}
+    discover(login(server, 'BULK', cache_config), [])
+    expected = discover(login(server, 'REST', {'discover_cache_dir': None}), [])
+    server.reset_calls()
+
+    catalog = discover(login(server, 'REST', cache_config), [])
+
+    assert server.calls['fields'] == 0
+    assert catalog == expected
@@ -0,0 +1,49 @@
+import pytest
+from singer import metadata
+
+from benchmarks.data import SyntheticModule
+from tests.helpers import discover, sync
+
+STREAMS = ['Leads', 'Contacts', 'Deals']
+
+
+def get_synced_streams(messages):
+    return {message['stream'] for message in messages if message['type'] == 'RECORD'}
+
+
+def get_stream_order(catalog):
+    return [entry['tap_stream_id'] for entry in catalog['streams'] if entry['tap_stream_id'] in STREAMS]
+
+
+@pytest.mark.parametrize('max_concurrent_jobs', [1, 5])
+def test_interrupted_sync_resumes_from_the_current_stream(stand_in, login, max_concurrent_jobs):
+    server = stand_in([SyntheticModule(stream, 100, 6) for stream in STREAMS])
+    zh = login(server, 'BULK', {'bulk_max_concurrent_jobs': max_concurrent_jobs})
+    catalog = discover(zh, STREAMS)
+    order = get_stream_order(catalog)
+    server.reset_calls()
+
+    messages, state = sync(zh, catalog, {'current_stream': order[1]})
+
+    assert get_synced_streams(messages) == set(order[1:])
+    assert server.calls['bulk_create'] == 2
+    assert state['current_stream'] is None
+
+
+def test_concurrent_sync_creates_no_job_for_synced_full_table_streams(stand_in, login):
+    server = stand_in([SyntheticModule(stream, 100, 6) for stream in STREAMS])
+    zh = login(server, 'BULK', {'bulk_max_concurrent_jobs': 5})
+    catalog = discover(zh, STREAMS)
+    entry = next(entry for entry in catalog['streams'] if entry['tap_stream_id'] == 'Contacts')
+    mdata = metadata.to_map(entry['metadata'])
+    mdata = metadata.write(mdata, (), 'replication-method', 'FULL_TABLE')
+    mdata[()].pop('replication-key', None)
+    entry['metadata'] = metadata.to_list(mdata)
+    server.reset_calls()
+
+    messages, _ = sync(zh, catalog, {'bookmarks': {'Contacts': {'version': 1}}})
+
+    assert get_synced_streams(messages) == {'Leads', 'Deals'}
+    assert server.calls['bulk_create'] == 2
+    # Like the sequential sync, the schema of the skipped stream is still written
+    assert 'Contacts' in {message['stream'] for message in messages if message['type'] == 'SCHEMA'}
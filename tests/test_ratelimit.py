@@ -0,0 +1,99 @@
+import time
+
+import pytest
+
+from benchmarks.data import SyntheticModule
+from tap_zoho.zoho.exceptions import TapZohoQuotaExceededException
+from tap_zoho.zoho.ratelimit import RequestScheduler, get_reset_time
+from tests.helpers import discover, sync
+
+
+class Response():
+    def __init__(self, status_code=200, headers=None, body=None):
+        self.status_code = status_code
+        self.headers = headers or {}
+        self.body = body
+        self.url = 'https://www.zohoapis.com/crm/v2/Leads'
+        self.text = str(body)
+
+    def json(self):
+        if self.body is None:
+            raise ValueError('No JSON')
+        return self.body
+
+    def close(self):
+        pass
+
+
+class Clock():
+    """Time that only passes while sleeping."""
+
+    def __init__(self):
+        self.now = time.time()
+        self.sleeps = []
+
+    def time(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+def ratelimit_headers(remaining, reset_in, day_remaining=10000, now=None):
+    return {'X-RATELIMIT-LIMIT': '100', 'X-RATELIMIT-REMAINING': str(remaining),
+            'X-RATELIMIT-RESET': str(int(((now or time.time()) + reset_in) * 1000)),
+            'X-RATELIMIT-DAY-LIMIT': '10000', 'X-RATELIMIT-DAY-REMAINING': str(day_remaining)}
+
+
+def test_get_reset_time():
+    assert get_reset_time(1600000000000, 0) == 1600000000
+    assert get_reset_time(1600000000, 0) == 1600000000
+    assert get_reset_time(30, 1600000000) == 1600000030
+
+
+def test_used_up_window_waits_for_reset():
+    clock = Clock()
+    scheduler = RequestScheduler(sleep=clock.sleep, clock=clock.time)
+
+    assert scheduler.execute(lambda: Response(headers=ratelimit_headers(0, 5, now=clock.now))).status_code == 200
+    assert scheduler.execute(lambda: Response(headers=ratelimit_headers(99, 60, now=clock.now))).status_code == 200
+    assert len(clock.sleeps) == 1 and 4.99 < clock.sleeps[0] <= 5
+    assert scheduler.window_waits == 1
+
+
+def test_throttled_window_is_retried_while_day_credits_are_left():
+    scheduler = RequestScheduler(sleep=lambda _: None)
+    responses = iter([Response(429, ratelimit_headers(0, 0), {'code': 'LIMIT_REACHED'}),
+                      Response(headers=ratelimit_headers(99, 60))])
+
+    assert scheduler.execute(lambda: next(responses)).status_code == 200
+    assert scheduler.retries == 1
+
+
+@pytest.mark.parametrize('reserve, day_remaining', [(0, 0), (100, 100)])
+def test_used_up_day_credits_stop_requests(reserve, day_remaining):
+    scheduler = RequestScheduler(quota_reserve=reserve, sleep=lambda _: None)
+    scheduler.execute(lambda: Response(headers=ratelimit_headers(50, 60, day_remaining)))
+
+    with pytest.raises(TapZohoQuotaExceededException):
+        scheduler.execute(lambda: Response(headers=ratelimit_headers(50, 60)))
+
+
+def test_quota_error_without_day_credits_stops_requests():
+    scheduler = RequestScheduler(sleep=lambda _: None)
+    with pytest.raises(TapZohoQuotaExceededException):
+        scheduler.execute(lambda: Response(400, body={'code': 'LIMIT_EXCEEDED'}))
+
+
+def test_sync_continues_after_the_window_is_used_up(stand_in, login):
+    server = stand_in([SyntheticModule('Leads', 1000, 6)], window_calls=4, window_seconds=0.3)
+    zh = login(server, 'REST')
+    catalog = discover(zh, ['Leads'])
+
+    messages, state = sync(zh, catalog)
+
+    records = [message for message in messages if message['type'] == 'RECORD']
+    assert len(records) == len({record['record']['Modified_Time'] for record in records}) == 1000
+    assert state['bookmarks']['Leads']['Modified_Time']
+    assert zh.client.scheduler.window_waits > 0
@@ -0,0 +1,29 @@
+import tap_zoho
+from benchmarks.data import SyntheticModule
+from tests.helpers import discover, interrupted_sync, sync
+
+RESUME_KEYS = {'RestResumeModifiedTime', 'RestResumeIds'}
+
+
+def get_modified_times(messages):
+    return [message['record']['Modified_Time'] for message in messages if message['type'] == 'RECORD']
+
+
+def test_interrupted_rest_sync_resumes_after_the_last_emitted_page(stand_in, login, monkeypatch):
+    server = stand_in([SyntheticModule('Leads', 1000, 6)])
+    zh = login(server, 'REST', {'state_checkpoint_records': 150})
+    catalog = discover(zh, ['Leads'])
+
+    messages = interrupted_sync(zh, catalog, monkeypatch, 450)
+    state = [message['value'] for message in messages if message['type'] == 'STATE'][-1]
+    assert state['bookmarks']['Leads']['RestResumeModifiedTime'] == get_modified_times(messages)[399]
+    resumed, state = sync(zh, catalog, tap_zoho.build_state(state, catalog))
+
+    # The state written at record 450 holds the position after the second page, the records after it on the
+    # third page are emitted again
+    emitted, resumed_times = get_modified_times(messages), get_modified_times(resumed)
+    assert len(emitted) == 450 and len(resumed_times) == 600
+    assert resumed_times[:50] == emitted[400:]
+    assert len(set(emitted + resumed_times)) == 1000 and len(set(resumed_times)) == 600
+    assert not RESUME_KEYS & set(state['bookmarks']['Leads'])
+    assert state['bookmarks']['Leads']['Modified_Time'] == resumed_times[-1]
@@ -0,0 +1,86 @@
+import datetime
+import random
+import types
+
+import pytest
+import singer.utils as singer_utils
+
+from tap_zoho import sync
+from tap_zoho.sync import ReplicationKeyTracker, StateCheckpointer
+
+START_TIME = datetime.datetime(2020, 6, 1, 12, 0, 0, tzinfo=datetime.timezone.utc)
+
+
+def parse(value):
+    return singer_utils.strptime_with_tz(value)
+
+
+def offer_all(tracker, values):
+    return [tracker.offer(value) for value in values]
+
+
+def test_out_of_order_and_equal_keys():
+    tracker = ReplicationKeyTracker(START_TIME)
+
+    offered = offer_all(tracker, ['2020-01-02T00:00:00+00:00', '2020-01-01T00:00:00+00:00',
+                                  '2020-01-03T00:00:00+00:00', '2020-01-03T00:00:00+00:00',
+                                  '2020-01-02T12:00:00+00:00', None, ''])
+
+    assert offered == [True, False, True, False, False, False, False]
+    assert tracker.value == '2020-01-03T00:00:00+00:00'
+
+
+@pytest.mark.parametrize('seed', range(20))
+def test_mixed_formats_track_the_latest_time(seed):
+    values = [
+        '2020-01-01T10:00:00+05:30',  # 04:30 UTC, the highest string of the day
+        '2020-01-01T05:00:00+00:00',
+        '2020-01-01T05:30:00Z',
+        '2020-01-01T06:00:00-01:00',  # 07:00 UTC
+        '2020-01-01T07:00:00.500000+00:00',  # fractional seconds, compared by parsing
+        '2020-01-01 06:30:00',  # not ISO 8601, compared by parsing
+        '2020-06-01T13:00:00+05:30',  # 07:30 UTC on the day of the sync
+        '2020-06-01T12:00:01+00:00',  # after the sync started, ignored
+        '2020-06-01T13:00:00+01:00',  # same instant as the start of the sync
+        '2020-06-01 12:30:00',  # after the sync started, ignored
+    ]
+    random.Random(seed).shuffle(values)
+    tracker = ReplicationKeyTracker(START_TIME)
+
+    offer_all(tracker, values)
+
+    assert parse(tracker.value) == START_TIME
+    tracker = ReplicationKeyTracker(START_TIME)
+    offer_all(tracker, [value for value in values if not value.startswith('2020-06')])
+    assert parse(tracker.value) == parse('2020-01-01T07:00:00.500000+00:00')
+
+
+def test_bookmark_never_moves_backwards():
+    tracker = ReplicationKeyTracker(START_TIME, '2020-03-01T00:00:00+00:00')
+
+    offered = offer_all(tracker, ['2020-02-01T00:00:00+00:00', '2020-03-01T00:00:00+00:00',
+                                  '2020-03-01T01:00:00+02:00', '2020-02-29 23:00:00', '2021-01-01T00:00:00+00:00'])
+
+    assert offered == [False, False, False, False, False]
+    assert tracker.value == '2020-03-01T00:00:00+00:00'
+    assert tracker.offer('2020-03-01T00:00:01Z') and tracker.value == '2020-03-01T00:00:01Z'
+
+
+def test_checkpoints_at_the_record_and_elapsed_time_thresholds(monkeypatch):
+    now = [100.0]
+    written = []
+    monkeypatch.setattr(sync, 'time', types.SimpleNamespace(monotonic=lambda: now[0]))
+    monkeypatch.setattr(sync.writer, 'write_state', lambda state: written.append(dict(state)))
+    checkpointer = StateCheckpointer(every_records=3, every_seconds=10)
+
+    for record in range(1, 8):
+        checkpointer.checkpoint({'record': record})
+    # The clock passes the elapsed time threshold one record after the last checkpoint
+    now[0] += 10
+    checkpointer.checkpoint({'record': 8})
+    # Both thresholds start again from the last checkpoint
+    now[0] += 9.5
+    for record in range(9, 12):
+        checkpointer.checkpoint({'record': record})
+
+    assert written == [{'record': 3}, {'record': 6}, {'record': 8}, {'record': 11}]
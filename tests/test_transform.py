@@ -0,0 +1,79 @@
+import random
+
+import pytest
+import singer
+from singer.transform import SchemaMismatch
+
+import tap_zoho
+from tap_zoho import zoho
+from tap_zoho.sync import compile_bulk_data_hook, transform_bulk_data_hook
+from tap_zoho.transform import RecordTransformer
+
+RECORDS = 20000
+ZOHO_TYPES = sorted(zoho.STRING_TYPES | zoho.NUMBER_TYPES | zoho.DATE_TYPES | zoho.LOOKUP_TYPES
+                    | {'integer', 'boolean'})
+VALUES = [None, '', '0.0', '0', '12', '-3.5', '1,234.5', 'true', 'false', 'TRUE', 'text', 'None', 12, 0, 3.5,
+          True, False, '2020-01-01T10:00:00+05:30', '2020-02-30', '2020-01-01', 'not a date',
+          {'id': '1', 'name': 'Owner'}, {'id': None}, {'id': '2', 'extra': 'removed'}, {}, [], ['a', 1]]
+
+
+def get_schema(property_schema):
+    return {'type': 'object',
+            'properties': {'{}_{}'.format(zh_type, index): property_schema({'api_name': zh_type, 'data_type': zh_type})
+                           for index, zh_type in enumerate(ZOHO_TYPES)}}
+
+
+def random_record(rng, schema):
+    # A few fields each, so records matching the schema and mismatching ones are both common
+    names = rng.sample(sorted(schema['properties']), rng.randint(1, 4))
+    record = {name: rng.choice(VALUES) for name in names}
+    if rng.random() < 0.1:
+        record['Unknown_Field'] = rng.choice(VALUES)
+    return record
+
+
+def transform_with_singer(record, schema, pre_hook):
+    with singer.Transformer(pre_hook=pre_hook) as transformer:
+        return transformer.transform(record, schema)
+
+
+def transform_outcome(transform, record):
+    try:
+        return 'ok', transform(record)
+    except SchemaMismatch as ex:
+        return 'error', str(ex)
+
+
+@pytest.mark.parametrize('property_schema', [tap_zoho.rest_property_schema, tap_zoho.bulk_property_schema],
+                         ids=['rest', 'bulk'])
+@pytest.mark.parametrize('hooks', [(None, None), (transform_bulk_data_hook, compile_bulk_data_hook)],
+                         ids=['no_hook', 'bulk_data_hook'])
+def test_record_transformer_matches_singer_transformer(property_schema, hooks):
+    pre_hook, hook_compiler = hooks
+    schema = get_schema(property_schema)
+    transformer = RecordTransformer(schema, pre_hook=pre_hook, hook_compiler=hook_compiler)
+    rng = random.Random(20)
+    mismatches = 0
+
+    for _ in range(RECORDS):
+        record = random_record(rng, schema)
+        expected = transform_outcome(lambda rec: transform_with_singer(rec, schema, pre_hook), record)
+        assert transform_outcome(transformer.transform, record) == expected, record
+        mismatches += expected[0] == 'error'
+
+    assert RECORDS // 10 < mismatches < RECORDS * 9 // 10
+
+
+def test_record_transformer_raises_schema_mismatch():
+    schema = {'type': 'object', 'properties': {'Amount': {'type': 'number'}}}
+    with pytest.raises(SchemaMismatch):
+        RecordTransformer(schema).transform({'Amount': 'text'})
+
+
+def test_record_transformer_collects_removed_paths():
+    schema = {'type': 'object', 'properties': {'Owner': tap_zoho.rest_property_schema(
+        {'api_name': 'Owner', 'data_type': 'ownerlookup'})}}
+    transformer = RecordTransformer(schema)
+
+    assert transformer.transform({'Owner': {'id': '1', 'email': 'a@b.c'}, 'Other': 1}) == {'Owner': {'id': '1'}}
+    assert transformer.removed == {'Owner.email', 'Other'}
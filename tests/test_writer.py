@@ -0,0 +1,119 @@
+import datetime
+import decimal
+import gzip
+import io
+import json
+from urllib.parse import urlparse
+
+import pytest
+import pytz
+import singer
+
+from tap_zoho import writer
+
+TIME_EXTRACTED = datetime.datetime(2020, 1, 2, 3, 4, 5, 678000, tzinfo=pytz.utc)
+RECORDS = [
+    {'id': '1', 'Amount': decimal.Decimal('1234567890.123456789012345'), 'Rate': decimal.Decimal('1.10')},
+    {'id': '2', 'Name': 'Zoë Šťastná 日本 "quoted" \\ \n', 'Owner': {'id': '3', 'name': None}, 'Tags': ['a', 'é']},
+    {'id': '3', 'Count': 12, 'Ratio': 0.5, 'Active': False, 'Empty': None, 'Date': '2020-01-01T00:00:00.000000Z'},
+]
+
+
+def parse(data):
+    return [json.loads(line, parse_float=decimal.Decimal) for line in data.splitlines()]
+
+
+def singer_messages(messages):
+    return parse('\n'.join(singer.format_message(message) for message in messages))
+
+
+def record_messages(stream, version, time_extracted):
+    return [singer.RecordMessage(stream=stream, record=record, version=version, time_extracted=time_extracted)
+            for record in RECORDS]
+
+
+@pytest.fixture(params=['orjson', 'simplejson'])
+def encoder(request, monkeypatch):
+    if request.param == 'simplejson':
+        monkeypatch.setattr(writer, 'orjson', None)
+    elif writer.orjson is None:
+        pytest.skip('orjson is not installed')
+    return request.param
+
+
+@pytest.mark.parametrize('stream, version, time_extracted', [
+    ('Leads', None, None),
+    ('Leads', 1577934245678, TIME_EXTRACTED),
+    ('Sales "Orders" é', 0, TIME_EXTRACTED),
+])
+def test_message_writer_writes_the_messages_of_singer(encoder, stream, version, time_extracted):
+    out = io.BytesIO()
+    message_writer = writer.MessageWriter(out=out, buffer_size=100)
+    messages = ([singer.SchemaMessage(stream=stream, schema={'type': 'object'}, key_properties=['id'])]
+                + record_messages(stream, version, time_extracted)
+                + [singer.StateMessage(value={'bookmarks': {stream: {'Modified_Time': '2020-01-01'}}})])
+
+    for message in messages:
+        if isinstance(message, singer.RecordMessage):
+            message_writer.write_record(stream, message.record, version=version, time_extracted=time_extracted)
+        else:
+            message_writer.write_message(message)
+    message_writer.close()
+
+    assert parse(out.getvalue().decode('utf-8')) == singer_messages(messages)
+
+
+def test_encoded_records_are_written_as_encoded(encoder):
+    out = io.BytesIO()
+    message_writer = writer.MessageWriter(out=out)
+    for record in RECORDS:
+        message_writer.write_record('Leads', writer.EncodedRecord(writer.encode_record(record), {'id': record['id']}),
+                                    version=1, time_extracted=TIME_EXTRACTED)
+    message_writer.close()
+
+    assert parse(out.getvalue().decode('utf-8')) == singer_messages(record_messages('Leads', 1, TIME_EXTRACTED))
+
+
+def read_batch(message):
+    assert message['encoding'] == {'format': 'jsonl', 'compression': 'gzip'}
+    records = []
+    for uri in message['manifest']:
+        with gzip.open(urlparse(uri).path) as batch_file:
+            records.extend(parse(batch_file.read().decode('utf-8')))
+    return records
+
+
+def test_batch_writer_holds_state_until_its_batch_is_written(encoder, tmp_path):
+    out = io.BytesIO()
+    batch_writer = writer.BatchMessageWriter(out=out, batch_dir=str(tmp_path), max_records=2)
+    states = [{'bookmarks': {'Leads': {'Modified_Time': str(index)}}} for index in range(len(RECORDS))]
+
+    batch_writer.write_message(singer.SchemaMessage(stream='Leads', schema={'type': 'object'}, key_properties=['id']))
+    written = []
+    for record, state in zip(RECORDS, states):
+        batch_writer.write_record('Leads', record, version=1, time_extracted=TIME_EXTRACTED)
+        batch_writer.write_message(singer.StateMessage(value=state))
+        written.append([message['type'] for message in parse(out.getvalue().decode('utf-8'))])
+    batch_writer.close()
+
+    # The first STATE is held until the batch of the first two records is complete, the second one follows it as
+    # no batch is open, the third is held until the writer is closed
+    assert written == [['SCHEMA'], ['SCHEMA', 'BATCH', 'STATE', 'STATE'], ['SCHEMA', 'BATCH', 'STATE', 'STATE']]
+    messages = parse(out.getvalue().decode('utf-8'))
+    assert [message['type'] for message in messages] == ['SCHEMA', 'BATCH', 'STATE', 'STATE', 'BATCH', 'STATE']
+    assert [message['value'] for message in messages if message['type'] == 'STATE'] == states
+    records = [message['record'] for message in singer_messages(record_messages('Leads', 1, TIME_EXTRACTED))]
+    assert read_batch(messages[1]) == records[:2] and read_batch(messages[4]) == records[2:]
+
+
+def test_batch_writer_completes_batches_before_other_messages(tmp_path):
+    out = io.BytesIO()
+    batch_writer = writer.BatchMessageWriter(out=out, batch_dir=str(tmp_path))
+
+    batch_writer.write_record('Leads', RECORDS[0])
+    batch_writer.write_message(singer.StateMessage(value={'bookmarks': {}}))
+    batch_writer.write_message(singer.ActivateVersionMessage(stream='Leads', version=1))
+    batch_writer.close()
+
+    assert [message['type'] for message in parse(out.getvalue().decode('utf-8'))] == [
+        'BATCH', 'STATE', 'ACTIVATE_VERSION']